@@ -0,0 +1,739 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark.py
+
+Times the mesh converters end to end on deterministic synthetic models, and
+optionally compares the results with a stored baseline.
+
+Four kinds of model are generated, at sizes from a thousand to five million
+triangles:
+
+  sphere      a smooth UV sphere with a texture seam
+  hull        a tapered, flat-shaded octagonal hull (every edge is hard)
+  materials   a torus split into four materials, with separate texture
+              coordinates for each material (UV seams at every boundary)
+  ngons       tiles of four- to eight-sided polygons (OBJ only)
+
+Each model is written as OBJ (with an MTL file), as a comma-separated DAT file
+with TEXTURES, and as a textured Meshwork .mesh file, in a work directory
+where they are kept for later runs. Every converter is then run on the inputs
+in its format, each run in a separate process, recording its wall time, peak
+resident set size and triangles per second. Obj2DatTexNorm is also run with
+--lod on the sphere and materials models, as Obj2DatTexNorm-LOD, to time
+decimation. Results are written as JSON.
+
+With --baseline, each result is compared with the matching entry in an
+earlier results file; a run that is slower or uses more memory than the
+baseline by more than --threshold percent, or that failed where the baseline
+succeeded, counts as a regression, and the script exits with status 1.
+
+After the runs, the growth in each converter's time per triangle from the
+smallest to the largest size is reported, which shows whether it scales
+linearly; with --max-scaling, growth beyond a given factor also makes the
+script exit with status 1.
+
+This script requires a Unix-like system, since it uses the resource module to
+measure the memory used by each conversion.
+"""
+
+import sys
+import os
+import argparse
+import array
+import math
+import json
+import time
+import platform
+import subprocess
+import threading
+import signal
+
+
+#
+# Synthetic models
+#
+class SyntheticModel(object):
+
+    """ SyntheticModel
+        A generated polygon mesh with separate position, texture coordinate
+        and normal index spaces, like an OBJ file.
+
+        corners holds a zero-based (position, uv, normal) index triple for
+        each polygon corner. Polygon i uses the next polygon_sizes[i] corners
+        and material polygon_materials[i], an index into materials, which are
+        texture file names. Texture coordinates are in OBJ orientation (t
+        increasing upwards).
+    """
+
+    __slots__ = ('positions', 'uvs', 'normals', 'corners', 'polygon_sizes',
+                 'polygon_materials', 'materials')
+
+    def __init__(self, materials):
+        self.positions = array.array('d')
+        self.uvs = array.array('d')
+        self.normals = array.array('d')
+        self.corners = array.array('i')
+        self.polygon_sizes = array.array('i')
+        self.polygon_materials = array.array('i')
+        self.materials = materials
+
+    def vertex_count(self):
+        return len(self.positions) // 3
+
+    def add_polygon(self, corners, material):
+        for corner in corners:
+            self.corners.extend(corner)
+        self.polygon_sizes.append(len(corners))
+        self.polygon_materials.append(material)
+
+    def triangle_count(self):
+        return sum(size - 2 for size in self.polygon_sizes if size >= 3)
+
+    def triangles(self):
+        """ triangles
+            Generate (material, corner, corner, corner) for each triangle,
+            splitting polygons into fans. Corners are indices into corners,
+            counted in triples.
+        """
+        corner = 0
+        for size, material in zip(self.polygon_sizes, self.polygon_materials):
+            for i in xrange(1, size - 1):
+                yield material, corner, corner + i, corner + i + 1
+            corner += size
+
+
+def generate_sphere(triangles):
+    """ generate_sphere
+        A unit UV sphere of about the given number of triangles, with smooth
+        normals and a texture seam down one side.
+    """
+    rings = max(3, int(round((1.0 + math.sqrt(1.0 + triangles)) / 2.0)))
+    segments = 2 * rings
+    model = SyntheticModel(['sphere.png'])
+
+    # Positions and normals: north pole, rings - 1 rings of segments, south pole.
+    model.positions.extend((0.0, 1.0, 0.0))
+    for i in xrange(1, rings):
+        theta = math.pi * i / rings
+        for j in xrange(segments):
+            phi = 2.0 * math.pi * j / segments
+            model.positions.extend((math.sin(theta) * math.cos(phi), math.cos(theta), math.sin(theta) * math.sin(phi)))
+    model.positions.extend((0.0, -1.0, 0.0))
+    model.normals.extend(model.positions)
+
+    # Texture coordinates: rings + 1 rows of segments + 1, so the seam column
+    # has its own coordinates.
+    for i in xrange(rings + 1):
+        for j in xrange(segments + 1):
+            model.uvs.extend((float(j) / segments, 1.0 - float(i) / rings))
+
+    south = model.vertex_count() - 1
+
+    def corner(i, j):
+        if i == 0:
+            position = 0
+        elif i == rings:
+            position = south
+        else:
+            position = 1 + (i - 1) * segments + j % segments
+        return position, i * (segments + 1) + j, position
+
+    for i in xrange(rings):
+        for j in xrange(segments):
+            if i == 0:
+                model.add_polygon((corner(0, j), corner(1, j + 1), corner(1, j)), 0)
+            elif i == rings - 1:
+                model.add_polygon((corner(i, j), corner(i, j + 1), corner(rings, j)), 0)
+            else:
+                model.add_polygon((corner(i, j), corner(i, j + 1), corner(i + 1, j + 1)), 0)
+                model.add_polygon((corner(i, j), corner(i + 1, j + 1), corner(i + 1, j)), 0)
+    return model
+
+
+def generate_hull(triangles):
+    """ generate_hull
+        A ship-like hull of about the given number of triangles: an octagonal
+        section, flattened and tapering towards the nose, with capped ends.
+        Every face has its own normal, so every edge is hard.
+    """
+    subdivisions = max(1, int(round(math.sqrt(triangles / 4.0) / 8.0)))
+    around = 8 * subdivisions
+    along = max(1, (triangles - 2 * around) // (2 * around))
+    model = SyntheticModel(['hull.png'])
+
+    # Section outline: points along the sides of an octagon.
+    outline = []
+    for side in xrange(8):
+        a0 = math.pi * (2 * side + 1) / 8.0
+        a1 = math.pi * (2 * side + 3) / 8.0
+        for m in xrange(subdivisions):
+            t = float(m) / subdivisions
+            outline.append((1.5 * ((1.0 - t) * math.cos(a0) + t * math.cos(a1)),
+                            0.6 * ((1.0 - t) * math.sin(a0) + t * math.sin(a1))))
+
+    for i in xrange(along + 1):
+        t = float(i) / along
+        scale = 1.0 - 0.7 * t * t
+        z = 4.0 * t - 2.0
+        for j in xrange(around):
+            model.positions.extend((outline[j][0] * scale, outline[j][1] * scale, z))
+            model.uvs.extend((t, float(j) / around))
+    back = model.vertex_count()
+    model.positions.extend((0.0, 0.0, -2.0))
+    model.positions.extend((0.0, 0.0, 2.0))
+    model.uvs.extend((0.0, 0.5, 1.0, 0.5))
+
+    def add_flat_polygon(positions):
+        p = [model.positions[3 * v:3 * v + 3] for v in positions[:3]]
+        d0 = (p[1][0] - p[0][0], p[1][1] - p[0][1], p[1][2] - p[0][2])
+        d1 = (p[2][0] - p[1][0], p[2][1] - p[1][1], p[2][2] - p[1][2])
+        n = (d0[1] * d1[2] - d0[2] * d1[1], d0[2] * d1[0] - d0[0] * d1[2], d0[0] * d1[1] - d0[1] * d1[0])
+        length = math.sqrt(n[0] * n[0] + n[1] * n[1] + n[2] * n[2])
+        normal = len(model.normals) // 3
+        model.normals.extend((n[0] / length, n[1] / length, n[2] / length))
+        model.add_polygon([(v, v, normal) for v in positions], 0)
+
+    for i in xrange(along):
+        for j in xrange(around):
+            a = i * around + j
+            b = i * around + (j + 1) % around
+            add_flat_polygon((a, b, b + around))
+            add_flat_polygon((a, b + around, a + around))
+    for j in xrange(around):
+        add_flat_polygon((back, (j + 1) % around, j))
+        add_flat_polygon((back + 1, along * around + j, along * around + (j + 1) % around))
+    return model
+
+
+def generate_materials(triangles):
+    """ generate_materials
+        A torus of about the given number of triangles, divided into four
+        materials. Each material has its own texture coordinates, so the
+        vertices on material boundaries have one set for each side.
+    """
+    rings = max(8, int(round(math.sqrt(triangles))))
+    segments = max(3, rings // 2)
+    materials = ['hull.png', 'engine.png', 'cockpit.png', 'fins.png']
+    model = SyntheticModel(materials)
+
+    for i in xrange(rings):
+        a = 2.0 * math.pi * i / rings
+        for j in xrange(segments):
+            b = 2.0 * math.pi * j / segments
+            model.positions.extend(((3.0 + math.cos(b)) * math.cos(a), (3.0 + math.cos(b)) * math.sin(a), math.sin(b)))
+            model.normals.extend((math.cos(b) * math.cos(a), math.cos(b) * math.sin(a), math.sin(b)))
+
+    bands = []
+    for material in xrange(len(materials)):
+        first = material * rings // len(materials)
+        last = (material + 1) * rings // len(materials)
+        bands.append((first, last, len(model.uvs) // 2))
+        for i in xrange(first, last + 1):
+            for j in xrange(segments + 1):
+                model.uvs.extend((float(i - first) / (last - first), float(j) / segments))
+
+    for material, (first, last, first_uv) in enumerate(bands):
+        def corner(i, j):
+            position = (i % rings) * segments + j % segments
+            return position, first_uv + (i - first) * (segments + 1) + j, position
+
+        for i in xrange(first, last):
+            for j in xrange(segments):
+                model.add_polygon((corner(i, j), corner(i + 1, j), corner(i + 1, j + 1)), material)
+                model.add_polygon((corner(i, j), corner(i + 1, j + 1), corner(i, j + 1)), material)
+    return model
+
+
+def generate_ngons(triangles):
+    """ generate_ngons
+        A flat grid of tiles of about the given number of triangles, each a
+        regular polygon with four to eight sides.
+    """
+    tiles = max(1, triangles // 4)
+    columns = int(math.ceil(math.sqrt(tiles)))
+    model = SyntheticModel(['panel.png'])
+    model.normals.extend((0.0, 0.0, 1.0))
+
+    for tile in xrange(tiles):
+        sides = 4 + tile % 5
+        cx = float(tile % columns)
+        cy = float(tile // columns)
+        first = model.vertex_count()
+        for k in xrange(sides):
+            a = 2.0 * math.pi * k / sides
+            model.positions.extend((cx + 0.45 * math.cos(a), cy + 0.45 * math.sin(a), 0.0))
+            model.uvs.extend((0.5 + 0.5 * math.cos(a), 0.5 + 0.5 * math.sin(a)))
+        model.add_polygon([(first + k, first + k, 0) for k in xrange(sides)], 0)
+    return model
+
+
+SHAPES = [
+    # name, generator, formats
+    ('sphere', generate_sphere, ('obj', 'dat', 'mesh')),
+    ('hull', generate_hull, ('obj', 'dat', 'mesh')),
+    ('materials', generate_materials, ('obj', 'dat', 'mesh')),
+    ('ngons', generate_ngons, ('obj',))
+]
+
+
+#
+# Writing synthetic models
+#
+# Lines are formatted and written in batches to keep generation of the
+# largest models reasonably quick.
+#
+BATCH_SIZE = 10000
+
+
+def write_batched(output_file, items, format_item):
+    batch = []
+    for item in items:
+        batch.append(format_item(item))
+        if len(batch) == BATCH_SIZE:
+            output_file.write(''.join(batch))
+            batch = []
+    output_file.write(''.join(batch))
+
+
+def triangle_normal(model, v1, v2, v3):
+    p = model.positions
+    d0 = (p[3 * v2] - p[3 * v1], p[3 * v2 + 1] - p[3 * v1 + 1], p[3 * v2 + 2] - p[3 * v1 + 2])
+    d1 = (p[3 * v3] - p[3 * v2], p[3 * v3 + 1] - p[3 * v2 + 1], p[3 * v3 + 2] - p[3 * v2 + 2])
+    n = (d0[1] * d1[2] - d0[2] * d1[1], d0[2] * d1[0] - d0[0] * d1[2], d0[0] * d1[1] - d0[1] * d1[0])
+    length = math.sqrt(n[0] * n[0] + n[1] * n[1] + n[2] * n[2])
+    return n[0] / length, n[1] / length, n[2] / length
+
+
+def write_obj(model, file_name):
+    """ write_obj
+        Write a model as an OBJ file, with an MTL file of the same name
+        giving each material its texture.
+    """
+    material_file_name = os.path.splitext(file_name)[0] + '.mtl'
+    material_file = open(material_file_name, 'w')
+    for i, texture in enumerate(model.materials):
+        material_file.write('newmtl material%d\nKd 1.0 1.0 1.0\nmap_Kd %s\n\n' % (i, texture))
+    material_file.close()
+
+    output_file = open(file_name, 'w')
+    output_file.write('# Synthetic model generated by Benchmark.py\n')
+    output_file.write('mtllib %s\n' % os.path.basename(material_file_name))
+    p = model.positions
+    write_batched(output_file, xrange(model.vertex_count()), lambda i: 'v %.6f %.6f %.6f\n' % (p[3 * i], p[3 * i + 1], p[3 * i + 2]))
+    t = model.uvs
+    write_batched(output_file, xrange(len(t) // 2), lambda i: 'vt %.6f %.6f\n' % (t[2 * i], t[2 * i + 1]))
+    n = model.normals
+    write_batched(output_file, xrange(len(n) // 3), lambda i: 'vn %.6f %.6f %.6f\n' % (n[3 * i], n[3 * i + 1], n[3 * i + 2]))
+
+    corners = model.corners
+    state = {'corner': 0, 'material': -1}
+
+    def format_polygon(polygon):
+        size = model.polygon_sizes[polygon]
+        material = model.polygon_materials[polygon]
+        first = state['corner']
+        state['corner'] += size
+        line = 'f %s\n' % ' '.join('%d/%d/%d' % (corners[3 * c] + 1, corners[3 * c + 1] + 1, corners[3 * c + 2] + 1) for c in xrange(first, first + size))
+        if material != state['material']:
+            state['material'] = material
+            line = 'usemtl material%d\n' % material + line
+        return line
+
+    write_batched(output_file, xrange(len(model.polygon_sizes)), format_polygon)
+    output_file.close()
+
+
+def write_dat(model, file_name):
+    """ write_dat
+        Write a model as a DAT file with comma-separated entries and a
+        TEXTURES section, splitting polygons into fans.
+    """
+    output_file = open(file_name, 'w')
+    output_file.write('// Synthetic model generated by Benchmark.py\n')
+    output_file.write('NVERTS %d\n' % model.vertex_count())
+    output_file.write('NFACES %d\n' % model.triangle_count())
+    output_file.write('\nVERTEX\n')
+    p = model.positions
+    write_batched(output_file, xrange(model.vertex_count()), lambda i: '%.6f, %.6f, %.6f\n' % (p[3 * i], p[3 * i + 1], p[3 * i + 2]))
+
+    corners = model.corners
+
+    def format_face(triangle):
+        v1, v2, v3 = corners[3 * triangle[1]], corners[3 * triangle[2]], corners[3 * triangle[3]]
+        return '127,127,127,\t%.5f,%.5f,%.5f,\t3,\t%d,%d,%d\n' % (triangle_normal(model, v1, v2, v3) + (v1, v2, v3))
+
+    output_file.write('\nFACES\n')
+    write_batched(output_file, model.triangles(), format_face)
+
+    t = model.uvs
+
+    def format_texture(triangle):
+        points = []
+        for c in triangle[1:]:
+            uv = corners[3 * c + 1]
+            points.append('%.5f %.5f' % (t[2 * uv], 1.0 - t[2 * uv + 1]))
+        return '%s\t1.0 1.0\t%s\n' % (model.materials[triangle[0]], '\t'.join(points))
+
+    output_file.write('\nTEXTURES\n')
+    write_batched(output_file, model.triangles(), format_texture)
+    output_file.write('\nEND\n')
+    output_file.close()
+
+
+def write_meshwork(model, file_name):
+    """ write_meshwork
+        Write a model as a textured Meshwork .mesh file, with one MATERIAL
+        block and one set of vertex texture coordinates per material.
+    """
+    output_file = open(file_name, 'w')
+    output_file.write('Mesh\t1\t1\r')
+    output_file.write('VERTICES\r')
+    p = model.positions
+    write_batched(output_file, xrange(model.vertex_count()), lambda i: '%d\t%f\t%f\t%f\r' % (i, p[3 * i], p[3 * i + 1], p[3 * i + 2]))
+
+    # In a closed mesh with consistent winding, each edge is used once in
+    # each direction, so taking the ascending direction lists it once.
+    corners = model.corners
+
+    def triangle_edges():
+        for triangle in model.triangles():
+            v = [corners[3 * c] for c in triangle[1:]]
+            for a, b in ((v[0], v[1]), (v[1], v[2]), (v[2], v[0])):
+                if a < b:
+                    yield a, b
+
+    output_file.write('EDGES\r')
+    write_batched(output_file, triangle_edges(), lambda edge: '%d\t%d\r' % edge)
+
+    t = model.uvs
+    vertex_uvs = array.array('d', [0.0]) * (2 * model.vertex_count())
+    used = array.array('b', [0]) * model.vertex_count()
+    for material, texture in enumerate(model.materials):
+        output_file.write('MATERIAL %s\t65535\t65535\t65535\t0\t4\t0\t0\t0\t0\t0\t0\t0\t0\t0\r' % texture)
+
+        def material_triangles():
+            for triangle in model.triangles():
+                if triangle[0] == material:
+                    v = []
+                    for c in triangle[1:]:
+                        vertex, uv = corners[3 * c], corners[3 * c + 1]
+                        used[vertex] = 1
+                        vertex_uvs[2 * vertex] = t[2 * uv]
+                        vertex_uvs[2 * vertex + 1] = 1.0 - t[2 * uv + 1]
+                        v.append(vertex)
+                    yield v
+
+        write_batched(output_file, material_triangles(), lambda v: '%d\t%d\t%d\r' % tuple(v))
+        output_file.write('UVS\r')
+        write_batched(output_file, (i for i in xrange(model.vertex_count()) if used[i]), lambda i: '%d\t%f\t%f\r' % (i, vertex_uvs[2 * i], vertex_uvs[2 * i + 1]))
+        for i in xrange(model.vertex_count()):
+            used[i] = 0
+    output_file.write('END\r')
+    output_file.close()
+
+
+WRITERS = {'obj': write_obj, 'dat': write_dat, 'mesh': write_meshwork}
+
+
+#
+# Running converters
+#
+CONVERTERS = [
+    # name, input format, arguments after the input file, shapes
+    ('Obj2DatTexNorm', 'obj', ['--no-cache'], None),
+    # Decimation is only measured on the smooth models; the others have
+    # hard edges everywhere, which are kept.
+    ('Obj2DatTexNorm-LOD', 'obj', ['--no-cache', '--lod', '0.5,0.25'], ('sphere', 'materials')),
+    ('Obj2DatTex', 'obj', [], None),
+    ('DatScale', 'dat', ['2'], None),
+    ('Dat2Obj', 'dat', [], None),
+    # Dat2ObjTex can only convert models with a single texture.
+    ('Dat2ObjTex', 'dat', [], ('sphere', 'hull')),
+    ('Dat2Mesh', 'dat', [], None),
+    ('Mesh2Dat', 'mesh', [], None),
+    ('Mesh2DatTex', 'mesh', [], None),
+    ('Mesh2Obj', 'mesh', [], None)
+]
+
+# Variants of a converter, run with different options, are named after it.
+CONVERTER_SCRIPTS = {
+    'Obj2DatTexNorm-LOD': 'Obj2DatTexNorm'
+}
+
+SIZE_SUFFIXES = {'k': 1000, 'm': 1000000}
+
+
+def parse_size(size):
+    """ parse_size
+        Convert a size such as 100k or 5M to a number of triangles.
+    """
+    suffix = size[-1:].lower()
+    if suffix in SIZE_SUFFIXES:
+        return int(float(size[:-1]) * SIZE_SUFFIXES[suffix])
+    return int(size)
+
+
+def prepare_input(work_dir, shape, size, file_format, manifest):
+    """ prepare_input
+        Returns the path and triangle count of the input for a shape, size
+        and format, generating it if it is not already in the work directory.
+        manifest maps file names to triangle counts, and is updated with any
+        new inputs.
+    """
+    generator = dict((name, generator) for name, generator, formats in SHAPES)[shape]
+    format_dir = os.path.join(work_dir, file_format)
+    if not os.path.isdir(format_dir):
+        os.makedirs(format_dir)
+    file_name = os.path.join(format_dir, '%s-%s.%s' % (shape, size, file_format))
+    key = os.path.relpath(file_name, work_dir)
+    if not os.path.exists(file_name) or key not in manifest:
+        print 'Generating %s' % key
+        model = generator(parse_size(size))
+        WRITERS[file_format](model, file_name)
+        manifest[key] = model.triangle_count()
+    return file_name, manifest[key]
+
+
+def peak_rss_bytes(usage):
+    # ru_maxrss is in bytes on OS X and kilobytes elsewhere.
+    if sys.platform == 'darwin':
+        return usage.ru_maxrss
+    return usage.ru_maxrss * 1024
+
+
+def run_converter(command, cwd, timeout):
+    """ run_converter
+        Run a converter in a new process and returns (status, wall time, peak
+        RSS in bytes), where status is 'ok', 'failed' or 'timeout'.
+    """
+    devnull = open(os.devnull, 'w')
+    start = time.time()
+    process = subprocess.Popen(command, cwd=cwd, stdout=devnull, stderr=devnull)
+    timed_out = []
+
+    def kill():
+        timed_out.append(True)
+        os.kill(process.pid, signal.SIGKILL)
+
+    timer = threading.Timer(timeout, kill)
+    timer.start()
+    try:
+        pid, status, usage = os.wait4(process.pid, 0)
+    finally:
+        timer.cancel()
+    wall_time = time.time() - start
+    process.returncode = status
+    devnull.close()
+
+    if timed_out:
+        return 'timeout', None, None
+    if status != 0:
+        return 'failed', wall_time, peak_rss_bytes(usage)
+    return 'ok', wall_time, peak_rss_bytes(usage)
+
+
+def run_benchmarks(options):
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    work_dir = os.path.abspath(options.work_dir)
+    if not os.path.isdir(work_dir):
+        os.makedirs(work_dir)
+    manifest_name = os.path.join(work_dir, 'inputs.json')
+    manifest = {}
+    if os.path.exists(manifest_name):
+        manifest = json.load(open(manifest_name))
+
+    results = []
+    try:
+        for name, file_format, arguments, converter_shapes in CONVERTERS:
+            if options.converters and name not in options.converters:
+                continue
+            for shape, generator, formats in SHAPES:
+                if file_format not in formats or (converter_shapes is not None and shape not in converter_shapes):
+                    continue
+                if options.shapes and shape not in options.shapes:
+                    continue
+                for size in options.sizes:
+                    input_file_name, triangles = prepare_input(work_dir, shape, size, file_format, manifest)
+                    script = CONVERTER_SCRIPTS.get(name, name)
+                    command = [options.python, os.path.join(script_dir, script + '.py'), os.path.basename(input_file_name)] + arguments
+
+                    # Keep the best of the repeated runs.
+                    best = None
+                    for repeat in xrange(options.repeat):
+                        run = run_converter(command, os.path.dirname(input_file_name), options.timeout)
+                        if run[0] != 'ok':
+                            best = run
+                            break
+                        if best is None or run[1] < best[1]:
+                            best = run
+                    status, wall_time, peak_rss = best
+
+                    result = {
+                        'converter': name,
+                        'shape': shape,
+                        'size': size,
+                        'triangles': triangles,
+                        'status': status,
+                        'wall_time': wall_time,
+                        'peak_rss': peak_rss,
+                        'triangles_per_second': None
+                    }
+                    if status == 'ok' and wall_time > 0:
+                        result['triangles_per_second'] = triangles / wall_time
+                    results.append(result)
+
+                    if status == 'ok':
+                        print '%-18s %-10s %5s  %8.3f s  %8.1f MB  %10.0f triangles/s' % (name, shape, size, wall_time, peak_rss / 1048576.0, result['triangles_per_second'])
+                    else:
+                        print '%-18s %-10s %5s  %s' % (name, shape, size, status)
+    finally:
+        json.dump(manifest, open(manifest_name, 'w'), indent=1, sort_keys=True)
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timeout': options.timeout,
+        'repeat': options.repeat,
+        'results': results
+    }
+
+
+#
+# Comparison with a baseline
+#
+def compare_results(results, baseline, threshold):
+    """ compare_results
+        Print a comparison of results with a baseline and return the number
+        of regressions: runs more than threshold percent slower or larger
+        than in the baseline, or which no longer succeed.
+    """
+    def key(result):
+        return result['converter'], result['shape'], result['size']
+
+    baseline_results = dict((key(result), result) for result in baseline['results'])
+    limit = 1.0 + threshold / 100.0
+    regressions = 0
+
+    print
+    print 'Comparison with baseline (threshold %g%%):' % threshold
+    for result in results['results']:
+        base = baseline_results.get(key(result))
+        label = '%-18s %-10s %5s' % key(result)
+        if base is None or base['status'] != 'ok':
+            print '%s  no baseline' % label
+            continue
+        if result['status'] != 'ok':
+            print '%s  REGRESSION: %s' % (label, result['status'])
+            regressions += 1
+            continue
+
+        time_ratio = result['wall_time'] / base['wall_time']
+        memory_ratio = float(result['peak_rss']) / base['peak_rss']
+        problems = []
+        if time_ratio > limit:
+            problems.append('time')
+        if memory_ratio > limit:
+            problems.append('memory')
+        print '%s  time %+6.1f%%  memory %+6.1f%%%s' % (label, (time_ratio - 1.0) * 100.0, (memory_ratio - 1.0) * 100.0, '  REGRESSION: ' + ', '.join(problems) if problems else '')
+        if problems:
+            regressions += 1
+
+    return regressions
+
+
+#
+# Scaling
+#
+def report_scaling(results, limit):
+    """ report_scaling
+        Print how the time per triangle of each converter and shape grows from
+        the smallest to the largest size that converted successfully, and
+        return the number that grew by more than limit times. A converter that
+        scales linearly keeps roughly the same time per triangle; at small
+        sizes, the interpreter's start-up time makes it look slower.
+    """
+    runs = {}
+    for result in results['results']:
+        if result['status'] == 'ok' and result['triangles'] > 0:
+            runs.setdefault((result['converter'], result['shape']), []).append(result)
+
+    superlinear = 0
+    print
+    print 'Scaling (time per triangle, largest size relative to smallest):'
+    for name, file_format, arguments, converter_shapes in CONVERTERS:
+        for shape, generator, formats in SHAPES:
+            sizes = sorted(runs.get((name, shape), []), key=lambda result: result['triangles'])
+            if len(sizes) < 2:
+                continue
+            smallest, largest = sizes[0], sizes[-1]
+            ratio = (largest['wall_time'] / largest['triangles']) / (smallest['wall_time'] / smallest['triangles'])
+            problem = ''
+            if limit is not None and ratio > limit:
+                problem = '  SUPERLINEAR'
+                superlinear += 1
+            print '%-18s %-10s %5s -> %-5s  x%.2f%s' % (name, shape, smallest['size'], largest['size'], ratio, problem)
+
+    return superlinear
+
+
+argParser = argparse.ArgumentParser(description='Benchmark the mesh converters on synthetic models.')
+argParser.add_argument('--sizes', type=lambda value: value.split(','), default=['1k', '100k', '1M', '5M'],
+                       help='comma-separated model sizes in triangles, such as 1k,100k (default: 1k,100k,1M,5M)')
+argParser.add_argument('--shapes', type=lambda value: value.split(','), default=None,
+                       help='comma-separated shapes to use (default: %s)' % ','.join(shape[0] for shape in SHAPES))
+argParser.add_argument('--converters', type=lambda value: value.split(','), default=None,
+                       help='comma-separated converters to run (default: all)')
+argParser.add_argument('--work-dir', default='benchmark-inputs',
+                       help='directory for generated inputs, which are kept for later runs (default: benchmark-inputs)')
+argParser.add_argument('--repeat', type=int, default=1,
+                       help='run each conversion this many times and keep the fastest (default: 1)')
+argParser.add_argument('--timeout', type=float, default=600.0,
+                       help='seconds to allow each conversion before stopping it (default: 600)')
+argParser.add_argument('--python', default=sys.executable,
+                       help='Python interpreter used to run the converters (default: this one)')
+argParser.add_argument('-o', '--output', default='benchmark-results.json',
+                       help='file to write the JSON results to (default: benchmark-results.json)')
+argParser.add_argument('--baseline',
+                       help='JSON results of an earlier run to compare with')
+argParser.add_argument('--threshold', type=float, default=10.0,
+                       help='percentage by which a run may be slower or use more memory than the baseline before it counts as a regression (default: 10)')
+argParser.add_argument('--max-scaling', type=float, metavar='FACTOR', dest='max_scaling',
+                       help='fail if the time per triangle of a converter at the largest size is more than FACTOR times that at the smallest')
+argParser.add_argument('--compare', metavar='RESULTS',
+                       help='compare an existing results file with the baseline instead of running the benchmarks')
+
+
+def main():
+    options = argParser.parse_args()
+
+    if options.compare:
+        results = json.load(open(options.compare))
+    else:
+        for size in options.sizes:
+            try:
+                parse_size(size)
+            except ValueError:
+                print 'Unknown size %s' % size
+                exit(-1)
+        results = run_benchmarks(options)
+        json.dump(results, open(options.output, 'w'), indent=1, sort_keys=True)
+        print 'Results written to %s' % options.output
+
+    superlinear = report_scaling(results, options.max_scaling)
+
+    if options.baseline:
+        regressions = compare_results(results, json.load(open(options.baseline)), options.threshold)
+        if regressions != 0:
+            print '%u regressions.' % regressions
+            exit(1)
+        print 'No regressions.'
+
+    if superlinear != 0:
+        print '%u converters scale worse than linearly.' % superlinear
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
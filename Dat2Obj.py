@@ -8,9 +8,10 @@ Material for the faces is set to flat white (127,127,127)
 and surface normals need not be calculated.
 """
 
-import sys, string, math
+import sys, string
+from OoliteMesh import map_file, read_dat, PhaseProfiler, take_profile_options
 
-inputfilenames = sys.argv[1:]
+profileFileName, useCProfile, inputfilenames = take_profile_options(sys.argv[1:])
 print "converting..."
 print inputfilenames
 for inputfilename in inputfilenames:
@@ -19,56 +20,32 @@ for inputfilename in inputfilenames:
 	mtllibname = string.split(materialfilename, "/")[-1]
 	objname=mtllibname.replace(".mtl","")
 	print inputfilename+"->"+outputfilename+" & "+materialfilename
-	inputfile = open(inputfilename,"r")
-	lines = inputfile.read().splitlines(0)
+	profiler = PhaseProfiler('Dat2Obj', inputfilename, profileFileName is not None or useCProfile, useCProfile)
+	profiler.begin('parse', hot=True)
+	inputfile = open(inputfilename,"rb")
+	dat = read_dat(map_file(inputfile))
+	inputfile.close()
 	
-	mode = 'SKIP'
+	profiler.begin('convert', hot=True)
 	vertex_lines_out = []
 	faces_lines_out = ['g '+objname+'_default\n']
 	faces_lines_out.append ('usemtl default')
 	
-	n_verts = 0
-	n_faces = 0
-	skips = 0
-	vertex=[]
-
-	for line in lines:
-		if (mode == 'VERTEX'):
-			coordinates = string.split(line, ',')	# split line by commas
-			if (len(coordinates) == 3):
-				n_verts = n_verts + 1
-				x = -float(coordinates[0])
-				y = float(coordinates[1])
-				z = float(coordinates[2])
-				vertex.append( (x, y, z) )
-				vertex_lines_out.append('v %.5f %.5f %.5f\n' % ( x, y, z))
-				vertex.append( (x, y, z ) )
-		elif (mode == 'FACES'):
-			tokens = string.split(line, ',')	# split line by commas
-			if (len(tokens) > 9) :
-				color_data = tokens[0:3]
-				normal_data =tokens[3:6]
-				n_points = tokens[6]
-				point_data = tokens[7:]
-				n_faces = n_faces + 1
-				
-				faces_lines_out.append ('\nf ')
-				for i in range( 0,int(n_points)) :
-					faces_lines_out.append ('%i// ' % (int(point_data[i])+1))
-				#
-				
-		elif (mode == 'SKIP'):
-			skips = skips + 1
-		#
-		if (line[:6] == 'NVERTS'):
-			mode = 'SKIP'
-		if (line[:6] == 'NFACES'):
-			mode = 'SKIP'
-		if (line[:6] == 'VERTEX'):
-			mode = 'VERTEX'
-		if (line[:5] == 'FACES'):
-			mode = 'FACES'
+	positions = dat.positions
+	n_verts = len(positions) // 3
+	n_faces = len(dat.face_sizes)
+	
+	for i in range(n_verts):
+		x, y, z = positions[3*i:3*i+3]
+		vertex_lines_out.append('v %.5f %.5f %.5f\n' % ( -x, y, z))
+	first = 0
+	for n_points in dat.face_sizes:
+		faces_lines_out.append ('\nf ')
+		for v in dat.face_points[first:first + n_points] :
+			faces_lines_out.append ('%i// ' % (v+1))
+		first += n_points
 		#
+	profiler.begin('write')
 	outputfile = open(outputfilename,"w")
 	outputfile.write('# Exported with Dat2Obj.py (C) Giles Williams 2005 - Kaks 2008\n')
 	outputfile.write('mtllib %s\n' % mtllibname)
@@ -87,7 +64,7 @@ for inputfilename in inputfilenames:
 	materialfile.write(	'Kd 1.00000 1.00000 1.00000\nKa 1.00000 1.00000 1.00000\n')
 	materialfile.write(	'Ks 1.00000 1.00000 1.00000\nKe 0.00000e+0 0.00000e+0 0.00000e+0\n\n')
 	materialfile.close();
-
+	profiler.finish(profileFileName)
 print "done"
 print ""
 #
@@ -1,174 +1,311 @@
-#!/usr/bin/python 
+#!/usr/bin/python
 
-""" 
+"""
 This script takes an Oolite .dat file, scales it by a specified scale factor,
 and writes it out again (appending the scale factor to the name).
 
-Only the VERTEX section is modified. The rest of the file is passed through
-unchanged.
-""" 
-
-import sys, string, math, re
-
-
-class DATLexer:
-	""" Tokens scanner for DAT files. """
-	def __init__(self, data):
-		self.__data = data
-		self.__end = len(data)
-		self.__cursor = 0
-		self.__tokenLength = 0
-		self.__lineNumber = 1
-		self.__lastSeparator = ""
-		self.__isSeparatorChar = re.compile(r"[\ \r\n\t,]")
-		self.__isLineEnd = re.compile(r"[\r\n]")
-		self.__isNotLineEnd = re.compile(r"[^\r\n]")
-		self.__lastIsCR = False
-	
-	def lineNumber(self):
-		""" Returns the line number at the beginning of the current token. """
-		return self.__lineNumber
-	
-	def currentToken(self):
-		""" Returns the current token. """
-		return self.__currentToken
-		
-	def lastSeparator(self):
-		""" Returns the non-token content between the current token and the previous token. """
-		return self.__lastSeparator
-	
-	def nextToken(self):
-		""" Reads the next token. """
-		self.__advance(False)
-		return self.currentToken()
-	
-	def expectLiteral(self, literal):
-		""" Reads a token and checks whether it matches the expected string. """
-		return self.nextToken() == literal
-	
-	def readInt(self):
-		""" Reads an integer. """
-		self.__advance(False)
-		return int(self.currentToken())
-	
-	def readFloat(self):
-		""" Reads a floating-point number. """
-		self.__advance(False)
-		return float(self.currentToken())
-	
-	def readUntilNewLine(self):
-		""" Reads until the beginning of a new line or the beginning of a comment. """
-		sef.__advance(True)
-		return self.currentToken()
-		
-	def atEnd(self):
-		""" Tests whether the lexer has reached the end of its data. """
-		return self.__cursor == self.__end
-	
-	
-	def __advance(self, untilEOL):
-		self.__cursor += self.__tokenLength
-		assert self.__cursor < self.__end
-		initialCursor = self.__cursor
-		
-		# Find beginning of token.
-		while 1:
-			self.__skipWhile(self.__isSeparatorChar)
-			
-			if not self.atEnd() and self.__commentAt(self.__cursor):
-				self.__skipWhile(self.__isNotLineEnd)
+Besides a uniform scale factor, a non-uniform scale, a rotation and a
+translation can be given as options. They are applied in that order: scale,
+then rotation about the X, Y and Z axes in turn, then translation.
+
+Only the VERTEX section is modified by a uniform scale or a translation, and
+the rest of the file is copied unchanged as a single slice of the input. A
+non-uniform scale or rotation also changes the directions of the face normals
+in FACES and of any NORMALS and TANGENTS; normals are transformed by the
+inverse transpose of the transformation so that they stay perpendicular to
+the surface. These sections are rewritten with comma separators. A
+transformation that mirrors the model also reverses the order of each face's
+vertices and texture coordinates, so that faces keep pointing outwards. The
+exception is a negative scale factor given on its own: as in earlier versions,
+it only scales the vertices and copies the rest of the file. Other content is
+passed through unchanged.
+"""
+
+import math, argparse
+from OoliteMesh import map_file, read_dat, dat_tokens, PhaseProfiler
+
+
+# Vertices and faces are formatted this many at a time.
+VERTEX_BATCH_SIZE = 4096
+
+
+def parseVector(text):
+	components = [float(component) for component in text.split(",")]
+	if len(components) != 3:
+		raise argparse.ArgumentTypeError("expected three comma-separated numbers, got \"" + text + "\"")
+	return components
+
+
+def multiplyMatrices(a, b):
+	return [[sum(a[i][k] * b[k][j] for k in range(3)) for j in range(3)] for i in range(3)]
+
+
+def makeLinearTransform(scale, rotation):
+	""" Returns the 3x3 matrix (as a list of rows) which scales by scale,
+		then rotates by rotation[0], [1] and [2] degrees about the X, Y and Z
+		axes in turn.
+	"""
+	matrix = [[scale[0], 0.0, 0.0], [0.0, scale[1], 0.0], [0.0, 0.0, scale[2]]]
+	for axis in range(3):
+		if rotation[axis] == 0.0:
+			continue
+		angle = math.radians(rotation[axis])
+		c = math.cos(angle)
+		s = math.sin(angle)
+		j = (axis + 1) % 3
+		k = (axis + 2) % 3
+		rotate = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]
+		rotate[j][j] = c
+		rotate[j][k] = -s
+		rotate[k][j] = s
+		rotate[k][k] = c
+		matrix = multiplyMatrices(rotate, matrix)
+	return matrix
+
+
+def determinant(m):
+	return (m[0][0] * (m[1][1] * m[2][2] - m[1][2] * m[2][1])
+		- m[0][1] * (m[1][0] * m[2][2] - m[1][2] * m[2][0])
+		+ m[0][2] * (m[1][0] * m[2][1] - m[1][1] * m[2][0]))
+
+
+def inverseTranspose(m):
+	""" Returns the inverse transpose of m, the matrix which transforms
+		normals: the cofactor matrix of m divided by its determinant.
+	"""
+	det = determinant(m)
+	cofactors = [[0.0] * 3 for i in range(3)]
+	for i in range(3):
+		for j in range(3):
+			i1, i2 = (i + 1) % 3, (i + 2) % 3
+			j1, j2 = (j + 1) % 3, (j + 2) % 3
+			cofactors[i][j] = (m[i1][j1] * m[i2][j2] - m[i1][j2] * m[i2][j1]) / det
+	return cofactors
+
+
+def transformPoints(values, m, offset):
+	""" Transforms a flat list of x, y, z values by the matrix m and then
+		the translation offset, returning a new flat list. Each output
+		coordinate is computed for all points at once, and zero terms are
+		skipped, so that a plain scale gives exactly the same values as
+		multiplying each coordinate.
+	"""
+	components = [values[0::3], values[1::3], values[2::3]]
+	result = [0.0] * len(values)
+	for row in range(3):
+		column = None
+		for k in range(3):
+			coefficient = m[row][k]
+			if coefficient == 0.0:
+				continue
+			if column is None:
+				column = [coefficient * v for v in components[k]]
 			else:
+				column = [c + coefficient * v for c, v in zip(column, components[k])]
+		if offset[row] != 0.0:
+			d = offset[row]
+			column = [c + d for c in column]
+		result[row::3] = column
+	return result
+
+
+def transformDirections(values, m):
+	""" Transforms a flat list of x, y, z directions by the matrix m and
+		normalizes the results. Zero vectors are left as they are.
+	"""
+	result = transformPoints(values, m, (0.0, 0.0, 0.0))
+	for i in range(0, len(result), 3):
+		x, y, z = result[i:i + 3]
+		length = math.sqrt(x * x + y * y + z * z)
+		if length != 0.0:
+			result[i:i + 3] = [x / length, y / length, z / length]
+	return result
+
+
+def writeVectors(outputFile, values, format):
+	""" Writes a flat list of x, y, z values one vector to a line, using a
+		single string formatting operation per batch of vectors.
+	"""
+	batch = 3 * VERTEX_BATCH_SIZE
+	for start in range(0, len(values), batch):
+		chunk = values[start:start + batch]
+		outputFile.write((format * (len(chunk) // 3)) % tuple(chunk))
+
+
+def writeFaces(outputFile, dat, normalMatrix, mirrored):
+	""" Writes the FACES section with transformed face normals, reversing the
+		order of each face's vertices if the transformation mirrors the
+		model.
+	"""
+	# Zero normals, which Oolite calculates itself, stay as they are.
+	normals = transformDirections(dat.face_normals, normalMatrix)
+	colors = dat.face_colors
+	points = dat.face_points.tolist()
+	outputFile.write("FACES")
+	lines = []
+	first = 0
+	for i, size in enumerate(dat.face_sizes):
+		facePoints = points[first:first + size]
+		if mirrored:
+			facePoints.reverse()
+		j = 3 * i
+		lines.append("\n%g,%g,%g,\t%f,%f,%f,\t%d,\t" % (colors[j], colors[j + 1], colors[j + 2], normals[j], normals[j + 1], normals[j + 2], size)
+			+ ",".join(map(str, facePoints)))
+		first += size
+		if len(lines) == VERTEX_BATCH_SIZE:
+			outputFile.write("".join(lines))
+			lines = []
+	outputFile.write("".join(lines))
+
+
+def writeMirroredTextures(outputFile, data, start, end, faceSizes):
+	""" Writes the TEXTURES section between offsets start and end with each
+		face's texture coordinates reversed along with its vertices. The
+		values are copied as written, one face to a line.
+	"""
+	outputFile.write("TEXTURES")
+	pending = []
+	face = 0
+	for tokens in dat_tokens(data, start + len("TEXTURES"), end):
+		if pending:
+			tokens = pending + tokens
+		lines = []
+		i = 0
+		while True:
+			# Material name and texture scale, then a u, v pair for each
+			# vertex.
+			vertexCount = faceSizes[face] if face < len(faceSizes) else 3
+			if i + 3 + 2 * vertexCount > len(tokens):
 				break
-		
-		self.__lastSeparator = self.__data[initialCursor:self.__cursor]
-		
-		# Find length of token.
-		endCursor = None
-		if untilEOL:
-			endCursor = self.__scanTokenLength(self.__isLineEnd)
+			pairs = [tokens[j] + " " + tokens[j + 1] for j in range(i + 3, i + 3 + 2 * vertexCount, 2)]
+			pairs.reverse()
+			lines.append("\n" + tokens[i] + "\t" + tokens[i + 1] + " " + tokens[i + 2] + "\t" + "\t".join(pairs))
+			i += 3 + 2 * vertexCount
+			face += 1
+		outputFile.write("".join(lines))
+		pending = tokens[i:]
+
+
+def transformSections(data, dat, outputFile, offset, linear, normalMatrix, mirrored):
+	""" Writes the sections after VERTEX, which ends at offset, rewriting
+		FACES, NORMALS and TANGENTS with transformed directions, and TEXTURES
+		if the model is mirrored. Everything else, including comments and
+		blank lines between sections, is copied from data unchanged, so each
+		rewritten section starts each line with its line break and ends at
+		its last value.
+	"""
+	for heading, start, end in dat.sections:
+		if start < offset:
+			continue
+		outputFile.write(data[offset:start])
+		if heading == "FACES":
+			writeFaces(outputFile, dat, normalMatrix, mirrored)
+		elif heading == "TEXTURES" and mirrored:
+			writeMirroredTextures(outputFile, data, start, end, dat.face_sizes)
+		elif heading == "NORMALS":
+			outputFile.write("NORMALS")
+			writeVectors(outputFile, transformDirections(dat.normals, normalMatrix), '\n% .5f,% .5f,% .5f')
+		elif heading == "TANGENTS":
+			outputFile.write("TANGENTS")
+			writeVectors(outputFile, transformDirections(dat.tangents, linear), '\n% .5f,% .5f,% .5f')
 		else:
-			endCursor = self.__scanTokenLength(self.__isSeparatorChar)
-		
-		self.__tokenLength = endCursor - self.__cursor
-		self.__currentToken = self.__data[self.__cursor:endCursor]
-	
-	
-	def __skipWhile(self, matcher):
-		while 1:
-			if self.__cursor == self.__end:
-				return
-			
-			curr = self.__data[self.__cursor]
-			if not matcher.match(curr):
-				return
-			
-			if self.__isNotLineEnd.match(curr):
-				self.__lastIsCR = False
-			else:
-				if curr != '\n' or not self.__lastIsCR:
-					self.__lineNumber = self.__lineNumber + 1
-				self.__lastIsCR = curr == '\r'
-			
-			self.__cursor = self.__cursor + 1
-	
-	def __scanTokenLength(self, endCriterion):
-		endCursor = self.__cursor + 1
-		while endCursor < self.__end and not endCriterion.match(self.__data[endCursor]) and not self.__commentAt(endCursor):
-			endCursor = endCursor + 1
-		return endCursor
-	
-	def __commentAt(self, offset):
-		if self.__data[offset] == '#':
-			return True
-		if offset + 1 < self.__end and self.__data[offset] == '/' and self.__data[offset + 1] == '/':
-			return True
-		return False
-	
-
-if len(sys.argv) != 3:
-	print "Expected two arguments, file name and scale factor."
-	exit(1)
-
-inputFileName = sys.argv[1]
-factor = float(sys.argv[2])
-
-outputFileName = ""
-outputFileComponents = inputFileName.rsplit(".", 1)
-if len(outputFileComponents) == 1 or outputFileComponents[1].lower() != "dat":
-	outputFileName = inputFileName
-else:
-	outputFileName = outputFileComponents[0]
+			outputFile.write(data[start:end])
+		offset = end
+	outputFile.write(data[offset:])
 
-outputFileName += " x " + str(factor) + ".dat";
 
-print "Scaling \"" + inputFileName + "\" by " + str(factor) + " to \"" + outputFileName + "\"..."
+argParser = argparse.ArgumentParser(description='Scale, rotate or move an Oolite DAT model.')
+argParser.add_argument('file',
+                       help='the DAT file to transform')
+argParser.add_argument('factor', type=float, nargs='?',
+                       help='a scale factor for all three axes; as in earlier versions, a negative factor only scales the vertices and leaves the faces inside out (use --scale=-1,-1,-1 to mirror the faces as well)')
+argParser.add_argument('-s', '--scale', type=parseVector, default=[1.0, 1.0, 1.0], metavar='X,Y,Z',
+                       help='scale by different factors along the X, Y and Z axes; negative factors mirror the model (write them as --scale=-1,1,1)')
+argParser.add_argument('-r', '--rotate', type=parseVector, default=[0.0, 0.0, 0.0], metavar='X,Y,Z',
+                       help='rotate by the given angles in degrees about the X, Y and Z axes, in that order, after scaling')
+argParser.add_argument('-t', '--translate', type=parseVector, default=[0.0, 0.0, 0.0], metavar='X,Y,Z',
+                       help='move by the given offset after scaling and rotating')
+argParser.add_argument('-o', '--output', metavar='FILE',
+                       help='the output file name (default: the input name with the scale factor, or "transformed", appended)')
+argParser.add_argument('--profile', metavar='FILE',
+                       help='append the wall time, CPU time and peak memory of each phase to FILE as a line of JSON')
+argParser.add_argument('--cprofile', action='store_true',
+                       help='also run the vertex transformation under cProfile, saving the statistics as <input file>.prof')
 
-nVerts = 0
-inputFile = open(inputFileName, "r")
-fileData = inputFile.read()
-lexer = DATLexer(fileData)
+args = argParser.parse_args()
+if args.factor is None and args.scale == [1.0, 1.0, 1.0] and args.rotate == [0.0, 0.0, 0.0] and args.translate == [0.0, 0.0, 0.0]:
+	argParser.error("expected a scale factor or a --scale, --rotate or --translate option.")
 
-lexer.expectLiteral("NVERTS")
-nverts = lexer.readInt()
-lexer.expectLiteral("NFACES")
-nfaces = lexer.readInt()
-lexer.expectLiteral("VERTEX")
+inputFileName = args.file
+factor = args.factor
+if factor is None:
+	factor = 1.0
+scale = [factor * component for component in args.scale]
+linear = makeLinearTransform(scale, args.rotate)
+if determinant(linear) == 0.0:
+	argParser.error("the transformation flattens the model; scale factors must not be zero.")
+normalMatrix = inverseTranspose(linear)
+mirrored = determinant(linear) < 0.0
 
-outputFile = open(outputFileName, "w")
-outputFile.write("// " + inputFileName + " rescaled by a factor of " + str(factor) + "\n\n")
-outputFile.write("NVERTS " + str(nverts) + "\nNFACES " + str(nfaces) + "\n\nVERTEX\n");
+# A plain scale factor has always only multiplied the vertices, even when it
+# is negative (which turns the faces inside out), and named the output after
+# the factor; it still does, so existing scripts get the same files.
+noRotateOrTranslate = args.rotate == [0.0, 0.0, 0.0] and args.translate == [0.0, 0.0, 0.0]
+plainFactor = args.factor is not None and args.scale == [1.0, 1.0, 1.0] and noRotateOrTranslate
+# A positive uniform scale, possibly with a translation, leaves all directions
+# as they are.
+uniform = plainFactor or (scale[0] > 0.0 and scale[0] == scale[1] == scale[2] and args.rotate == [0.0, 0.0, 0.0])
+uniformScaleOnly = uniform and args.translate == [0.0, 0.0, 0.0] and args.factor is not None
 
+if args.output is not None:
+	outputFileName = args.output
+else:
+	outputFileName = ""
+	outputFileComponents = inputFileName.rsplit(".", 1)
+	if len(outputFileComponents) == 1 or outputFileComponents[1].lower() != "dat":
+		outputFileName = inputFileName
+	else:
+		outputFileName = outputFileComponents[0]
+
+	if args.factor is not None and noRotateOrTranslate:
+		outputFileName += " x " + str(factor) + ".dat";
+	else:
+		outputFileName += " transformed.dat"
 
-for i in range(nverts):
-	x = lexer.readFloat() * factor
-	y = lexer.readFloat() * factor
-	z = lexer.readFloat() * factor
-	
-	outputFile.write('% 5f,% .5f,% .5f\n' % (x, y, z))
-	#outputFile.write(str(x * factor) + ", " + str(y * factor) + ", " + str(z * factor) + "\n")
+if uniformScaleOnly:
+	description = "rescaled by a factor of " + str(factor)
+	print "Scaling \"" + inputFileName + "\" by " + str(factor) + " to \"" + outputFileName + "\"..."
+else:
+	description = "transformed by scale (%g, %g, %g), rotation (%g, %g, %g), translation (%g, %g, %g)" % tuple(scale + args.rotate + args.translate)
+	print "Transforming \"" + inputFileName + "\" to \"" + outputFileName + "\"..."
+
+profiler = PhaseProfiler('DatScale', inputFileName, args.profile is not None or args.cprofile, args.cprofile)
+profiler.begin('parse', hot=True)
+inputFile = open(inputFileName, "rb")
+fileData = map_file(inputFile)
+if uniform:
+	dat = read_dat(fileData, ("NVERTS", "NFACES", "VERTEX"))
+else:
+	# Mirrored texture coordinates are copied from the file as written.
+	dat = read_dat(fileData, ("NVERTS", "NFACES", "VERTEX", "FACES", "NORMALS", "TANGENTS"))
+vertexEnd = [end for heading, start, end in dat.sections if heading == "VERTEX"][0]
 
+profiler.begin('vertices', hot=True)
+outputFile = open(outputFileName, "wb")
+outputFile.write("// " + inputFileName + " " + description + "\n\n")
+outputFile.write("NVERTS " + str(dat.vertex_count) + "\nNFACES " + str(dat.face_count) + "\n\nVERTEX\n");
 
-while not lexer.atEnd():
-	token = lexer.nextToken();
-	outputFile.write(lexer.lastSeparator())
-	outputFile.write(token)
+
+vertices = transformPoints(dat.positions, linear, args.translate)
+writeVectors(outputFile, vertices, '% 5f,% .5f,% .5f\n')
+
+
+if uniform:
+	# Nothing after VERTEX changes, so copy the rest of the file in one go.
+	profiler.begin('copy')
+	outputFile.write(fileData[vertexEnd:])
+else:
+	profiler.begin('transform sections', hot=True)
+	transformSections(fileData, dat, outputFile, vertexEnd, linear, normalMatrix, mirrored)
+outputFile.close()
+profiler.finish(args.profile)
@@ -9,9 +9,12 @@ A .mtl file is created for texture materials.
 No surface normals are calculated.
 """
 
-import sys, string, math
+import sys, string, array
+from OoliteMesh import read_lines, parse_meshwork, VertexIndex, PhaseProfiler, take_profile_options
 
-inputfilenames = sys.argv[1:]
+# -v or --verbose prints the texture coordinates found for each texture.
+verbose = '-v' in sys.argv[1:] or '--verbose' in sys.argv[1:]
+profileFileName, useCProfile, inputfilenames = take_profile_options([name for name in sys.argv[1:] if name not in ('-v', '--verbose')])
 print "converting..."
 print inputfilenames
 for inputfilename in inputfilenames:
@@ -19,92 +22,46 @@ for inputfilename in inputfilenames:
 	materialfilename = inputfilename.lower().replace(".mesh",".mtl")
 	mtllibname = string.split(materialfilename, "/")[-1]
 	print inputfilename+"->"+outputfilename+" & "+materialfilename
+	profiler = PhaseProfiler('Mesh2Obj', inputfilename, profileFileName is not None or useCProfile, useCProfile)
+	profiler.begin('parse', hot=True)
 	inputfile = open(inputfilename,"r")
-	lines = inputfile.read().splitlines(0)
+	mesh = parse_meshwork(read_lines(inputfile))
+	inputfile.close()
+	profiler.begin('convert', hot=True)
 	outputfile = open(outputfilename,"w")
 	materialfile = open(materialfilename,"w")
-	mode = 'SKIP'
 	vertex_lines_out = ['# vertices...\n']
-	faces_lines_out = ['# faces...\n']
-	n_verts = 0
-	n_faces = 0
+	n_verts = mesh.vertex_count()
+	n_faces = mesh.face_count()
 	n_uvs = 0
-	skips = 0
-	vertex=[]
-	face=[]
 	uv_lines_out=['# texture uvs...\n']
-	textures=[]
-	normalForVertex=[]
-	uvForVertex=[]
+	textures = mesh.materials
 	uvIndexForKey={}
 	uvsForTexture={}
-	textureForFace=[]
-	textureCounter = 0
-	for line in lines:
-		if (mode == 'VERTEX'):
-			coordinates = string.split(line, '\t')	# split line by tabs
-			if (len(coordinates) == 4):
-				n_verts = n_verts + 1
-				vertex_lines_out.append('v %.5f %.5f %.5f\n' % (float(coordinates[1]), float(coordinates[2]), float(coordinates[3])))
-				vertex.append( (float(coordinates[1]), float(coordinates[2]), float(coordinates[3])) )
-		elif (mode == 'FACES'):
-			tokens = string.split(line, '\t')	# split line by tabs
-			if (len(tokens) == 3):
-				n_faces = n_faces + 1
-				v1 = int(tokens[0])
-				v2 = int(tokens[1])
-				v3 = int(tokens[2])
-				d0 = (vertex[v2][0]-vertex[v1][0], vertex[v2][1]-vertex[v1][1], vertex[v2][2]-vertex[v1][2])
-				d1 = (vertex[v3][0]-vertex[v2][0], vertex[v3][1]-vertex[v2][1], vertex[v3][2]-vertex[v2][2])
-				xp = (d0[1]*d1[2]-d0[2]*d1[1], d0[2]*d1[0]-d0[0]*d1[2], d0[0]*d1[1]-d0[1]*d1[0])
-				det = 1.0 / math.sqrt(xp[0]*xp[0] + xp[1]*xp[1] + xp[2]*xp[2])
-				norm = (xp[0]*det, xp[1]*det, xp[2]*det)
-				face.append((v1,v2,v3))
-				if (interpretTexture):
-					textureForFace.append(textureName)
-		elif (mode == 'TEXTURE'):
-			tokens = string.split(line, '\t')	# split line by tabs
-			if (len(tokens) == 3):
-				v1 = int(tokens[0])
-				uu = 1.0 - float(tokens[1])
-				vv = 1.0 - float(tokens[2])
-				if ((uu > 1.0)|(uu < 0.0)|(vv > 1.0)|(vv < 0.0)):
-					uu = 0.0
-					vv = 0.0
-				uv_key = 'vt %.5f %.5f\n' % (uu, vv)
-				uv_index = n_uvs
-				if (uvIndexForKey.has_key(uv_key)):
-					# existing uv coordinates
-					uv_index = uvIndexForKey[uv_key]
-				else:
-					# new, unique uv coordinates
-					uvIndexForKey[uv_key] = uv_index
-					uv_lines_out.append(uv_key)
-					n_uvs = n_uvs + 1
-				uvsForTexture[textureName][v1] = (uu,vv,uv_index)
-		elif (mode == 'SKIP'):
-			skips = skips + 1
-		if (line[:8] == 'VERTICES'):
-			mode = 'VERTEX'
-		if (line[:8] == 'MATERIAL'):
-			mode = 'FACES'
-			interpretTexture = 0
-			tokens = string.split(line, '\t')	# split line by tabs
-			if (len(tokens) == 15):
-				name_parts = string.split(tokens[0],' ')
-				name_parts.append("texture%d.png" % textureCounter)
-				textureName = name_parts[1]
-				if (tokens[5] == '4'):
-					interpretTexture = 1
-					textures.append(textureName)
-					uvsForTexture[textureName] = n_verts * [[]]
-		if (line[:5] == 'EDGES'):
-			mode = 'SKIP'
-		if (line[:3] == 'UVS'):
-			if (interpretTexture):
-				mode = 'TEXTURE'
+	for i in range(n_verts):
+		vertex_lines_out.append('v %.5f %.5f %.5f\n' % mesh.position(i))
+	# a texture named by more than one material uses the last one's uvs
+	for textureName, (vertices, uvs) in zip(textures, mesh.material_uvs):
+		uvIndices = array.array('i', [0]) * len(vertices)
+		uvsForTexture[textureName] = (VertexIndex(vertices), uvIndices)
+		for i in range(len(vertices)):
+			uu = 1.0 - uvs[2*i]
+			vv = 1.0 - uvs[2*i+1]
+			if ((uu > 1.0)|(uu < 0.0)|(vv > 1.0)|(vv < 0.0)):
+				uu = 0.0
+				vv = 0.0
+			uv_key = 'vt %.5f %.5f\n' % (uu, vv)
+			uv_index = n_uvs
+			if (uvIndexForKey.has_key(uv_key)):
+				# existing uv coordinates
+				uv_index = uvIndexForKey[uv_key]
 			else:
-				mode = 'SKIP'
+				# new, unique uv coordinates
+				uvIndexForKey[uv_key] = uv_index
+				uv_lines_out.append(uv_key)
+				n_uvs = n_uvs + 1
+			uvIndices[i] = uv_index
+	profiler.begin('write')
 	outputfile.write('# exported using Mesh2Obj.py (C) Giles Williams 2005\n')
 	outputfile.write('mtllib %s\n' % mtllibname)
 	outputfile.write('o exported_mesh\n')
@@ -118,9 +75,11 @@ for inputfilename in inputfilenames:
 	materialfile.write('# exported using Mesh2Obj.py (C) Giles Williams 2005\n')
 	# check that we have textures for every vertex...
 	okayToWriteTexture = 1
-	print "uvsForTexture :"
-	print uvsForTexture
-	if (len(textureForFace) != len(face)):
+	if verbose:
+		print "uvsForTexture :"
+		for textureName, (uvIndex, uvIndices) in uvsForTexture.items():
+			print textureName, dict((v, uv_lines_out[uvIndices[i] + 1].split()[1:]) for v, i in uvIndex.items())
+	if (mesh.face_materials.count(-1) != 0):
 		okayToWriteTexture = 0
 	outputfile.write('# groups ...\n')
 	group_ctr = 1
@@ -136,18 +95,19 @@ for inputfilename in inputfilenames:
 			outputfile.write('usemtl material%d_auv\n' % group_ctr)
 			group_ctr = group_ctr + 1
 			outputfile.write('# uses texture \'%s\'\n' % texture)
-			for i in range(0, len(face)):
-				facet = face[i]
-				texture_for_face = textureForFace[i]
+			for i in range(0, n_faces):
+				facet = mesh.triangle(i)
+				texture_for_face = textures[mesh.face_materials[i]]
 				if (texture == texture_for_face):
-					uvForVertex = uvsForTexture[texture]
-					outputfile.write('f %d/%d/ %d/%d/ %d/%d/\n' % (facet[0] + 1, uvForVertex[facet[0]][2] + 1, facet[1] + 1, uvForVertex[facet[1]][2] + 1, facet[2] + 1, uvForVertex[facet[2]][2] + 1, ))
+					uvIndex, uvIndices = uvsForTexture[texture]
+					outputfile.write('f %d/%d/ %d/%d/ %d/%d/\n' % (facet[0] + 1, uvIndices[uvIndex[facet[0]]] + 1, facet[1] + 1, uvIndices[uvIndex[facet[1]]] + 1, facet[2] + 1, uvIndices[uvIndex[facet[2]]] + 1, ))
 				# endif
 			# next i
 		# endif
 	# next texture
 	outputfile.close();
 	materialfile.close();
+	profiler.finish(profileFileName)
 print "done"
 print ""
 #
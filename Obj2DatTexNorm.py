@@ -18,13 +18,35 @@ only.
 
 import sys
 import os
-import string
 import argparse
 import math
-import decimal
+import itertools
+import multiprocessing
+import traceback
+import StringIO
+import cStringIO
+import array
+import collections
+import hashlib
+import re
+import contextlib
+import shutil
+import tempfile
+import threading
+import Queue
+import time
 
+try:
+    import watchdog.events
+    import watchdog.observers
+except ImportError:
+    # --watch then finds changes by polling alone.
+    watchdog = None
+
+from OoliteMesh import (read_lines, parse_obj, generate_normals, parse_material_library, triangulate_polygon,
+                        VERTEX_CACHE_SIZE, vertex_cache_statistics, optimize_vertex_cache, renumber_vertices, decimate_mesh,
+                        PhaseProfiler, append_profile_record)
 
-args = None
 
 
 #
@@ -144,54 +166,89 @@ def format_number(n):
         Format a float with up to five decimal places, making it as short as
         possible without discarding information.
         
-        Based on accepted answer by samplebias at
-        http://stackoverflow.com/questions/5807952/removing-trailing-zeros-in-python
+        This is '%.5f' with trailing zeros (and a trailing point) removed, so
+        negative values that round to zero come out as '-0'.
     """
     try:
-        dec = decimal.Decimal('%.5f' % n)
+        val = ('%.5f' % n).rstrip('0')
     except:
         return 'bad'
-    tup = dec.as_tuple()
-    delta = len(tup.digits) + tup.exponent
-    digits = ''.join(str(d) for d in tup.digits)
-    if delta <= 0:
-        zeros = abs(tup.exponent) - len(tup.digits)
-        val = '0.' + ('0' * zeros) + digits
-    else:
-        val = digits[:delta] + ('0' * tup.exponent) + '.' + digits[delta:]
-    val = val.rstrip('0')
     if val[-1] == '.':
         val = val[:-1]
+    return val
+
+
+def format_numbers(numbers):
+    """ format_numbers
+        Format an iterable of floats with format_number(), returning a list of
+        strings. Each distinct value is only formatted once, which pays off
+        for the many repeated values in quantized or symmetrical meshes.
+    """
+    cache = {}
     
-    if tup.sign:
-        return '-' + val
-    else:
+    def format_and_cache(n):
+        val = format_number(n)
+        # 0.0 and -0.0 are equal as keys but format differently.
+        if n != 0:
+            cache[n] = val
         return val
+    
+    return [cache[n] if n in cache else format_and_cache(n) for n in numbers]
 
 
-def format_vector(v):
-    if args.pretty_output:
+def format_vector(v, options):
+    if options.pretty_output:
         return '% .5f,% .5f,% .5f' % v
     else:
         x, y, z = v
         return '%s %s %s' % (format_number(x), format_number(y), format_number(z))
 
 
-def format_normal(n):
-    if args.flip_normals:
-        return format_vector(vector_flip(n))
+def format_vectors(vectors, options):
+    """ format_vectors
+        Format a list of vectors as format_vector() does, but in one batch.
+    """
+    if options.pretty_output:
+        return ['% .5f,% .5f,% .5f' % v for v in vectors]
+    else:
+        numbers = iter(format_numbers(itertools.chain.from_iterable(vectors)))
+        return ['%s %s %s' % xyz for xyz in itertools.izip(numbers, numbers, numbers)]
+
+
+def format_normal(n, options):
+    if options.flip_normals:
+        return format_vector(vector_flip(n), options)
+    else:
+        return format_vector(n, options)
+
+
+def format_normals(normals, options):
+    if options.flip_normals:
+        return format_vectors([vector_flip(n) for n in normals], options)
     else:
-        return format_vector(n)
+        return format_vectors(normals, options)
 
 
-def format_textcoord(st):
-    if args.pretty_output:
+def format_textcoord(st, options):
+    if options.pretty_output:
         return '% .5f,% .5f' % st
     else:
         s, t = st
         return '%s %s' % (format_number(s), format_number(t))
 
 
+def format_textcoords(sts, options):
+    """ format_textcoords
+        Format a list of texture coordinate pairs as format_textcoord() does,
+        but in one batch.
+    """
+    if options.pretty_output:
+        return ['% .5f,% .5f' % st for st in sts]
+    else:
+        numbers = iter(format_numbers(itertools.chain.from_iterable(sts)))
+        return ['%s %s' % st for st in itertools.izip(numbers, numbers)]
+
+
 #
 # Argument handling
 #
@@ -233,6 +290,21 @@ Available modes:
         parser.exit()
 
 
+def parse_ratios(text):
+    """ parse_ratios
+        Argparse type for --lod: a comma-separated list of ratios between 0
+        and 1.
+    """
+    try:
+        ratios = [float(ratio) for ratio in text.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected comma-separated ratios, got \'%s\'' % text)
+    for ratio in ratios:
+        if not 0.0 < ratio < 1.0:
+            raise argparse.ArgumentTypeError('level of detail ratios must be between 0 and 1, got %g' % ratio)
+    return ratios
+
+
 
 
 
@@ -240,7 +312,7 @@ Available modes:
 argParser = argparse.ArgumentParser(description='''Convert OBJ meshes to Oolite DAT format.
                                                    This tool preserves normals (face directions for lighting purposes)
                                                    stored in the OBJ file, rather than making Oolite recalculate them.''')
-argParser.add_argument('files', nargs='+',
+argParser.add_argument('files', nargs='*',
                   help='the files to convert')
 argParser.add_argument('-w', '--winding-mode', type=int, default=2, metavar='MODE', dest='winding_mode',
                   help='''Specify winding mode (default: %(default)s). Winding determines which side of a triangle is out.
@@ -253,13 +325,41 @@ argParser.add_argument('-m', '--preserve-material-names', action='store_false',
                        help='Keep abstract material names from material library, instead of renaming materials after their diffuse map. Only use if you\'ll be creating material dictionaries.')
 argParser.add_argument('-p', '--pretty-output', action='store_true', dest='pretty_output',
                        help='Create a file that\'s easier for humans to read, but larger and slower to parse')
+argParser.add_argument('--ear-clipping', action='store_true', dest='ear_clipping',
+                       help='Triangulate concave polygons by ear clipping instead of fanning them from their first corner, which only works for convex polygons')
+argParser.add_argument('--optimize-vertex-cache', action='store_true', dest='optimize_vertex_cache',
+                       help='Reorder faces and vertices so that the GPU transforms fewer vertices when drawing the model, and report the improvement')
+argParser.add_argument('--lod', type=parse_ratios, default=[], metavar='RATIO[,RATIO...]',
+                       help='Also write simplified levels of detail with about RATIO times as many faces, such as 0.5 or 0.25, as <name>-lod<RATIO>.dat. Texture seams, hard edges and material borders are kept')
+argParser.add_argument('--weld-tolerance', type=float, default=0.0, metavar='DISTANCE', dest='weld_tolerance',
+                       help='Merge vertices closer together than DISTANCE, such as 0.0001, where their normals and texture coordinates match (default: only merge identical vertices)')
+argParser.add_argument('--crease-angle', type=float, metavar='DEGREES', dest='crease_angle',
+                       help='When generating normals for an OBJ file without them, keep edges sharper than DEGREES hard even within a smoothing group')
+argParser.add_argument('--normal-weighting', choices=('angle', 'area'), default='angle', dest='normal_weighting',
+                       help='Weight each face\'s contribution to generated normals by its angle at the vertex or by its area (default: %(default)s)')
 argParser.add_argument('--no-texture-split', action='store_true', help='Don\'t split vertices if texture coordinates differ (matches behaviour pre-github issue 184)')
+argParser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                       help='Convert up to N files in parallel (default: %(default)s; 0 means one per CPU)')
+argParser.add_argument('--pipeline', action='store_true',
+                       help='When converting one file at a time, read the next files and write finished DAT files in the background while converting the current one. Helps most with files on slow or network drives')
+argParser.add_argument('--cache-dir', default=os.environ.get('OBJ2DAT_CACHE_DIR'), metavar='DIR', dest='cache_dir',
+                       help='Reuse earlier conversions of unchanged OBJ and MTL files, stored in DIR (default: $OBJ2DAT_CACHE_DIR if set, otherwise no cache)')
+argParser.add_argument('--cache-size', type=int, default=256, metavar='MB', dest='cache_size',
+                       help='Remove the least recently used conversions when the cache exceeds MB megabytes (default: %(default)s)')
+argParser.add_argument('--no-cache', action='store_true', dest='no_cache',
+                       help='Don\'t use the conversion cache, even if a cache directory is set')
+argParser.add_argument('--watch', metavar='DIR',
+                       help='After converting any files given, keep running and reconvert each OBJ file under DIR when it or a material library it uses changes. Stop with Control-C')
+argParser.add_argument('--watch-interval', type=float, default=1.0, metavar='SECONDS', dest='watch_interval',
+                       help='How often --watch looks for changed files, and how long a changed file must stay unchanged before it is converted (default: %(default)s)')
+argParser.add_argument('--profile', metavar='FILE',
+                       help='Append the wall time, CPU time and peak memory of each phase of each conversion to FILE, as a line of JSON per input file')
+argParser.add_argument('--cprofile', action='store_true',
+                       help='Also run the parsing and face building loops under cProfile, saving the statistics as <input file>.prof')
 
 argParser.add_argument('-L', '--list-winding-modes', action=_ListWindingModesAction,
                        help=argparse.SUPPRESS)
 
-args = argParser.parse_args()
-
 
 #
 # Processing helpers
@@ -271,45 +371,149 @@ def vertex_reference(n, nv):
         return n - 1
 
 
-resolved_vertex_count = 0
-def resolve_vertex(v, vn, tc, index_for_vert_norm_and_tex, vertex_lines_out, normals_lines_out):
-    """ resolve_vertex
-        Returns a unique index for each (vertex, normal) pair. When a new pair
-        is seen, a new index is generated and the relevant lines are added to
-        the output buffers for the VERTEX and NORMALS sections.
+def value_ids(values):
+    """ value_ids
+        Returns a list giving a small integer ID for each value, such that
+        equal values get the same ID, and the number of distinct IDs.
+    """
+    ids = {}
+    return [ids.setdefault(value, len(ids)) for value in values], len(ids)
+
+
+def weld_positions(positions, tolerance):
+    """ weld_positions
+        Cluster positions that are within tolerance of each other. Returns a
+        list with each position replaced by the first position of its
+        cluster, the number of distinct positions and the number of clusters.
         
-        This is necessary because OBJ uses separate index spaces for vertex
-        positions and normals, but DAT requires one index per pair.
-    """
-    global resolved_vertex_count
-    v = clean_vector(v)
-    vn = clean_vector(vn)
-    key = v, vn, tc
-    if key in index_for_vert_norm_and_tex:
-        return index_for_vert_norm_and_tex[key]
-    else:
-        result = resolved_vertex_count
-        resolved_vertex_count = resolved_vertex_count + 1
+        Each position joins the earliest cluster whose first position is
+        within tolerance, if any. The cluster centres are found with a hash
+        grid of cubes with sides of twice the tolerance, in which only the
+        cube containing a position and its nearer neighbours on each axis
+        need to be searched, so this takes close to linear time.
+    """
+    cell_size = 2.0 * tolerance
+    tolerance_squared = tolerance * tolerance
+    grid = {}
+    cluster_for_position = {}
+    cluster_count = 0
+    welded = []
+    for position in positions:
+        cluster = cluster_for_position.get(position)
+        if cluster is None:
+            cluster_index = cluster_count
+            x, y, z = position
+            fx, fy, fz = x / cell_size, y / cell_size, z / cell_size
+            cx, cy, cz = int(math.floor(fx)), int(math.floor(fy)), int(math.floor(fz))
+            nx = cx - 1 if fx - cx < 0.5 else cx + 1
+            ny = cy - 1 if fy - cy < 0.5 else cy + 1
+            nz = cz - 1 if fz - cz < 0.5 else cz + 1
+            for cell in ((cx, cy, cz), (nx, cy, cz), (cx, ny, cz), (nx, ny, cz),
+                         (cx, cy, nz), (nx, cy, nz), (cx, ny, nz), (nx, ny, nz)):
+                # Each cell lists its clusters in the order they were made,
+                # so the search can stop at the first match or at a cluster
+                # later than one already found.
+                for index, centre in grid.get(cell, ()):
+                    if index >= cluster_index:
+                        break
+                    dx, dy, dz = centre[0] - x, centre[1] - y, centre[2] - z
+                    if dx * dx + dy * dy + dz * dz <= tolerance_squared:
+                        cluster_index = index
+                        cluster = centre
+                        break
+            if cluster is None:
+                cluster = position
+                grid.setdefault((cx, cy, cz), []).append((cluster_count, position))
+                cluster_count += 1
+            cluster_for_position[position] = cluster
+        welded.append(cluster)
+    return welded, len(cluster_for_position), cluster_count
+
+
+def merge_identical_output(values, formatted_values):
+    """ merge_identical_output
+        Returns values with each value replaced by the first one with the
+        same formatted text.
+    """
+    first_values = {}
+    return [first_values.setdefault(text, value) for value, text in itertools.izip(values, formatted_values)]
+
+
+def resolve_vertices(positions, normals, uvs, corner_positions, corner_normals, corner_uvs):
+    """ resolve_vertices
+        Returns a unique index for each (vertex, normal, texture coordinate)
+        combination used by a corner, numbered in the order the combinations
+        are first seen, along with the number of unique indices and the first
+        corner that uses each one.
         
-        index_for_vert_norm_and_tex[key] = result
+        This is necessary because OBJ uses separate index spaces for vertex
+        positions, normals and texture coordinates, but DAT requires one index
+        per combination.
         
-        vertex_lines_out.append(format_vector(v) + '\n')
-        if not is_vector_normalized(vn):
-            print 'Bug: writing unnormalized normal %s' % format_normal(vn)
-        normals_lines_out.append(format_normal(vn) + '\n')
+        positions and normals are lists of cleaned vectors and uvs a list of
+        texture coordinates; the corner arrays index into them, with a
+        texture coordinate index of -1 meaning the corner's texture
+        coordinates are ignored. Each distinct value is given an ID once, and
+        the three IDs are packed into one integer key per corner, so the
+        de-duplication is a single dictionary pass over the corner table.
+    """
+    position_ids, position_id_count = value_ids(positions)
+    normal_ids, normal_id_count = value_ids(normals)
+    uv_ids, uv_id_count = value_ids(uvs)
+    uv_ids.append(-1)   # Index -1: no texture coordinates.
+    
+    keys = [(position_ids[v] * normal_id_count + normal_ids[vn]) * (uv_id_count + 1) + uv_ids[vt] + 1
+            for v, vn, vt in zip(corner_positions, corner_normals, corner_uvs)]
+    index_for_key = {}
+    resolved = [index_for_key.setdefault(key, len(index_for_key)) for key in keys]
+    
+    # Map each index to the first corner using it by assigning in reverse.
+    corner_count = len(resolved)
+    first_corner = dict(zip(reversed(resolved), xrange(corner_count - 1, -1, -1)))
+    return resolved, len(index_for_key), [first_corner[i] for i in xrange(len(index_for_key))]
+
+
+def optimize_face_order(resolved, triangle_reversed, vertex_count, log):
+    """ optimize_face_order
+        Returns an order for the faces that makes good use of the GPU's
+        post-transform vertex cache, the resolved vertex indices of the
+        reordered faces renumbered in the order they are first used, and the
+        original index of each renumbered vertex. Logs the average cache
+        miss ratio (ACMR) and average transform to vertex ratio (ATVR) before
+        and after.
         
-        return result
+        resolved holds three vertex indices per face, in OBJ order; faces
+        whose winding will be reversed are measured as they will be written.
+    """
+    triangles = array.array('i', resolved)
+    for i in xrange(len(triangle_reversed)):
+        if triangle_reversed[i]:
+            triangles[3 * i], triangles[3 * i + 2] = triangles[3 * i + 2], triangles[3 * i]
+    acmr_before, atvr_before = vertex_cache_statistics(triangles, vertex_count)
+    
+    face_order = optimize_vertex_cache(triangles, vertex_count)
+    triangles = array.array('i', itertools.chain.from_iterable(triangles[3 * f:3 * f + 3] for f in face_order))
+    triangles, vertex_order = renumber_vertices(triangles, vertex_count)
+    acmr_after, atvr_after = vertex_cache_statistics(triangles, vertex_count)
+    log('  Vertex cache (%u entries): ACMR %.3f -> %.3f, ATVR %.3f -> %.3f' % (VERTEX_CACHE_SIZE, acmr_before, acmr_after,
+                                                                             atvr_before, atvr_after))
+    
+    # Undo the reversals again; they are applied when the faces are written.
+    for i, f in enumerate(face_order):
+        if triangle_reversed[f]:
+            triangles[3 * i], triangles[3 * i + 2] = triangles[3 * i + 2], triangles[3 * i]
+    return face_order, triangles, vertex_order
 
 
-def should_reverse_winding(v1, v2, v3, normal):
+def should_reverse_winding(v1, v2, v3, normal, winding_mode):
     """ should_reverse_winding
         Determine whether to reverse the winding of the triangle (v1, v2, v3)
-        based on current winding mode and face normal.
+        based on the winding mode and face normal.
     """
-    if args.winding_mode == 0:
+    if winding_mode == 0:
         return False
     
-    elif args.winding_mode == 1:
+    elif winding_mode == 1:
         return True
     
     else:
@@ -317,7 +521,7 @@ def should_reverse_winding(v1, v2, v3, normal):
         if normal == (0, 0, 0):
             normal = vector_flip(calculatedNormal)
         
-        if args.winding_mode == 2:
+        if winding_mode == 2:
             # Guess, using the assumptions that normals should point more "outwards"
             # than "inwards".
             if (vector_dot_product(normal, calculatedNormal) < 0.0):
@@ -325,219 +529,403 @@ def should_reverse_winding(v1, v2, v3, normal):
             else:
                 return False
         
-        elif args.winding_mode == 3:
+        elif winding_mode == 3:
             # Buggy calculation traditionally used by Oolite.
             if (normal[0] * calculatedNormal[0] < 0.0) or (normal[1] * calculatedNormal[1] < 0.0) or (normal[2] * calculatedNormal[2] < 0.0):
                 return True
             else:
                 return False
     
-    print 'Unknown normal winding mode %u' % (args.winding_mode)
-    exit(-1)
+    raise ValueError('Unknown normal winding mode %u' % (winding_mode))
 
 
 #
-# Grand processing loop
+# Material libraries
 #
-for input_file_name in args.files:
-    # Select output name and open files
-    output_file_name = input_file_name.lower().replace('.obj', '.dat')
-    if output_file_name == input_file_name:
-        output_file_name += '.1'
-    input_display_name = os.path.basename(input_file_name)
-    output_display_name = os.path.basename(output_file_name)
-    
-    print input_display_name + ' -> ' + output_display_name
+def read_material_library(material_file_name, material_rename, names_lines_out, materials_used, options, log):
+    """ read_material_library
+        Add the materials defined in an MTL file to the material rename table,
+        the NAMES section and the list of used materials.
+    """
+    for new_material_name, diffuse_map_name in parse_material_library(material_file_name):
+        if options.rename_materials:
+            # Use the diffuse map to name the material.
+            # FIXME: produce cleaner results if there is no diffuse map.
+            if diffuse_map_name is not None:
+                # Add it to the used materials list and rename table.
+                materials_used.append(diffuse_map_name)
+                log('  Material %s -> %s' % (new_material_name, diffuse_map_name))
+                if options.pretty_output:
+                    material_rename[new_material_name] = diffuse_map_name
+                else:
+                    material_rename[new_material_name] = len(material_rename)
+                    names_lines_out.append(diffuse_map_name + '\n')
+        else:
+            # Store material key in used material list and (if using short names) the rename table.
+            materials_used.append(new_material_name)
+            if not options.pretty_output:
+                material_rename[new_material_name] = len(material_rename)
+                names_lines_out.append(new_material_name + '\n')
+
+
+#
+# Conversion API
+#
+def make_options(**overrides):
+    """ make_options
+        Returns a set of conversion options with the same defaults as the
+        command line, overridden by any keyword arguments using the names of
+        the command line options, for example
+        make_options(winding_mode=0, pretty_output=True).
+    """
+    options = argParser.parse_args([])
+    for name, value in overrides.items():
+        if not hasattr(options, name):
+            raise TypeError('Unknown conversion option \'%s\'' % name)
+        setattr(options, name, value)
+    return options
+
+
+def convert_obj_to_dat(input, output=None, options=None, name=None, material_directory=None, profiler=None,
+                       lod_outputs=None, log=None):
+    """ convert_obj_to_dat
+        Convert an OBJ mesh to DAT format.
+        
+        input is a file name or an open file-like object. output is a file
+        name, a file-like object to write to, or None to return the DAT file
+        as a string. options is a set of options from make_options() or the
+        command line parser; None means the defaults.
+        
+        name is the file name recorded in the DAT file's header comment, and
+        material_directory the directory that mtllib statements are relative
+        to. Both default to values derived from the input file's name, when
+        there is one.
+        
+        profiler is a PhaseProfiler to record the time spent in each phase
+        of the conversion in, or None.
+        
+        If options.lod lists any ratios, a decimated copy of the mesh with
+        about that fraction of the faces is written for each one, to the
+        corresponding entry of lod_outputs (file names or file-like objects).
+        lod_outputs defaults to names made with lod_file_name() when output
+        is a file name.
+        
+        log is called with each progress message and warning, such as the
+        materials found and the number of vertices welded; None discards
+        them. The command line passes print_message().
+    """
+    if options is None:
+        options = make_options()
+    if log is None:
+        log = discard_message
+    if profiler is None:
+        profiler = PhaseProfiler('Obj2DatTexNorm', name, enabled=False)
+    if options.winding_mode not in range(4):
+        raise ValueError('Unknown normal winding mode %u' % (options.winding_mode))
+    if options.lod and lod_outputs is None:
+        if output is None or hasattr(output, 'write'):
+            raise ValueError('lod_outputs must be given for levels of detail unless output is a file name')
+        lod_outputs = [lod_file_name(output, ratio) for ratio in options.lod]
     
-    input_file = open(input_file_name, 'r')
-    lines = input_file.read().splitlines(0)
-    output_file = open(output_file_name, 'w')
+    if hasattr(input, 'read'):
+        input_file = input
+        input_file_name = getattr(input, 'name', '')
+        if not isinstance(input_file_name, basestring):
+            input_file_name = ''
+    else:
+        input_file_name = input
+        input_file = open(input_file_name, 'rb')
+    if name is None:
+        name = os.path.basename(input_file_name)
+    if material_directory is None:
+        material_directory = os.path.dirname(input_file_name)
+    lines = read_lines(input_file)
     
     ### Set up state used in parsing and generating output
     vertex_lines_out = ['VERTEX\n']
     faces_lines_out = ['FACES\n']
     normals_lines_out = ['NORMALS\n']
-    vertex_count = 0
-    face_count = 0
-    normal_count = 0
-    skips = 0
-    vertex=[]
-    uv=[]
-    normal=[]
-    face=[]
-    texture=[]
     texture_for_face=[]
     texcoords_for_face=[]
     interpret_texture = 0
     material_rename = {}
-    index_for_vert_norm_and_tex = {}
     names_lines_out = []
     materials_used = []
-    max_v = [0.0, 0.0, 0.0]
-    min_v = [0.0, 0.0, 0.0]
-    
-    ### Find materials from material library
-    for line in lines:
-        tokens = string.split(line)
-        if tokens != []:
-            if tokens[0] == 'mtllib':
-                path = os.path.dirname(input_file_name)
-                material_file_name = os.path.join(path, tokens[1])
-                print '  Material library file: %s' % material_file_name
-                material_file = open(material_file_name, 'r')
-                new_material = False
-                for material_line in material_file.read().splitlines(0):
-                    material_tokens = string.split(material_line)
-                    if material_tokens != []:
-                        if material_tokens[0] == 'newmtl':
-                            new_material_name = material_tokens[1]
-                            if args.rename_materials:
-                                # Let map_Kd handler deal with material table.
-                                # FIXME: produce cleaner results if there is no diffuse map.
-                                new_material = True
-                            else:
-                                # Store material key in used material list and (if using short names) the rename table.
-                                materials_used.append(new_material_name)
-                                if not args.pretty_output:
-                                    material_rename[new_material_name] = len(material_rename)
-                                    names_lines_out.append(new_material_name + '\n')
-                        
-                        if material_tokens[0] == 'map_Kd':
-                            # If this is the first diffuse map for this material...
-                            if new_material:
-                                # Add it to the used materials list and rename table.
-                                name = material_tokens[1]
-                                materials_used.append(name)
-                                print '  Material %s -> %s' % (new_material_name, name)
-                                if args.pretty_output:
-                                    material_rename[new_material_name] = name
-                                else:
-                                    material_rename[new_material_name] = len(material_rename)
-                                    names_lines_out.append(name + '\n')
-                            new_material = False
-                material_file.close()
-    
-    ### Parse vertices
-    for line in lines:
-        tokens = string.split(line)
-        if tokens != []:
-            if tokens[0] == 'v':
-                vertex_count = vertex_count + 1
-                # Negate x value for vertex to compensate for different coordinate conventions.
-                x = -float(tokens[1])
-                y = float(tokens[2])
-                z = float(tokens[3])
-                vertex.append((x, y, z))
-                if x > max_v[0]: max_v[0] = x
-                if y > max_v[1]: max_v[1] = y
-                if z > max_v[2]: max_v[2] = z
-                if x < min_v[0]: min_v[0] = x
-                if y < min_v[1]: min_v[1] = y
-                if z < min_v[2]: min_v[2] = z
-                    
-            if tokens[0] == 'vn':
-                normal_count = normal_count + 1
-                x = -float(tokens[1])
-                y = float(tokens[2])
-                z = float(tokens[3])
-                n = (x, y, z)
-                if not is_vector_normalized(n):
-                    print 'Warning: read unnormalized normal %s' % format_vector(n)
-                normal.append(vector_normalize((x, y, z)))
-                
-            if tokens[0] == 'vt':
-                uv.append((float(tokens[1]), 1.0 - float(tokens[2])))
-    
-    ### Parse faces
-    group_token = 0
-    for line in lines:
-        tokens = string.split(line)
-        if (tokens != []):
-            if (tokens[0] == 'usemtl'):
-                textureName = tokens[1]
-                if (material_rename.has_key(textureName)):
-                    textureName = material_rename[textureName]
-                interpret_texture = 1
-                texture.append(textureName)
+    
+    ### Parse geometry, reading material libraries as they are referenced
+    def handle_material_library(library_name):
+        material_file_name = os.path.join(material_directory, library_name)
+        log('  Material library file: %s' % material_file_name)
+        with profiler.phase('read material libraries'):
+            read_material_library(material_file_name, material_rename, names_lines_out, materials_used, options, log)
+    
+    # Vertices and faces are parsed in a single pass.
+    profiler.begin('parse', hot=True)
+    try:
+        geometry = parse_obj(lines, handle_material_library)
+    finally:
+        if input_file is not input:
+            input_file.close()
+    
+    # Corners without normal indices get generated normals.
+    profiler.begin('generate normals', hot=True)
+    generated_count = generate_normals(geometry, options.crease_angle, options.normal_weighting)
+    if generated_count != 0:
+        log('  Generated normals for %u corners without them' % generated_count)
+    
+    profiler.begin('normalize normals')
+    normals = geometry.normals
+    for i in xrange(0, len(normals), 3):
+        n = (normals[i], normals[i + 1], normals[i + 2])
+        if not is_vector_normalized(n):
+            log('Warning: read unnormalized normal %s' % format_vector(n, options))
+        normals[i:i + 3] = array.array('d', vector_normalize(n))
+    vertex_count = geometry.vertex_count()
+    normal_count = geometry.normal_count()
+    max_v = geometry.max_v
+    min_v = geometry.min_v
+    
+    ### Build faces
+    # This includes choosing each triangle's winding.
+    profiler.begin('build faces', hot=True)
+    # Omitted texture coordinate indices reuse the previous corner's, as they
+    # always have; omitted normal indices have been filled in above. Each
+    # output triangle's corners are collected in the triangle_* arrays and
+    # resolved to DAT vertices in one batch afterwards.
+    uv_count = len(geometry.uvs) // 2
+    corner_positions = geometry.corner_positions
+    corner_uvs = geometry.corner_uvs
+    corner_normals = geometry.corner_normals
+    polygon_materials = geometry.polygon_materials
+    material_statements = geometry.material_statements
+    triangle_positions = array.array('i')
+    triangle_normals = array.array('i')
+    triangle_uvs = array.array('i')
+    triangle_reversed = array.array('b')
+    face_normal_strs = []
+    split_textures = not options.no_texture_split
+    current_material = -1
+    first_corner = 0
+    for polygon_index, polygon_size in enumerate(geometry.polygon_sizes):
+        if polygon_materials[polygon_index] != current_material:
+            current_material = polygon_materials[polygon_index]
+            textureName = material_statements[current_material]
+            if (material_rename.has_key(textureName)):
+                textureName = material_rename[textureName]
+            interpret_texture = 1
+        
+        start = first_corner
+        first_corner += polygon_size
+        if options.ear_clipping and polygon_size > 3:
+            points = [geometry.position(vertex_reference(corner_positions[c], vertex_count)) for c in xrange(start, first_corner)]
+            triangles = [(start + a, start + b, start + c) for a, b, c in triangulate_polygon(points)]
+        else:
+            triangles = [(start, c2, c2 + 1) for c2 in xrange(start + 1, first_corner - 1)]
+        for c1, c2, c3 in triangles:
+            v1 = vertex_reference(corner_positions[c1], vertex_count)
+            if corner_uvs[c1] != 0: vt1 = vertex_reference(corner_uvs[c1], vertex_count)
+            if corner_normals[c1] != 0: vn1 = vertex_reference(corner_normals[c1], normal_count)
             
-            if (tokens[0] == 'f'):
-                while (len(tokens) >=4):
-                    bits = string.split(tokens[1], '/')
-                    v1 = vertex_reference(int(bits[0]), vertex_count)
-                    if (bits[1] > ''): vt1 = vertex_reference(int(bits[1]), vertex_count)
-                    if (bits[2] > ''): vn1 = vertex_reference(int(bits[2]), normal_count)
-                    
-                    bits = string.split(tokens[2], '/')
-                    v2 = vertex_reference(int(bits[0]), vertex_count)
-                    if (bits[1] > ''): vt2 = vertex_reference(int(bits[1]), vertex_count)
-                    if (bits[2] > ''): vn2 = vertex_reference(int(bits[2]), normal_count)
-                    
-                    bits = string.split(tokens[3], '/')
-                    v3 = vertex_reference(int(bits[0]), vertex_count)
-                    if (bits[1] > ''):
-                        vt3 = vertex_reference(int(bits[1]), vertex_count)
-                    else:
-                        if interpret_texture:
-                            print 'File does not provide texture coordinates! Materials will not be exported.'
-                        interpret_texture = 0
-                    if (bits[2] > ''): vn3 = vertex_reference(int(bits[2]), normal_count)
-                    
-                    d0 = (vertex[v2][0] - vertex[v1][0], vertex[v2][1] - vertex[v1][1], vertex[v2][2] - vertex[v1][2])
-                    d1 = (vertex[v3][0] - vertex[v2][0], vertex[v3][1] - vertex[v2][1], vertex[v3][2] - vertex[v2][2])
-                    xp = (d0[1] * d1[2] - d0[2] * d1[1], d0[2] * d1[0] - d0[0] * d1[2], d0[0] * d1[1] - d0[1] * d1[0])
-                    det = math.sqrt(xp[0]*xp[0] + xp[1]*xp[1] + xp[2]*xp[2])
-                    if (det > 0):
-                        if interpret_texture and not args.no_texture_split:
-                            tc1 = uv[vt1]
-                            tc2 = uv[vt2]
-                            tc3 = uv[vt3]
-                        else:
-                            tc1 = None
-                            tc2 = None
-                            tc3 = None
-                        rv1 = resolve_vertex(vertex[v1], normal[vn1], tc1, index_for_vert_norm_and_tex, vertex_lines_out, normals_lines_out)
-                        rv2 = resolve_vertex(vertex[v2], normal[vn2], tc2, index_for_vert_norm_and_tex, vertex_lines_out, normals_lines_out)
-                        rv3 = resolve_vertex(vertex[v3], normal[vn3], tc3, index_for_vert_norm_and_tex, vertex_lines_out, normals_lines_out)
-                        face_normal = average_normal(normal[vn1], normal[vn2], normal[vn3])
-                        
-                        if should_reverse_winding(vertex[v1], vertex[v2], vertex[v3], face_normal):
-                            # If reversing, swap first and third vertex index and tex coord.
-                            # Note that we don't need to swap normals here, because they're
-                            # indexed in the same sequence as vertices, but texture coords
-                            # are stored separately with the faces.
-                            temp = rv1
-                            rv1 = rv3
-                            rv3 = temp
-                            temp = vt1
-                            vt1 = vt3
-                            vt3 = temp
-                        
-                        if args.include_face_normals:
-                            face_normal_str = format_normal(face_normal)
-                        else:
-                            face_normal_str = '0 0 0'
-                        
-                        face_count = face_count + 1
-                        face.append((rv1, rv2, rv3))
-                        faces_lines_out.append('0 0 0\t%s\t3\t%d %d %d\n' % (face_normal_str, rv1, rv2, rv3))
-                        
-                        if interpret_texture:
-                            texture_for_face.append(textureName)
-                            texcoords_for_face.append([uv[vt1], uv[vt2], uv[vt3]])
-                    
-                    tokens = tokens[:2]+tokens[3:]
+            v2 = vertex_reference(corner_positions[c2], vertex_count)
+            if corner_uvs[c2] != 0: vt2 = vertex_reference(corner_uvs[c2], vertex_count)
+            if corner_normals[c2] != 0: vn2 = vertex_reference(corner_normals[c2], normal_count)
+            
+            v3 = vertex_reference(corner_positions[c3], vertex_count)
+            if corner_uvs[c3] != 0:
+                vt3 = vertex_reference(corner_uvs[c3], vertex_count)
+            else:
+                if interpret_texture:
+                    log('File does not provide texture coordinates! Materials will not be exported.')
+                interpret_texture = 0
+            if corner_normals[c3] != 0: vn3 = vertex_reference(corner_normals[c3], normal_count)
+            
+            p1 = geometry.position(v1)
+            p2 = geometry.position(v2)
+            p3 = geometry.position(v3)
+            d0 = (p2[0] - p1[0], p2[1] - p1[1], p2[2] - p1[2])
+            d1 = (p3[0] - p2[0], p3[1] - p2[1], p3[2] - p2[2])
+            xp = (d0[1] * d1[2] - d0[2] * d1[1], d0[2] * d1[0] - d0[0] * d1[2], d0[0] * d1[1] - d0[1] * d1[0])
+            det = math.sqrt(xp[0]*xp[0] + xp[1]*xp[1] + xp[2]*xp[2])
+            if (det > 0):
+                n1 = geometry.normal(vn1)
+                n2 = geometry.normal(vn2)
+                n3 = geometry.normal(vn3)
+                triangle_positions.extend((v1 % vertex_count, v2 % vertex_count, v3 % vertex_count))
+                triangle_normals.extend((vn1 % normal_count, vn2 % normal_count, vn3 % normal_count))
+                if interpret_texture and split_textures:
+                    # Look the coordinates up first so bad indices fail here.
+                    geometry.uv(vt1), geometry.uv(vt2), geometry.uv(vt3)
+                    triangle_uvs.extend((vt1 % uv_count, vt2 % uv_count, vt3 % uv_count))
+                else:
+                    triangle_uvs.extend((-1, -1, -1))
+                face_normal = average_normal(n1, n2, n3)
+                
+                if should_reverse_winding(p1, p2, p3, face_normal, options.winding_mode):
+                    # If reversing, swap first and third vertex index and tex coord.
+                    # Note that we don't need to swap normals here, because they're
+                    # indexed in the same sequence as vertices, but texture coords
+                    # are stored separately with the faces.
+                    triangle_reversed.append(1)
+                    temp = vt1
+                    vt1 = vt3
+                    vt3 = temp
+                else:
+                    triangle_reversed.append(0)
+                
+                if options.include_face_normals:
+                    face_normal_strs.append(format_normal(face_normal, options))
+                
+                if interpret_texture:
+                    texture_for_face.append(textureName)
+                    texcoords_for_face.append([geometry.uv(vt1), geometry.uv(vt2), geometry.uv(vt3)])
+    
+    ### Resolve vertices
+    profiler.begin('resolve vertices', hot=True)
+    clean_positions = [clean_vector(geometry.position(i)) for i in xrange(vertex_count)]
+    clean_normals = [clean_vector(geometry.normal(i)) for i in xrange(normal_count)]
+    all_uvs = [geometry.uv(i) for i in xrange(uv_count)]
+    if options.weld_tolerance > 0.0:
+        with profiler.phase('weld vertices', hot=True):
+            clean_positions, position_count, cluster_count = weld_positions(clean_positions, options.weld_tolerance)
+            log('  Welded %u of %u vertex positions into nearby ones' % (position_count - cluster_count, position_count))
+            # Normals and texture coordinates that would be written the same
+            # are made equal, so that welded corners can share a vertex;
+            # different ones, as at seams and hard edges, stay apart.
+            clean_normals = merge_identical_output(clean_normals, format_normals(clean_normals, options))
+            all_uvs = merge_identical_output(all_uvs, format_textcoords(all_uvs, options))
+    resolved, resolved_vertex_count, first_corners = resolve_vertices(clean_positions, clean_normals, all_uvs,
+                                                                      triangle_positions, triangle_normals, triangle_uvs)
+    face_count = len(triangle_reversed)
+    if options.optimize_vertex_cache:
+        with profiler.phase('optimize vertex cache', hot=True):
+            face_order, resolved, vertex_order = optimize_face_order(resolved, triangle_reversed, resolved_vertex_count, log)
+            first_corners = [first_corners[v] for v in vertex_order]
+            triangle_reversed = [triangle_reversed[f] for f in face_order]
+            if options.include_face_normals:
+                face_normal_strs = [face_normal_strs[f] for f in face_order]
+            if len(texture_for_face) == face_count and len(texcoords_for_face) == face_count:
+                texture_for_face = [texture_for_face[f] for f in face_order]
+                texcoords_for_face = [texcoords_for_face[f] for f in face_order]
+    resolved_normals = [clean_normals[triangle_normals[corner]] for corner in first_corners]
+    for vn in resolved_normals:
+        if not is_vector_normalized(vn):
+            log('Bug: writing unnormalized normal %s' % format_normal(vn, options))
+    vertex_lines_out.extend(line + '\n' for line in
+                            format_vectors([clean_positions[triangle_positions[corner]] for corner in first_corners], options))
+    normals_lines_out.extend(line + '\n' for line in format_normals(resolved_normals, options))
+    
+    for i in xrange(face_count):
+        rv1, rv2, rv3 = resolved[3 * i:3 * i + 3]
+        if triangle_reversed[i]:
+            rv1, rv3 = rv3, rv1
+        if options.include_face_normals:
+            face_normal_str = face_normal_strs[i]
+        else:
+            face_normal_str = '0 0 0'
+        faces_lines_out.append('0 0 0\t%s\t3\t%d %d %d\n' % (face_normal_str, rv1, rv2, rv3))
     
     ### Write output.
+    profiler.begin('write')
+    result = write_dat_file(output, name, max_v, min_v, materials_used, resolved_vertex_count, vertex_lines_out, faces_lines_out,
+                            texture_for_face, texcoords_for_face, names_lines_out, normals_lines_out, options)
+    
+    ### Write lower levels of detail.
+    if options.lod:
+        profiler.begin('decimate', hot=True)
+        
+        # Vertices are split wherever texture coordinates or normals change,
+        # so seams and hard edges show up as several vertices in the same
+        # place; those are locked in place, as are vertices on the border
+        # between two materials.
+        positions = [clean_positions[triangle_positions[corner]] for corner in first_corners]
+        position_uses = collections.Counter(positions)
+        locked = bytearray(position_uses[position] > 1 for position in positions)
+        triangles = array.array('i', resolved)
+        for i in xrange(face_count):
+            if triangle_reversed[i]:
+                triangles[3 * i], triangles[3 * i + 2] = triangles[3 * i + 2], triangles[3 * i]
+        has_textures = len(texture_for_face) == face_count and len(texcoords_for_face) == face_count
+        if has_textures:
+            vertex_texture = [None] * resolved_vertex_count
+            vertex_texcoords = [None] * resolved_vertex_count
+            for i in xrange(face_count):
+                for k in xrange(3):
+                    v = triangles[3 * i + k]
+                    if vertex_texture[v] is None:
+                        vertex_texture[v] = texture_for_face[i]
+                        vertex_texcoords[v] = texcoords_for_face[i][k]
+                    elif vertex_texture[v] != texture_for_face[i]:
+                        locked[v] = 1
+        
+        face_targets = [int(round(face_count * ratio)) for ratio in options.lod]
+        lod_order = sorted(xrange(len(face_targets)), key=lambda i: -face_targets[i])
+        decimated = decimate_mesh(array.array('d', itertools.chain.from_iterable(positions)), triangles, locked,
+                                  [face_targets[i] for i in lod_order])
+        
+        profiler.begin('write levels of detail')
+        for i, (faces, lod_triangles) in zip(lod_order, decimated):
+            lod_triangles, vertex_order = renumber_vertices(lod_triangles, resolved_vertex_count)
+            lod_vertex_count = len(set(lod_triangles))
+            vertex_order = vertex_order[:lod_vertex_count]
+            lod_normals = [resolved_normals[v] for v in vertex_order]
+            lod_vertex_lines = ['VERTEX\n']
+            lod_vertex_lines.extend(line + '\n' for line in format_vectors([positions[v] for v in vertex_order], options))
+            lod_normals_lines = ['NORMALS\n']
+            lod_normals_lines.extend(line + '\n' for line in format_normals(lod_normals, options))
+            
+            lod_faces_lines = ['FACES\n']
+            lod_texture_for_face = []
+            lod_texcoords_for_face = []
+            for j, f in enumerate(faces):
+                rv1, rv2, rv3 = lod_triangles[3 * j:3 * j + 3]
+                if options.include_face_normals:
+                    face_normal_str = format_normal(average_normal(lod_normals[rv1], lod_normals[rv2], lod_normals[rv3]), options)
+                else:
+                    face_normal_str = '0 0 0'
+                lod_faces_lines.append('0 0 0\t%s\t3\t%d %d %d\n' % (face_normal_str, rv1, rv2, rv3))
+                if has_textures:
+                    # Corners merged into another vertex take its coordinates.
+                    texcoords = list(texcoords_for_face[f])
+                    for k in xrange(3):
+                        v = vertex_order[lod_triangles[3 * j + k]]
+                        if v != triangles[3 * f + k]:
+                            texcoords[k] = vertex_texcoords[v]
+                    lod_texture_for_face.append(texture_for_face[f])
+                    lod_texcoords_for_face.append(texcoords)
+            
+            log('  Level of detail %g: %u faces, %u vertices' % (options.lod[i], len(faces), lod_vertex_count))
+            if len(faces) > face_targets[i]:
+                log('    (no further faces can be removed without changing seams, hard edges or borders)')
+            write_dat_file(lod_outputs[i], name, max_v, min_v, materials_used, lod_vertex_count, lod_vertex_lines, lod_faces_lines,
+                           lod_texture_for_face, lod_texcoords_for_face, names_lines_out, lod_normals_lines, options)
+    profiler.end()
+    return result
+
+
+def write_dat_file(output, name, max_v, min_v, materials_used, vertex_count, vertex_lines_out, faces_lines_out,
+                   texture_for_face, texcoords_for_face, names_lines_out, normals_lines_out, options):
+    """ write_dat_file
+        Write a converted DAT file to output, a file name or file-like object,
+        or return it as a string if output is None. The *_lines_out lists hold
+        the lines of each section, starting with its heading.
+    """
+    if output is None:
+        output_file = StringIO.StringIO()
+    elif hasattr(output, 'write'):
+        output_file = output
+    else:
+        output_file = open(output, 'w')
+    face_count = len(faces_lines_out) - 1
     output_file.write('// Converted by Obj2DatTexNorm.py Wavefront OBJ file conversion script\n')
     output_file.write('// (c) 2005-2013 By Giles Williams and Jens Ayton\n')
     output_file.write('// \n')
-    output_file.write('// original file: "%s"\n' % input_display_name)
+    output_file.write('// original file: "%s"\n' % name)
     output_file.write('// \n')
     output_file.write('// model size: %.3f x %.3f x %.3f\n' % (max_v[0]-min_v[0], max_v[1]-min_v[1], max_v[2]-min_v[2]))
     output_file.write('// \n')
     output_file.write('// materials used: %s\n' % materials_used)
     output_file.write('// \n')
-    output_file.write('NVERTS %d\n' % resolved_vertex_count)
+    output_file.write('NVERTS %d\n' % vertex_count)
     output_file.write('NFACES %d\n' % face_count)
     output_file.write('\n')
     output_file.writelines(vertex_lines_out)
@@ -547,9 +935,9 @@ for input_file_name in args.files:
     
     # Check that we have textures for every vertex
     ok_to_write_texture = 1
-    if len(texture_for_face) != len(face):
+    if len(texture_for_face) != face_count:
         ok_to_write_texture = 0
-    if len(texcoords_for_face) != len(face):
+    if len(texcoords_for_face) != face_count:
         ok_to_write_texture = 0
     for texture in texture_for_face:
         if texture == '':
@@ -558,13 +946,9 @@ for input_file_name in args.files:
     # If we're all clear then write out the texture uv coordinates.
     if ok_to_write_texture:
         output_file.write('TEXTURES\n')
-        for i in range(0, len(face)):
-            facet = face[i]
-            texture = texture_for_face[i]
-            output_file.write('%s\t1.0 1.0\t%s\t%s\t%s\n' %
-                              (texture, format_textcoord(texcoords_for_face[i][0]),
-                               format_textcoord(texcoords_for_face[i][1]),
-                               format_textcoord(texcoords_for_face[i][2])))
+        textcoords = iter(format_textcoords(itertools.chain.from_iterable(texcoords_for_face), options))
+        output_file.writelines('%s\t1.0 1.0\t%s\t%s\t%s\n' % (texture, st1, st2, st3) for texture, st1, st2, st3 in
+                               itertools.izip(texture_for_face, textcoords, textcoords, textcoords))
     output_file.write('\n')
     
     # Write NAMES section if used (textures in place and not pretty printing)
@@ -576,8 +960,563 @@ for input_file_name in args.files:
     output_file.writelines(normals_lines_out)
     output_file.write('\n')
     output_file.write('END\n')
-    output_file.close()
-    input_file.close()
+    if output is None:
+        return output_file.getvalue()
+    elif output_file is not output:
+        output_file.close()
+
+
+def lod_file_name(dat_file_name, ratio):
+    """ lod_file_name
+        Returns the name of the level of detail file for ratio, such as
+        ship-lod0.25.dat for ship.dat.
+    """
+    base, extension = os.path.splitext(dat_file_name)
+    return '%s-lod%g%s' % (base, ratio, extension)
+
+
+def convert_obj_string_to_dat(obj_text, options=None, name='', material_directory='', log=None):
+    """ convert_obj_string_to_dat
+        Convert an OBJ mesh held in a string to DAT format, returning the DAT
+        file as a string. See convert_obj_to_dat().
+    """
+    return convert_obj_to_dat(StringIO.StringIO(obj_text), None, options, name, material_directory, log=log)
+
+
+def print_message(message):
+    """ print_message
+        Print a progress message or warning, for convert_obj_to_dat()'s log.
+    """
+    print message
+
+
+def discard_message(message):
+    """ discard_message
+        The default log for convert_obj_to_dat(), which ignores messages.
+    """
+    pass
+
+
+#
+# Conversion cache
+# Converted DAT files are stored under a hash of everything that affects
+# them: the OBJ file's contents and name, every material library it
+# references, the converter's own source and the options that change the
+# output.
+#
+CACHE_KEY_OPTIONS = ('winding_mode', 'flip_normals', 'include_face_normals',
+                     'rename_materials', 'pretty_output', 'no_texture_split', 'ear_clipping',
+                     'optimize_vertex_cache', 'weld_tolerance', 'crease_angle', 'normal_weighting')
+
+
+def hash_file(hasher, file_name):
+    """ hash_file
+        Add the contents of a file to a hashlib object, or a marker if it
+        can't be read.
+    """
+    try:
+        with open(file_name, 'rb') as hashed_file:
+            for chunk in iter(lambda: hashed_file.read(1 << 20), ''):
+                hasher.update(chunk)
+    except IOError:
+        hasher.update('\0missing\0')
+
+
+def conversion_cache_key(input_file_name, options, input_data=None):
+    """ conversion_cache_key
+        Returns the cache key for converting input_file_name with options.
+        input_data is the file's contents, if they have already been read.
+    """
+    hasher = hashlib.sha1()
+    for source_file_name in (__file__, sys.modules[read_lines.__module__].__file__):
+        hash_file(hasher, os.path.splitext(source_file_name)[0] + '.py')
+    for name in CACHE_KEY_OPTIONS:
+        hasher.update('%s=%r\n' % (name, getattr(options, name)))
+    hasher.update('name=%s\n' % os.path.basename(input_file_name))
+    
+    material_directory = os.path.dirname(input_file_name)
+    material_libraries = []
+    if input_data is None:
+        input_file = open(input_file_name, 'rb')
+    else:
+        input_file = cStringIO.StringIO(input_data)
+    with contextlib.closing(input_file):
+        for line in read_lines(input_file):
+            hasher.update(line + '\n')
+            if line.startswith('mtllib'):
+                tokens = line.split()
+                if len(tokens) > 1 and tokens[0] == 'mtllib':
+                    material_libraries.append(tokens[1])
+    for library_name in material_libraries:
+        hasher.update('mtllib=%s\n' % library_name)
+        hash_file(hasher, os.path.join(material_directory, library_name))
+    
+    return hasher.hexdigest()
+
+
+def fetch_cached_conversion(cache_dir, key, output_file_name):
+    """ fetch_cached_conversion
+        Copy a cached DAT file to output_file_name, returning False if there
+        is none.
+    """
+    cache_file_name = os.path.join(cache_dir, key + '.dat')
+    try:
+        shutil.copyfile(cache_file_name, output_file_name)
+        os.utime(cache_file_name, None)     # Mark as recently used.
+    except (IOError, OSError):
+        return False
+    return True
+
+
+def store_cached_conversion(cache_dir, key, dat_file_name, size_limit):
+    """ store_cached_conversion
+        Add a converted DAT file to the cache, then remove the least recently
+        used entries until the cache is no larger than size_limit bytes.
+        Failures are ignored, since the cache is only an optimization; this
+        includes entries removed by another process in the meantime.
+    """
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        # Write under a temporary name so no partial entry is ever visible.
+        temp_fd, temp_file_name = tempfile.mkstemp(suffix='.tmp', dir=cache_dir)
+        os.close(temp_fd)
+        shutil.copyfile(dat_file_name, temp_file_name)
+        os.rename(temp_file_name, os.path.join(cache_dir, key + '.dat'))
+        
+        entries = []
+        total_size = 0
+        for entry_name in os.listdir(cache_dir):
+            if entry_name.endswith('.dat'):
+                entry_path = os.path.join(cache_dir, entry_name)
+                stat = os.stat(entry_path)
+                entries.append((stat.st_mtime, stat.st_size, entry_path))
+                total_size += stat.st_size
+        entries.sort()
+        for mtime, size, entry_path in entries:
+            if total_size <= size_limit:
+                break
+            os.remove(entry_path)
+            total_size -= size
+    except (IOError, OSError):
+        pass
+
+
+#
+# Watch mode
+# --watch rescans the directory for OBJ and MTL files whose modification time
+# or size has changed every interval, and sooner if the optional watchdog
+# package reports a change. A changed file is only acted on once it has stayed
+# the same for a whole interval, so that a file which is still being written,
+# or which is saved several times in quick succession, is converted once.
+#
+def scan_models(directory):
+    """ scan_models
+        Returns a dictionary mapping the path of each OBJ and MTL file under
+        directory to its modification time and size.
+    """
+    models = {}
+    for dir_path, dir_names, file_names in os.walk(directory):
+        for file_name in file_names:
+            if os.path.splitext(file_name)[1].lower() in ('.obj', '.mtl'):
+                path = os.path.normpath(os.path.join(dir_path, file_name))
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue    # Removed since it was listed.
+                models[path] = (stat.st_mtime, stat.st_size)
+    return models
+
+
+def is_obj_file(path):
+    return os.path.splitext(path)[1].lower() == '.obj'
+
+
+def material_library_paths(input_file_name):
+    """ material_library_paths
+        Returns the paths of the material libraries an OBJ file references,
+        or an empty list if it can't be read.
+    """
+    material_directory = os.path.dirname(input_file_name)
+    paths = []
+    try:
+        with open(input_file_name, 'rb') as input_file:
+            for line in read_lines(input_file):
+                if line.startswith('mtllib'):
+                    tokens = line.split()
+                    if len(tokens) > 1 and tokens[0] == 'mtllib':
+                        paths.append(os.path.normpath(os.path.join(material_directory, tokens[1])))
+    except (EnvironmentError, ValueError):
+        pass
+    return paths
+
+
+def is_out_of_date(input_file_name, library_paths, models):
+    """ is_out_of_date
+        True if an OBJ file's DAT file is missing or older than the OBJ file
+        or any of its material libraries, whose times are taken from models.
+    """
+    try:
+        output_time = os.stat(output_file_name_for(input_file_name)).st_mtime
+    except OSError:
+        return True
+    return any(path in models and models[path][0] > output_time for path in [input_file_name] + library_paths)
+
+
+def start_change_observer(directory, wake):
+    """ start_change_observer
+        Start a watchdog observer which sets the threading.Event wake when
+        anything under directory changes. Returns the observer, or None if
+        watchdog isn't installed or can't watch directory.
+    """
+    if watchdog is None:
+        return None
+    
+    class WakeHandler(watchdog.events.FileSystemEventHandler):
+        def on_any_event(self, event):
+            wake.set()
+    
+    observer = watchdog.observers.Observer()
+    try:
+        observer.schedule(WakeHandler(), directory, recursive=True)
+        observer.start()
+    except Exception:
+        # For example, the system's limit on watched directories was reached.
+        return None
+    return observer
+
+
+def convert_watched_file(input_file_name, options):
+    """ convert_watched_file
+        Convert a file for --watch, reporting rather than raising errors so
+        that watching continues.
+    """
+    try:
+        profile_record = convert_file(input_file_name, options)
+        if profile_record is not None and options.profile is not None:
+            append_profile_record(options.profile, profile_record)
+    except Exception:
+        traceback.print_exc()
+    sys.stdout.flush()
+
+
+def watch_directory(directory, options):
+    """ watch_directory
+        Convert the OBJ files under directory which are out of date, then
+        reconvert each one when it or a material library it references
+        changes, until interrupted.
+    """
+    interval = options.watch_interval
+    models = scan_models(directory)
+    libraries = dict((path, material_library_paths(path)) for path in models if is_obj_file(path))
+    for input_file_name in sorted(libraries):
+        if is_out_of_date(input_file_name, libraries[input_file_name], models):
+            convert_watched_file(input_file_name, options)
+    
+    print 'Watching %s for changes; press Control-C to stop.' % directory
+    sys.stdout.flush()
+    wake = threading.Event()
+    observer = start_change_observer(directory, wake)
+    changed = {}    # Path -> time its latest change was seen.
+    try:
+        while True:
+            timeout = interval
+            if changed:
+                timeout = max(0.0, min(changed.itervalues()) + interval - time.time())
+            wake.wait(timeout)
+            wake.clear()
+            
+            current_models = scan_models(directory)
+            now = time.time()
+            for path, state in current_models.iteritems():
+                if models.get(path) != state:
+                    changed[path] = now
+            for path in models:
+                if path not in current_models:
+                    changed.pop(path, None)
+                    libraries.pop(path, None)
+            models = current_models
+            
+            settled = [path for path, change_time in changed.iteritems() if now - change_time >= interval]
+            if not settled:
+                continue
+            affected = set()
+            for path in settled:
+                del changed[path]
+                if is_obj_file(path):
+                    libraries[path] = material_library_paths(path)
+                    affected.add(path)
+            for path in settled:
+                if not is_obj_file(path):
+                    affected.update(input_file_name for input_file_name, library_paths in libraries.iteritems()
+                                    if path in library_paths)
+            # Files which are still changing are converted once they settle.
+            for input_file_name in sorted(affected.difference(changed)):
+                convert_watched_file(input_file_name, options)
+    except KeyboardInterrupt:
+        print '\nStopped watching.'
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
+
+
+#
+# Pipelined batch conversion
+# With --pipeline, a reader thread loads the next OBJ files into memory, and
+# parses the material libraries they reference into material_library_cache,
+# while the current file is converted, and a writer thread writes finished DAT
+# files to disk. The threads hand work over through queues of at most
+# PIPELINE_DEPTH files each, which bounds the memory used. Files are still
+# converted one at a time in order, so the console output is the same as
+# without --pipeline, apart from write errors, which are reported at the end.
+#
+PIPELINE_DEPTH = 2
+
+# Finds mtllib statements without splitting the whole file into lines, which
+# would take the reader thread's share of the interpreter away from the
+# conversion.
+MTLLIB_PATTERN = re.compile(r'^mtllib[ \t]+(\S+)', re.MULTILINE)
+
+
+def start_daemon_thread(target, *args):
+    thread = threading.Thread(target=target, args=args)
+    thread.daemon = True    # Don't keep an interrupted run alive.
+    thread.start()
+    return thread
+
+
+def prefetch_inputs(input_file_names, prefetched):
+    """ prefetch_inputs
+        Reader thread for --pipeline. Puts an (input file name, contents)
+        pair for each file on the queue prefetched, in order, followed by
+        (None, None). The contents of a file that can't be read are None, so
+        that converting it reports the error as usual.
+    """
+    for input_file_name in input_file_names:
+        try:
+            with open(input_file_name, 'rb') as input_file:
+                input_data = input_file.read()
+        except EnvironmentError:
+            input_data = None
+        else:
+            material_directory = os.path.dirname(input_file_name)
+            for library_name in MTLLIB_PATTERN.findall(input_data):
+                try:
+                    parse_material_library(os.path.join(material_directory, library_name))
+                except Exception:
+                    pass    # Reported when the file is converted.
+        prefetched.put((input_file_name, input_data))
+    prefetched.put((None, None))
+
+
+def write_outputs(pending_writes, write_failures, options):
+    """ write_outputs
+        Writer thread for --pipeline. Takes (input file name, output file
+        names, output contents, cache keys or None) tuples from the queue
+        pending_writes until it gets None, writing each output file and
+        adding it to the conversion cache. Failures are recorded in the
+        dictionary write_failures, keyed by input file name.
+    """
+    while True:
+        pending_write = pending_writes.get()
+        if pending_write is None:
+            break
+        input_file_name, output_file_names, output_data, keys = pending_write
+        try:
+            for output_file_name, data in zip(output_file_names, output_data):
+                with open(output_file_name, 'w') as output_file:
+                    output_file.write(data)
+            if keys is not None:
+                for entry_key, file_name in zip(keys, output_file_names):
+                    store_cached_conversion(options.cache_dir, entry_key, file_name, options.cache_size * 1024 * 1024)
+        except Exception:
+            write_failures[input_file_name] = traceback.format_exc()
+
+
+def convert_files_pipelined(input_file_names, options):
+    """ convert_files_pipelined
+        Convert files one at a time, in order, while reading the next files
+        and writing finished ones in the background. Returns the names of the
+        files that failed to convert or couldn't be written.
+    """
+    prefetched = Queue.Queue(PIPELINE_DEPTH)
+    pending_writes = Queue.Queue(PIPELINE_DEPTH)
+    write_failures = {}
+    start_daemon_thread(prefetch_inputs, input_file_names, prefetched)
+    writer = start_daemon_thread(write_outputs, pending_writes, write_failures, options)
+    
+    failed_files = []
+    while True:
+        input_file_name, input_data = prefetched.get()
+        if input_file_name is None:
+            break
+        try:
+            profile_record = convert_file(input_file_name, options, input_data, pending_writes)
+            if profile_record is not None and options.profile is not None:
+                append_profile_record(options.profile, profile_record)
+        except Exception:
+            traceback.print_exc()
+            failed_files.append(input_file_name)
+    pending_writes.put(None)
+    writer.join()
+    
+    for input_file_name in input_file_names:
+        if input_file_name in write_failures:
+            print '\nFailed to write the output of %s:' % input_file_name
+            sys.stdout.write(write_failures.pop(input_file_name))
+            failed_files.append(input_file_name)
+    return failed_files
+
+
+#
+# Command line interface
+#
+def output_file_name_for(input_file_name):
+    """ output_file_name_for
+        Returns the name of the DAT file converted from input_file_name.
+    """
+    output_file_name = input_file_name.lower().replace('.obj', '.dat')
+    if output_file_name == input_file_name:
+        output_file_name += '.1'
+    return output_file_name
+
+
+def convert_file(input_file_name, options, input_data=None, pending_writes=None):
+    """ convert_file
+        Convert one OBJ file to DAT, writing the result next to it, or copying
+        it from the conversion cache if one is in use. Returns the profile
+        record for the conversion, or None if not profiling.
+        
+        input_data is the OBJ file's contents, if they have already been
+        read. If pending_writes is given, the DAT files are converted in
+        memory and queued on it for write_outputs() to write and cache,
+        instead of being written here.
+    """
+    output_file_name = output_file_name_for(input_file_name)
+    input_display_name = os.path.basename(input_file_name)
+    output_display_name = os.path.basename(output_file_name)
+    
+    print input_display_name + ' -> ' + output_display_name
+    profiler = PhaseProfiler('Obj2DatTexNorm', input_file_name,
+                             enabled=options.profile is not None or options.cprofile, cprofile=options.cprofile)
+    
+    # Levels of detail are cached as separate entries, keyed by the main
+    # file's key and their ratio.
+    output_file_names = [output_file_name] + [lod_file_name(output_file_name, ratio) for ratio in options.lod]
+    use_cache = options.cache_dir and not options.no_cache
+    keys = None
+    if use_cache:
+        profiler.begin('cache lookup')
+        key = conversion_cache_key(input_file_name, options, input_data)
+        keys = [key] + [hashlib.sha1('%s\nlod=%r\n' % (key, ratio)).hexdigest() for ratio in options.lod]
+        if all(fetch_cached_conversion(options.cache_dir, entry_key, file_name)
+               for entry_key, file_name in zip(keys, output_file_names)):
+            print '  Unchanged, copied from cache'
+            return profiler.finish()
+        profiler.end()
+    
+    if input_data is None:
+        input = input_file_name
+    else:
+        input = cStringIO.StringIO(input_data)
+    if pending_writes is None:
+        outputs = output_file_names
+    else:
+        outputs = [cStringIO.StringIO() for file_name in output_file_names]
+    convert_obj_to_dat(input, outputs[0], options, name=os.path.basename(input_file_name),
+                       material_directory=os.path.dirname(input_file_name), profiler=profiler, lod_outputs=outputs[1:],
+                       log=print_message)
+    if pending_writes is not None:
+        pending_writes.put((input_file_name, output_file_names, [output.getvalue() for output in outputs], keys))
+        return profiler.finish()
+    
+    if use_cache:
+        profiler.begin('cache store')
+        for entry_key, file_name in zip(keys, output_file_names):
+            store_cached_conversion(options.cache_dir, entry_key, file_name, options.cache_size * 1024 * 1024)
+    return profiler.finish()
+
+
+def convert_file_job(job):
+    """ convert_file_job
+        Process pool entry point for --jobs. job is an (input file name,
+        options) pair. The file's console output is captured so that it can
+        be printed in one piece, and exceptions are reported in that output.
+        Returns (input file name, console output, succeeded, profile record).
+    """
+    input_file_name, options = job
+    
+    real_stdout = sys.stdout
+    sys.stdout = captured_output = StringIO.StringIO()
+    profile_record = None
+    try:
+        profile_record = convert_file(input_file_name, options)
+        succeeded = True
+    except Exception:
+        traceback.print_exc(file=captured_output)
+        succeeded = False
+    finally:
+        sys.stdout = real_stdout
+    
+    return input_file_name, captured_output.getvalue(), succeeded, profile_record
+
+
+def main():
+    options = argParser.parse_args()
+    if options.winding_mode not in range(4):
+        print 'Unknown normal winding mode %u' % (options.winding_mode)
+        exit(-1)
+    if options.watch is None and len(options.files) == 0:
+        argParser.error('expected files to convert or --watch DIR')
+    if options.watch is not None and not os.path.isdir(options.watch):
+        argParser.error('%s is not a directory' % options.watch)
+    if options.watch_interval <= 0.0:
+        argParser.error('--watch-interval must be greater than zero')
+    
+    failed_files = []
+    jobs = options.jobs
+    if jobs < 1:
+        jobs = multiprocessing.cpu_count()
+    jobs = min(jobs, len(options.files))
+    
+    if jobs > 1:
+        # Results come back in input order, so each file's output is printed
+        # as one block, and its profile record written, in the same order as
+        # a serial run.
+        pool = multiprocessing.Pool(jobs)
+        for input_file_name, output, succeeded, profile_record in pool.imap(convert_file_job, [(name, options) for name in options.files]):
+            sys.stdout.write(output)
+            if not succeeded:
+                failed_files.append(input_file_name)
+            if profile_record is not None and options.profile is not None:
+                append_profile_record(options.profile, profile_record)
+        pool.close()
+        pool.join()
+    elif options.pipeline:
+        failed_files = convert_files_pipelined(options.files, options)
+    else:
+        for input_file_name in options.files:
+            try:
+                profile_record = convert_file(input_file_name, options)
+                if profile_record is not None and options.profile is not None:
+                    append_profile_record(options.profile, profile_record)
+            except Exception:
+                traceback.print_exc()
+                failed_files.append(input_file_name)
+    
+    if len(failed_files) != 0:
+        print '\nFailed to convert %u of %u files:' % (len(failed_files), len(options.files))
+        for input_file_name in failed_files:
+            print '  ' + input_file_name
+        if options.watch is None:
+            exit(1)
+    elif len(options.files) != 0:
+        print 'Done.\n'
+    
+    if options.watch is not None:
+        watch_directory(options.watch, options)
 
 
-print 'Done.\n'
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1798 @@
+# -*- coding: utf-8 -*-
+
+"""
+Shared support code for the Oolite mesh converters.
+
+This module is not a converter itself; it must be kept in the same directory
+as the conversion scripts, which import it.
+"""
+
+import array
+import bisect
+import collections
+import contextlib
+import cProfile
+import heapq
+import itertools
+import json
+import math
+import mmap
+import os
+import platform
+import re
+import string
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak memory is then not reported.
+    resource = None
+
+
+#
+# Input
+#
+# Files are read through read_lines(), which pulls fixed-size chunks from the
+# file instead of reading it whole and splitting it into a list of lines.
+# While a file is being read, at most about three times chunk_size bytes of
+# raw text are held at once (the chunk, any carried-over partial line, and
+# the lines split from them), plus the length of the longest line. With the
+# default chunk size this is a few megabytes regardless of the file's size,
+# leaving the parsed geometry as the only thing that grows with the input.
+#
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+
+def read_lines(input_file, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ read_lines
+        Generate the lines of an open file, without line terminators, reading
+        chunk_size bytes at a time. Like str.splitlines(), this accepts LF,
+        CRLF and CR (Meshwork) line endings, even when a CRLF pair is split
+        between two chunks.
+    """
+    pending = ''
+    while True:
+        chunk = input_file.read(chunk_size)
+        if not chunk:
+            break
+        lines = (pending + chunk).splitlines(True)
+        
+        # The last line may continue in the next chunk; a trailing CR may be
+        # the first half of a CRLF.
+        pending = lines.pop()
+        if pending[-1] == '\n':
+            lines.append(pending)
+            pending = ''
+
+        for line in lines:
+            yield line.rstrip('\r\n')
+    
+    if pending:
+        yield pending.rstrip('\r\n')
+
+
+#
+# Mesh representation
+#
+# Parsed geometry is held in flat typed arrays from the array module instead
+# of lists of tuples. A Python float costs 24 bytes and a 3-tuple another 80
+# or so, plus a list slot, which comes to around 160 bytes for each vertex
+# position; the same position in an array('d') is 24 bytes. Per face, Mesh
+# uses 12 bytes of triangle indices, 4 bytes of material index, 24 bytes of
+# face normal and 48 bytes of texture coordinates when those are present.
+# A closed mesh of a million triangles has about half a million vertices, so
+# with face normals and texture coordinates it takes roughly
+#
+#     500,000 x 24 (positions) + 1,000,000 x 88 (faces) = about 100 MB
+#
+# (plus 12 MB for vertex normals), where the lists of tuples used by the
+# original scripts needed well over half a gigabyte for the same model.
+# Mesh.memory_usage() reports the actual figure for a loaded mesh.
+#
+# Mesh is the shared form for triangle meshes: Mesh2Dat, Mesh2DatTex and
+# Mesh2Obj read Meshwork files into it, Dat2Mesh writes one, and parse_dat()
+# reads a DAT file into one. Other readers keep their own structures. OBJ
+# input is read into ObjGeometry, because OBJ indexes positions, normals and
+# texture coordinates separately for each corner and groups polygons by
+# smoothing group; Obj2DatTex and Obj2DatTexNorm need all of that to split
+# vertices into the single index space of a DAT file. Dat2Obj, Dat2ObjTex,
+# Dat2Mesh and DatScale read a DATFile, which keeps polygons as they are in
+# the file (OBJ output keeps them whole, and Dat2Mesh fans them its own way)
+# and the offset of each section, so that DatScale can copy unchanged
+# sections byte for byte.
+#
+class Mesh(object):
+    
+    """ Mesh
+        A triangle mesh in the form used by DAT files: a single index space
+        for vertex positions and normals, with materials, face normals and
+        texture coordinates stored per face.
+        
+        positions       x, y, z for each vertex
+        normals         x, y, z for each vertex, or empty
+        tangents        x, y, z for each vertex, or empty
+        triangles       three vertex indices for each face
+        face_normals    x, y, z for each face, or empty
+        face_materials  index into materials for each face, -1 for none
+        uvs             s, t for each corner of each face (six per face), in
+                        DAT orientation (t increasing downwards), or empty
+        materials       material or texture names
+        material_uvs    Meshwork-style texture coordinates for each entry in
+                        materials, as a (vertex indices, s and t) pair of
+                        arrays in file order, or empty
+    """
+    
+    __slots__ = ('positions', 'normals', 'tangents', 'triangles', 'face_normals',
+                 'face_materials', 'uvs', 'materials', 'material_uvs')
+    
+    def __init__(self):
+        self.positions = array.array('d')
+        self.normals = array.array('d')
+        self.tangents = array.array('d')
+        self.triangles = array.array('i')
+        self.face_normals = array.array('d')
+        self.face_materials = array.array('i')
+        self.uvs = array.array('d')
+        self.materials = []
+        self.material_uvs = []
+    
+    def vertex_count(self):
+        return len(self.positions) // 3
+    
+    def face_count(self):
+        return len(self.triangles) // 3
+    
+    def position(self, i):
+        i *= 3
+        positions = self.positions
+        return positions[i], positions[i + 1], positions[i + 2]
+    
+    def normal(self, i):
+        i *= 3
+        normals = self.normals
+        return normals[i], normals[i + 1], normals[i + 2]
+    
+    def triangle(self, i):
+        i *= 3
+        triangles = self.triangles
+        return triangles[i], triangles[i + 1], triangles[i + 2]
+    
+    def face_normal(self, i):
+        i *= 3
+        face_normals = self.face_normals
+        return face_normals[i], face_normals[i + 1], face_normals[i + 2]
+    
+    def face_uvs(self, i):
+        i *= 6
+        uvs = self.uvs
+        return (uvs[i], uvs[i + 1]), (uvs[i + 2], uvs[i + 3]), (uvs[i + 4], uvs[i + 5])
+    
+    def material_index(self, name):
+        """ material_index
+            Returns the index of the named material, adding it if necessary.
+        """
+        try:
+            return self.materials.index(name)
+        except ValueError:
+            self.materials.append(name)
+            return len(self.materials) - 1
+    
+    def triangle_normal(self, i):
+        """ triangle_normal
+            Returns the unit normal of face i, calculated from its vertex
+            positions. Raises ZeroDivisionError for a degenerate triangle.
+        """
+        return triangle_normal(self.positions, *self.triangle(i))
+    
+    def calculate_face_normals(self):
+        """ calculate_face_normals
+            Replace face_normals with normals calculated from the geometry.
+        """
+        face_normals = array.array('d')
+        for i in xrange(self.face_count()):
+            face_normals.extend(self.triangle_normal(i))
+        self.face_normals = face_normals
+    
+    def memory_usage(self):
+        """ memory_usage
+            Returns the number of bytes used by the mesh's geometry arrays.
+        """
+        arrays = [self.positions, self.normals, self.tangents, self.triangles, self.face_normals, self.face_materials, self.uvs]
+        for vertices, uvs in self.material_uvs:
+            arrays.append(vertices)
+            arrays.append(uvs)
+        return sum(len(values) * values.itemsize for values in arrays)
+
+
+def triangle_normal(positions, v1, v2, v3):
+    """ triangle_normal
+        Returns the unit normal of the triangle (v1, v2, v3), given flat x, y,
+        z positions. Raises ZeroDivisionError for a degenerate triangle.
+    """
+    p1 = positions[3 * v1:3 * v1 + 3]
+    p2 = positions[3 * v2:3 * v2 + 3]
+    p3 = positions[3 * v3:3 * v3 + 3]
+    d0 = (p2[0] - p1[0], p2[1] - p1[1], p2[2] - p1[2])
+    d1 = (p3[0] - p2[0], p3[1] - p2[1], p3[2] - p2[2])
+    xp = (d0[1] * d1[2] - d0[2] * d1[1], d0[2] * d1[0] - d0[0] * d1[2], d0[0] * d1[1] - d0[1] * d1[0])
+    det = 1.0 / math.sqrt(xp[0] * xp[0] + xp[1] * xp[1] + xp[2] * xp[2])
+    return xp[0] * det, xp[1] * det, xp[2] * det
+
+
+#
+# Vertex cache optimization
+# GPUs keep recently transformed vertices in a small post-transform cache, so
+# a vertex shared by consecutive triangles is only transformed once. Triangle
+# order is chosen with Tom Forsyth's linear-speed vertex cache optimization,
+# and measured by simulating a FIFO cache: ACMR is the average number of cache
+# misses per triangle, ATVR the average number of times each vertex is
+# transformed (1.0 is ideal).
+#
+VERTEX_CACHE_SIZE = 32
+
+_CACHE_DECAY_POWER = 1.5
+_LAST_TRIANGLE_SCORE = 0.75
+_VALENCE_BOOST_SCALE = 2.0
+_VALENCE_BOOST_POWER = 0.5
+
+
+def vertex_cache_misses(triangles, cache_size=VERTEX_CACHE_SIZE):
+    """ vertex_cache_misses
+        Returns the number of vertex transformations a FIFO cache of
+        cache_size entries needs to draw triangles, a flat sequence of three
+        vertex indices per triangle, in order.
+    """
+    cached = set()
+    fifo = collections.deque()
+    misses = 0
+    for v in triangles:
+        if v not in cached:
+            misses += 1
+            cached.add(v)
+            fifo.append(v)
+            if len(fifo) > cache_size:
+                cached.discard(fifo.popleft())
+    return misses
+
+
+def vertex_cache_statistics(triangles, vertex_count, cache_size=VERTEX_CACHE_SIZE):
+    """ vertex_cache_statistics
+        Returns the ACMR and ATVR of triangles for a FIFO cache of cache_size
+        entries.
+    """
+    misses = vertex_cache_misses(triangles, cache_size)
+    face_count = len(triangles) // 3
+    return (float(misses) / face_count if face_count else 0.0,
+            float(misses) / vertex_count if vertex_count else 0.0)
+
+
+def optimize_vertex_cache(triangles, vertex_count, cache_size=VERTEX_CACHE_SIZE):
+    """ optimize_vertex_cache
+        Returns a list of face indices giving an order in which to draw
+        triangles, a flat sequence of three vertex indices per triangle, that
+        makes good use of a post-transform cache of about cache_size entries.
+        
+        Each vertex is scored by its position in a simulated LRU cache and by
+        how many undrawn triangles still use it, and the next triangle is the
+        highest scoring one among those using a cached vertex. Only the
+        vertices and triangles touched by each step are rescored.
+    """
+    face_count = len(triangles) // 3
+    
+    # Score tables by cache position and by number of remaining triangles.
+    position_scores = []
+    for position in xrange(cache_size):
+        if position < 3:
+            position_scores.append(_LAST_TRIANGLE_SCORE)
+        else:
+            scale = 1.0 / (cache_size - 3)
+            position_scores.append((1.0 - (position - 3) * scale) ** _CACHE_DECAY_POWER)
+    
+    vertex_faces = [[] for i in xrange(vertex_count)]
+    for f in xrange(face_count):
+        for v in triangles[3 * f:3 * f + 3]:
+            vertex_faces[v].append(f)
+    max_valence = max([len(faces) for faces in vertex_faces] or [0])
+    valence_scores = [0.0] + [_VALENCE_BOOST_SCALE * k ** -_VALENCE_BOOST_POWER for k in xrange(1, max_valence + 1)]
+    
+    cache_positions = [-1] * vertex_count
+    vertex_scores = [valence_scores[len(faces)] for faces in vertex_faces]
+    face_scores = [vertex_scores[triangles[3 * f]] + vertex_scores[triangles[3 * f + 1]] + vertex_scores[triangles[3 * f + 2]]
+                   for f in xrange(face_count)]
+    drawn = bytearray(face_count)
+    
+    order = []
+    cache = []
+    next_undrawn = 0
+    best_face = max(xrange(face_count), key=face_scores.__getitem__) if face_count else -1
+    while len(order) < face_count:
+        if best_face < 0:
+            # No cached vertex has undrawn triangles; start afresh.
+            while drawn[next_undrawn]:
+                next_undrawn += 1
+            best_face = next_undrawn
+        
+        order.append(best_face)
+        drawn[best_face] = 1
+        face_vertices = triangles[3 * best_face:3 * best_face + 3]
+        for v in face_vertices:
+            vertex_faces[v].remove(best_face)
+        
+        # Move the triangle's vertices to the front of the cache.
+        new_cache = list(face_vertices)
+        new_cache.extend(v for v in cache if v not in face_vertices)
+        for v in new_cache[cache_size:]:
+            cache_positions[v] = -1
+            vertex_scores[v] = valence_scores[len(vertex_faces[v])]
+        cache = new_cache[:cache_size]
+        
+        # Rescore the cached vertices and their undrawn triangles.
+        for position, v in enumerate(cache):
+            cache_positions[v] = position
+            if vertex_faces[v]:
+                vertex_scores[v] = position_scores[position] + valence_scores[len(vertex_faces[v])]
+            else:
+                vertex_scores[v] = -1.0
+        for v in new_cache[cache_size:]:
+            for f in vertex_faces[v]:
+                face_scores[f] = vertex_scores[triangles[3 * f]] + vertex_scores[triangles[3 * f + 1]] + vertex_scores[triangles[3 * f + 2]]
+        best_face = -1
+        best_score = -1.0
+        for v in cache:
+            for f in vertex_faces[v]:
+                score = vertex_scores[triangles[3 * f]] + vertex_scores[triangles[3 * f + 1]] + vertex_scores[triangles[3 * f + 2]]
+                face_scores[f] = score
+                if score > best_score:
+                    best_score = score
+                    best_face = f
+    return order
+
+
+def renumber_vertices(triangles, vertex_count):
+    """ renumber_vertices
+        Returns triangles with its vertices renumbered in the order they are
+        first used, so that vertex data is also read in drawing order, and
+        the original index of each renumbered vertex. Unused vertices are
+        numbered after the used ones, in their original order.
+    """
+    new_index = [-1] * vertex_count
+    old_index = []
+    for v in triangles:
+        if new_index[v] < 0:
+            new_index[v] = len(old_index)
+            old_index.append(v)
+    for v in xrange(vertex_count):
+        if new_index[v] < 0:
+            new_index[v] = len(old_index)
+            old_index.append(v)
+    return array.array('i', [new_index[v] for v in triangles]), old_index
+
+
+#
+# Decimation
+# Lower detail versions of a mesh are made by repeatedly removing the vertex
+# whose removal changes the surface least, measured with Garland and
+# Heckbert's quadric error metrics. Each removal is a half-edge collapse: the
+# vertex is merged into one of its neighbours, which keeps its position,
+# normal and texture coordinates, so no new attribute values are invented.
+# Locked vertices, such as those on texture seams and hard edges, are never
+# removed, although their neighbours may be merged into them; neither are
+# vertices on open or non-manifold edges.
+#
+# Every vertex keeps only its cheapest collapse in the priority queue, and a
+# collapse only rescores the vertices around it, so the work per collapse
+# does not grow with the size of the mesh.
+#
+_MAX_FACE_TURN_COS2 = 0.25 ** 2
+
+
+def vector_cross(ux, uy, uz, vx, vy, vz):
+    return uy * vz - uz * vy, uz * vx - ux * vz, ux * vy - uy * vx
+
+
+def vector_dot(u, v):
+    return u[0] * v[0] + u[1] * v[1] + u[2] * v[2]
+
+
+def decimate_mesh(positions, triangles, locked, face_targets):
+    """ decimate_mesh
+        Simplify a triangle mesh to each of the face counts in face_targets,
+        which must be in decreasing order. positions holds x, y, z for each
+        vertex and triangles three vertex indices for each face. locked holds
+        a true value for each vertex that must not be removed.
+        
+        Returns a (faces, triangles) pair of arrays for each target, where
+        faces holds the index in the input of each remaining face and
+        triangles its vertex indices after merging. If too many vertices are
+        locked to reach a target, the result for it has more faces.
+    """
+    vertex_count = len(positions) // 3
+    face_count = len(triangles) // 3
+    tris = array.array('i', triangles)
+    alive = bytearray('\1') * face_count
+    alive_count = face_count
+    
+    # Sum the area-weighted plane quadrics of the faces around each vertex.
+    # A quadric is stored as the ten distinct coefficients of its symmetric
+    # 4x4 matrix: aa, ab, ac, ad, bb, bc, bd, cc, cd, dd.
+    add = float.__add__
+    quadrics = array.array('d', [0.0]) * (10 * vertex_count)
+    vertex_faces = [[] for i in xrange(vertex_count)]
+    for f in xrange(face_count):
+        i1, i2, i3 = tris[3 * f:3 * f + 3]
+        vertex_faces[i1].append(f)
+        vertex_faces[i2].append(f)
+        vertex_faces[i3].append(f)
+        x1, y1, z1 = positions[3 * i1:3 * i1 + 3]
+        x2, y2, z2 = positions[3 * i2:3 * i2 + 3]
+        x3, y3, z3 = positions[3 * i3:3 * i3 + 3]
+        a, b, c = vector_cross(x2 - x1, y2 - y1, z2 - z1, x3 - x1, y3 - y1, z3 - z1)
+        length = math.sqrt(a * a + b * b + c * c)
+        if length == 0.0:
+            continue
+        # The plane's normal (a, b, c) is left unnormalized, its length being
+        # twice the face's area, so scaling the products by 0.5 / length
+        # weights the unit plane by area.
+        d = -(a * x1 + b * y1 + c * z1)
+        w = 0.5 / length
+        plane = (w * a * a, w * a * b, w * a * c, w * a * d, w * b * b,
+                 w * b * c, w * b * d, w * c * c, w * c * d, w * d * d)
+        for i in (10 * i1, 10 * i2, 10 * i3):
+            quadrics[i:i + 10] = array.array('d', map(add, quadrics[i:i + 10], plane))
+    
+    # Only interior vertices of a manifold surface, where every neighbour
+    # shares exactly two of the vertex's faces and there are at least three
+    # neighbours, may be removed.
+    removable = bytearray(vertex_count)
+    for v in xrange(vertex_count):
+        if locked[v] or not vertex_faces[v]:
+            continue
+        neighbours = [w for f in vertex_faces[v] for w in tris[3 * f:3 * f + 3] if w != v]
+        neighbours.sort()
+        if (len(neighbours) >= 6 and neighbours[0::2] == neighbours[1::2] and
+                len(set(neighbours)) * 2 == len(neighbours)):
+            removable[v] = 1
+    
+    def neighbours_of(v):
+        neighbours = set()
+        for f in vertex_faces[v]:
+            neighbours.update(tris[3 * f:3 * f + 3])
+        neighbours.discard(v)
+        return neighbours
+    
+    def plane_error(u, x, y, z):
+        # The sum of the squared distances of (x, y, z) from u's planes.
+        i = 10 * u
+        q0, q1, q2, q3, q4, q5, q6, q7, q8, q9 = quadrics[i:i + 10]
+        return (x * (q0 * x + 2.0 * (q1 * y + q2 * z + q3)) + y * (q4 * y + 2.0 * (q5 * z + q6)) +
+                z * (q7 * z + 2.0 * q8) + q9)
+    
+    # The cost of merging u into v is the error of both vertices' planes at
+    # v's position. v's part depends only on v, so it is kept in own_errors.
+    own_errors = array.array('d', [plane_error(v, *positions[3 * v:3 * v + 3]) for v in xrange(vertex_count)])
+    
+    def collapse_costs(u):
+        i = 10 * u
+        q0, q1, q2, q3, q4, q5, q6, q7, q8, q9 = quadrics[i:i + 10]
+        costs = []
+        for v in neighbours_of(u):
+            x, y, z = positions[3 * v:3 * v + 3]
+            costs.append((x * (q0 * x + 2.0 * (q1 * y + q2 * z + q3)) + y * (q4 * y + 2.0 * (q5 * z + q6)) +
+                          z * (q7 * z + 2.0 * q8) + q9 + own_errors[v], v))
+        return costs
+    
+    def can_collapse(u, v):
+        shared = [f for f in vertex_faces[u] if v in tris[3 * f:3 * f + 3]]
+        if not shared:
+            return False
+        
+        # The link condition: the only vertices adjacent to both u and v
+        # are the third corners of their shared faces, or the surface would
+        # fold onto itself.
+        opposite = set(w for f in shared for w in tris[3 * f:3 * f + 3])
+        opposite.discard(u)
+        opposite.discard(v)
+        if neighbours_of(u) & neighbours_of(v) != opposite:
+            return False
+        
+        # No moved face may land on one of v's faces, as when a closed
+        # tetrahedron would flatten into a two-sided triangle, or turn by more
+        # than about 75 degrees, which also rules out faces turning over or
+        # collapsing to a line.
+        v_faces = [set(tris[3 * f:3 * f + 3]) for f in vertex_faces[v]]
+        px, py, pz = positions[3 * v:3 * v + 3]
+        for f in vertex_faces[u]:
+            corners = tris[3 * f:3 * f + 3]
+            if v in corners:
+                continue
+            k = corners.index(u)
+            i1, i2 = corners[(k + 1) % 3], corners[(k + 2) % 3]
+            if set((v, i1, i2)) in v_faces:
+                return False
+            ox, oy, oz = positions[3 * u:3 * u + 3]
+            x1, y1, z1 = positions[3 * i1:3 * i1 + 3]
+            x2, y2, z2 = positions[3 * i2:3 * i2 + 3]
+            before = vector_cross(x1 - ox, y1 - oy, z1 - oz, x2 - ox, y2 - oy, z2 - oz)
+            after = vector_cross(x1 - px, y1 - py, z1 - pz, x2 - px, y2 - py, z2 - pz)
+            dot = after[0] * before[0] + after[1] * before[1] + after[2] * before[2]
+            if dot <= 0.0 or dot * dot < _MAX_FACE_TURN_COS2 * vector_dot(after, after) * vector_dot(before, before):
+                return False
+        return True
+    
+    # The queue holds (cost, u, v, stamp) for the cheapest collapse of each
+    # removable vertex u; entries whose stamp is out of date are skipped.
+    heap = []
+    stamps = array.array('i', [0]) * vertex_count
+    best_targets = array.array('i', [-1]) * vertex_count
+    best_costs = array.array('d', [0.0]) * vertex_count
+    
+    def schedule(u, cost, v):
+        stamps[u] += 1
+        best_targets[u] = v
+        best_costs[u] = cost
+        heapq.heappush(heap, (cost, u, v, stamps[u]))
+    
+    def schedule_cheapest(u):
+        # A vertex left without neighbours, the last of a closed part that
+        # has collapsed, can't be removed any more.
+        costs = collapse_costs(u)
+        if costs:
+            schedule(u, *min(costs))
+        else:
+            removable[u] = 0
+            stamps[u] += 1
+    
+    for u in xrange(vertex_count):
+        if removable[u]:
+            schedule_cheapest(u)
+    
+    results = []
+    targets = list(face_targets)
+    while targets:
+        if alive_count <= targets[0] or not heap:
+            faces = array.array('i', itertools.compress(xrange(face_count), alive))
+            remaining = array.array('i')
+            for f in faces:
+                remaining.extend(tris[3 * f:3 * f + 3])
+            results.append((faces, remaining))
+            del targets[0]
+            continue
+        
+        cost, u, v, stamp = heapq.heappop(heap)
+        if stamp != stamps[u]:
+            continue
+        if not can_collapse(u, v):
+            # Fall back to u's next best collapse. If none is possible, u
+            # waits until one of its neighbours changes.
+            stamps[u] += 1
+            best_targets[u] = -1
+            best_costs[u] = float('inf')
+            for cost, w in sorted(collapse_costs(u)):
+                if w != v and can_collapse(u, w):
+                    schedule(u, cost, w)
+                    break
+            continue
+        
+        # Merge u into v, deleting the faces they share.
+        for f in vertex_faces[u]:
+            corners = tris[3 * f:3 * f + 3]
+            if v in corners:
+                alive[f] = 0
+                alive_count -= 1
+                for w in corners:
+                    if w != u:
+                        vertex_faces[w].remove(f)
+            else:
+                tris[3 * f + corners.index(u)] = v
+                vertex_faces[v].append(f)
+        vertex_faces[u] = []
+        removable[u] = 0
+        stamps[u] += 1
+        i = 10 * u
+        j = 10 * v
+        quadrics[j:j + 10] = array.array('d', map(add, quadrics[i:i + 10], quadrics[j:j + 10]))
+        x, y, z = positions[3 * v:3 * v + 3]
+        own_errors[v] = plane_error(v, x, y, z)
+        
+        # Only collapses into v, or whose target was u or v, have changed.
+        if removable[v]:
+            schedule_cheapest(v)
+        for w in neighbours_of(v):
+            if not removable[w]:
+                continue
+            if best_targets[w] == u or best_targets[w] == v:
+                schedule_cheapest(w)
+            else:
+                cost = plane_error(w, x, y, z) + own_errors[v]
+                if cost < best_costs[w]:
+                    schedule(w, cost, v)
+    return results
+
+
+#
+# OBJ
+#
+class ObjGeometry(object):
+    
+    """ ObjGeometry
+        The geometry read from an OBJ file by parse_obj().
+        
+        Positions, normals and texture coordinates are stored in flat typed
+        arrays, with three, three and two components per entry respectively.
+        Face corners are stored as the raw (one-based, possibly negative)
+        indices from the file, with 0 standing for an omitted index, because
+        relative indices can only be resolved once the whole file has been
+        read. Polygon i uses the next polygon_sizes[i] corners, the material
+        selected by usemtl statement number polygon_materials[i] and the
+        smoothing group set by s statement number polygon_smoothing[i] (-1 if
+        no such statement precedes it).
+    """
+    
+    __slots__ = ('positions', 'normals', 'uvs', 'corner_positions', 'corner_uvs',
+                 'corner_normals', 'polygon_sizes', 'polygon_materials',
+                 'polygon_smoothing', 'material_statements',
+                 'smoothing_statements', 'max_v', 'min_v')
+    
+    def __init__(self):
+        self.positions = array.array('d')
+        self.normals = array.array('d')
+        self.uvs = array.array('d')
+        self.corner_positions = array.array('i')
+        self.corner_uvs = array.array('i')
+        self.corner_normals = array.array('i')
+        self.polygon_sizes = array.array('i')
+        self.polygon_materials = array.array('i')
+        self.polygon_smoothing = array.array('i')
+        self.material_statements = []
+        self.smoothing_statements = array.array('i')
+        self.max_v = [0.0, 0.0, 0.0]
+        self.min_v = [0.0, 0.0, 0.0]
+    
+    def vertex_count(self):
+        return len(self.positions) // 3
+    
+    def normal_count(self):
+        return len(self.normals) // 3
+    
+    def position(self, i):
+        i *= 3
+        positions = self.positions
+        return positions[i], positions[i + 1], positions[i + 2]
+    
+    def normal(self, i):
+        i *= 3
+        normals = self.normals
+        return normals[i], normals[i + 1], normals[i + 2]
+    
+    def uv(self, i):
+        i *= 2
+        return self.uvs[i], self.uvs[i + 1]
+
+
+def parse_obj(lines, material_library_handler):
+    """ parse_obj
+        Read the geometry from an iterable of OBJ lines in a single pass and
+        return it as an ObjGeometry. material_library_handler is called with
+        the name given by each mtllib statement as soon as it is seen.
+        
+        The x axis is negated to convert to Oolite's coordinate conventions,
+        and texture coordinates are flipped to DAT orientation. Normals are
+        stored as read, without normalizing them.
+        
+        lines is only iterated once, so it can be a read_lines() generator
+        streaming the file. Relative (negative) face indices are kept as-is
+        and resolved against the final counts by the caller.
+    """
+    geometry = ObjGeometry()
+    positions = geometry.positions
+    normals = geometry.normals
+    uvs = geometry.uvs
+    corner_positions = geometry.corner_positions
+    corner_uvs = geometry.corner_uvs
+    corner_normals = geometry.corner_normals
+    polygon_sizes = geometry.polygon_sizes
+    polygon_materials = geometry.polygon_materials
+    polygon_smoothing = geometry.polygon_smoothing
+    material_statements = geometry.material_statements
+    smoothing_statements = geometry.smoothing_statements
+    
+    for line in lines:
+        tokens = line.split()
+        if tokens == []:
+            continue
+        keyword = tokens[0]
+        
+        if keyword == 'v':
+            # Negate x value for vertex to compensate for different coordinate conventions.
+            positions.extend((-float(tokens[1]), float(tokens[2]), float(tokens[3])))
+        
+        elif keyword == 'f':
+            for corner in tokens[1:]:
+                bits = corner.split('/')
+                corner_positions.append(int(bits[0]))
+                if len(bits) > 1 and bits[1] > '':
+                    corner_uvs.append(int(bits[1]))
+                else:
+                    corner_uvs.append(0)
+                if len(bits) > 2 and bits[2] > '':
+                    corner_normals.append(int(bits[2]))
+                else:
+                    corner_normals.append(0)
+            polygon_sizes.append(len(tokens) - 1)
+            polygon_materials.append(len(material_statements) - 1)
+            polygon_smoothing.append(len(smoothing_statements) - 1)
+        
+        elif keyword == 'vn':
+            normals.extend((-float(tokens[1]), float(tokens[2]), float(tokens[3])))
+        
+        elif keyword == 'vt':
+            uvs.extend((float(tokens[1]), 1.0 - float(tokens[2])))
+        
+        elif keyword == 's':
+            # 0 and off both mean no smoothing.
+            if len(tokens) < 2 or tokens[1] == 'off':
+                smoothing_statements.append(0)
+            else:
+                smoothing_statements.append(int(tokens[1]))
+        
+        elif keyword == 'usemtl':
+            material_statements.append(tokens[1])
+        
+        elif keyword == 'mtllib':
+            material_library_handler(tokens[1])
+    
+    # Bounding box, anchored at the origin.
+    if len(positions) != 0:
+        for axis in range(3):
+            components = positions[axis::3]
+            geometry.max_v[axis] = max(0.0, max(components))
+            geometry.min_v[axis] = min(0.0, min(components))
+    
+    return geometry
+
+
+def generate_normals(geometry, crease_angle=None, weighting='angle'):
+    """ generate_normals
+        Give every polygon corner in an ObjGeometry that has no normal index
+        a calculated normal, appending the new normals to geometry.normals.
+        Returns the number of corners given normals.
+        
+        Corners that share a position in polygons of the same smoothing
+        group share a normal: the sum of those polygons' face normals, each
+        weighted by the polygon's angle at the corner, or by its area if
+        weighting is 'area'. Polygons before any s statement count as
+        smoothing group 1, as in Obj2DatTex.py, and polygons in group 0 (s
+        off) are flat shaded. If crease_angle is given, in degrees, polygons
+        whose face normals differ by more than that don't contribute to each
+        other's normals, so sharp edges stay hard within a group.
+        
+        Normals point outwards for polygons wound anticlockwise, as OBJ
+        expects. The work is done in a few passes over all corners, each
+        corner being put in a cluster of corners sharing a normal through a
+        single dictionary, so without a crease angle this takes linear time.
+        With one, each distinct face normal at a position is compared with
+        every corner there, so a position shared by n polygons that all face
+        different ways, such as the pole of a sphere, costs n squared steps.
+    """
+    corner_normals = geometry.corner_normals
+    if 0 not in corner_normals:
+        return 0
+    
+    positions = geometry.positions
+    vertex_count = geometry.vertex_count()
+    corner_vertices = array.array('i', [v - 1 if v > 0 else v + vertex_count for v in geometry.corner_positions])
+    corner_count = len(corner_vertices)
+    
+    # Unit face normals, negated since the x axis was negated on reading,
+    # and each corner's weight. Triangles are done directly; other polygons
+    # use Newell's method, which also suits non-planar polygons.
+    polygon_count = len(geometry.polygon_sizes)
+    face_normals = array.array('d', [0.0]) * (3 * polygon_count)
+    corner_polygons = array.array('i')
+    corner_weights = array.array('d')
+    use_angles = weighting != 'area'
+    start = 0
+    for polygon, size in enumerate(geometry.polygon_sizes):
+        corner_polygons.extend([polygon] * size)
+        if size == 3:
+            i, j, k = corner_vertices[start:start + 3]
+            x0, y0, z0 = positions[3 * i:3 * i + 3]
+            x1, y1, z1 = positions[3 * j:3 * j + 3]
+            x2, y2, z2 = positions[3 * k:3 * k + 3]
+            ax, ay, az = x1 - x0, y1 - y0, z1 - z0
+            bx, by, bz = x2 - x1, y2 - y1, z2 - z1
+            nx, ny, nz = ay * bz - az * by, az * bx - ax * bz, ax * by - ay * bx
+            length = math.sqrt(nx * nx + ny * ny + nz * nz)
+            if use_angles:
+                # |a x b| is the same for each corner's pair of edges.
+                cx, cy, cz = x0 - x2, y0 - y2, z0 - z2
+                corner_weights.extend((math.atan2(length, -(cx * ax + cy * ay + cz * az)),
+                                       math.atan2(length, -(ax * bx + ay * by + az * bz)),
+                                       math.atan2(length, -(bx * cx + by * cy + bz * cz))))
+        else:
+            points = [positions[3 * v:3 * v + 3] for v in corner_vertices[start:start + size]]
+            nx = ny = nz = 0.0
+            for i in xrange(size):
+                x1, y1, z1 = points[i - 1]
+                x2, y2, z2 = points[i]
+                nx += (y1 - y2) * (z1 + z2)
+                ny += (z1 - z2) * (x1 + x2)
+                nz += (x1 - x2) * (y1 + y2)
+            length = math.sqrt(nx * nx + ny * ny + nz * nz)
+            if use_angles:
+                for i in xrange(size):
+                    x0, y0, z0 = points[i]
+                    x1, y1, z1 = points[i - 1]
+                    x2, y2, z2 = points[(i + 1) % size]
+                    cross = vector_cross(x1 - x0, y1 - y0, z1 - z0, x2 - x0, y2 - y0, z2 - z0)
+                    dot = (x1 - x0) * (x2 - x0) + (y1 - y0) * (y2 - y0) + (z1 - z0) * (z2 - z0)
+                    corner_weights.append(math.atan2(math.sqrt(vector_dot(cross, cross)), dot))
+        if length != 0.0:
+            face_normals[3 * polygon:3 * polygon + 3] = array.array('d', (-nx / length, -ny / length, -nz / length))
+        if not use_angles:
+            corner_weights.extend([0.5 * length] * size)
+        start += size
+    
+    # Cluster the corners that share a normal: those at the same position
+    # in the same smoothing group, or the corners of one flat polygon.
+    smoothing_statements = geometry.smoothing_statements
+    polygon_groups = [smoothing_statements[s] if s >= 0 else 1 for s in geometry.polygon_smoothing]
+    group_ids = {}
+    for group in polygon_groups:
+        group_ids.setdefault(group, len(group_ids))
+    group_count = len(group_ids)
+    polygon_keys = [-1 - polygon if group == 0 else group_ids[group] for polygon, group in enumerate(polygon_groups)]
+    cluster_ids = {}
+    corner_clusters = [cluster_ids.setdefault(key if key < 0 else v * group_count + key, len(cluster_ids))
+                       for key, v in itertools.izip((polygon_keys[p] for p in corner_polygons), corner_vertices)]
+    cluster_count = len(cluster_ids)
+    del cluster_ids
+    
+    def unit_normal(x, y, z, polygon):
+        length = math.sqrt(x * x + y * y + z * z)
+        if length == 0.0:
+            # Degenerate polygons, or opposite faces cancelling out.
+            x, y, z = face_normals[3 * polygon:3 * polygon + 3]
+            length = math.sqrt(x * x + y * y + z * z)
+            if length == 0.0:
+                return 0.0, 0.0, 1.0
+        # Rounding lets the faces of a flat surface share a normal despite
+        # rounding errors in the face normals.
+        return round(x / length, 9), round(y / length, 9), round(z / length, 9)
+    
+    normals = geometry.normals
+    normal_ids = {}
+    first_index = geometry.normal_count() + 1
+    
+    def normal_index(n):
+        index = normal_ids.get(n)
+        if index is None:
+            index = normal_ids[n] = len(normal_ids)
+            normals.extend(n)
+        return first_index + index
+    
+    if crease_angle is None:
+        # Every corner in a cluster gets the cluster's normal.
+        sums = array.array('d', [0.0]) * (3 * cluster_count)
+        cluster_polygons = array.array('i', [0]) * cluster_count
+        for cluster, polygon, w in itertools.izip(corner_clusters, corner_polygons, corner_weights):
+            i = 3 * cluster
+            p = 3 * polygon
+            sums[i] += w * face_normals[p]
+            sums[i + 1] += w * face_normals[p + 1]
+            sums[i + 2] += w * face_normals[p + 2]
+            cluster_polygons[cluster] = polygon
+        cluster_normals = [normal_index(unit_normal(sums[3 * k], sums[3 * k + 1], sums[3 * k + 2], cluster_polygons[k]))
+                           for k in xrange(cluster_count)]
+        generated = [cluster_normals[k] for k in corner_clusters]
+    else:
+        # Each corner only takes in the polygons of its cluster that are
+        # within the crease angle of its own. Corners of a cluster whose
+        # polygons face the same way get the same normal, so it is worked
+        # out once for each face normal in the cluster.
+        members = [[] for i in xrange(cluster_count)]
+        for c, cluster in enumerate(corner_clusters):
+            members[cluster].append(c)
+        min_cos = math.cos(math.radians(crease_angle))
+        generated = []
+        cluster_face_normals = {}
+        for c, cluster in enumerate(corner_clusters):
+            p = 3 * corner_polygons[c]
+            ox, oy, oz = face_normals[p:p + 3]
+            key = (cluster, ox, oy, oz)
+            index = cluster_face_normals.get(key)
+            if index is None:
+                x = y = z = 0.0
+                for m in members[cluster]:
+                    q = 3 * corner_polygons[m]
+                    nx, ny, nz = face_normals[q:q + 3]
+                    if ox * nx + oy * ny + oz * nz >= min_cos:
+                        w = corner_weights[m]
+                        x += w * nx
+                        y += w * ny
+                        z += w * nz
+                index = cluster_face_normals[key] = normal_index(unit_normal(x, y, z, corner_polygons[c]))
+            generated.append(index)
+    
+    missing = 0
+    for c in xrange(corner_count):
+        if corner_normals[c] == 0:
+            corner_normals[c] = generated[c]
+            missing += 1
+    return missing
+
+
+def triangulate_polygon(points):
+    """ triangulate_polygon
+        Split a polygon, given as a list of (x, y, z) corner positions, into
+        triangles by ear clipping. Returns a list of triples of indices into
+        points, wound the same way as the polygon.
+        
+        Convex polygons are fanned from the first corner, giving the same
+        triangles as plain fan triangulation, so only concave polygons are
+        affected. The polygon is projected onto the coordinate plane it is
+        closest to parallel to, using its Newell normal. If no ear can be
+        found, which happens with self-intersecting or degenerate polygons,
+        whatever is left is fanned.
+    """
+    count = len(points)
+    fan = [(0, i, i + 1) for i in xrange(1, count - 1)]
+    if count < 4:
+        return fan
+    
+    nx = ny = nz = 0.0
+    for i in xrange(count):
+        x1, y1, z1 = points[i - 1]
+        x2, y2, z2 = points[i]
+        nx += (y1 - y2) * (z1 + z2)
+        ny += (z1 - z2) * (x1 + x2)
+        nz += (x1 - x2) * (y1 + y2)
+    
+    # Drop the normal's largest component, choosing the remaining axes so
+    # that the polygon winds anticlockwise in the plane.
+    ax, ay, az = abs(nx), abs(ny), abs(nz)
+    if ax >= ay and ax >= az:
+        u, v, flip = 1, 2, nx < 0.0
+    elif ay >= az:
+        u, v, flip = 2, 0, ny < 0.0
+    else:
+        u, v, flip = 0, 1, nz < 0.0
+    if max(ax, ay, az) == 0.0:
+        return fan
+    xs = [p[u] for p in points]
+    if flip:
+        ys = [-p[v] for p in points]
+    else:
+        ys = [p[v] for p in points]
+    
+    def cross(a, b, c):
+        return (xs[b] - xs[a]) * (ys[c] - ys[a]) - (ys[b] - ys[a]) * (xs[c] - xs[a])
+    
+    # Negative indices wrap around, as the polygon does.
+    if all(cross(i - 2, i - 1, i) >= 0.0 for i in xrange(count)):
+        return fan
+    
+    # Only reflex corners can lie inside an ear, so only they are checked.
+    # Clipping an ear can make its neighbours convex, but never reflex.
+    reflex = set(i for i in xrange(count) if cross(i - 1, i, (i + 1) % count) <= 0.0)
+    
+    def is_ear(a, b, c):
+        if b in reflex:
+            return False
+        ax, ay = xs[a], ys[a]
+        bx, by = xs[b], ys[b]
+        cx, cy = xs[c], ys[c]
+        for p in reflex:
+            px, py = xs[p], ys[p]
+            if p == a or p == c or (px == ax and py == ay) or (px == bx and py == by) or (px == cx and py == cy):
+                continue
+            if ((bx - ax) * (py - ay) - (by - ay) * (px - ax) >= 0.0 and
+                    (cx - bx) * (py - by) - (cy - by) * (px - bx) >= 0.0 and
+                    (ax - cx) * (py - cy) - (ay - cy) * (px - cx) >= 0.0):
+                return False
+        return True
+    
+    remaining = range(count)
+    triangles = []
+    i = 0
+    failures = 0
+    while len(remaining) > 3:
+        n = len(remaining)
+        if failures >= n:
+            triangles.extend((remaining[0], remaining[k], remaining[k + 1]) for k in xrange(1, n - 1))
+            return triangles
+        i %= n
+        a, b, c = remaining[i - 1], remaining[i], remaining[(i + 1) % n]
+        if is_ear(a, b, c):
+            triangles.append((a, b, c))
+            del remaining[i]
+            failures = 0
+            n -= 1
+            i %= n
+            for j in (i - 1, i):
+                corner = remaining[j]
+                if corner in reflex and cross(remaining[j - 1], corner, remaining[(j + 1) % n]) > 0.0:
+                    reflex.discard(corner)
+        else:
+            i += 1
+            failures += 1
+    triangles.append(tuple(remaining))
+    return triangles
+
+
+material_library_cache = {}
+
+
+def parse_material_library(material_file_name):
+    """ parse_material_library
+        Returns the materials defined in an MTL file as a list of (material
+        name, diffuse map name) pairs in file order, with None for materials
+        without a diffuse map. The diffuse map is the first map_Kd following
+        the material's newmtl statement.
+        
+        Results are kept in material_library_cache for the lifetime of the
+        process, keyed by path and invalidated by changes to the file's
+        modification time or size, so a library shared by many models in one
+        run is only parsed once.
+    """
+    stat = os.stat(material_file_name)
+    cache_key = os.path.abspath(material_file_name)
+    cached = material_library_cache.get(cache_key)
+    if cached is not None and cached[0] == (stat.st_mtime, stat.st_size):
+        return cached[1]
+    
+    materials = []
+    material_file = open(material_file_name, 'r')
+    new_material = False
+    for material_line in read_lines(material_file):
+        material_tokens = string.split(material_line)
+        if material_tokens != []:
+            if material_tokens[0] == 'newmtl':
+                materials.append((material_tokens[1], None))
+                new_material = True
+            
+            if material_tokens[0] == 'map_Kd':
+                # If this is the first diffuse map for this material...
+                if new_material:
+                    materials[-1] = (materials[-1][0], material_tokens[1])
+                new_material = False
+    material_file.close()
+    
+    material_library_cache[cache_key] = ((stat.st_mtime, stat.st_size), materials)
+    return materials
+
+
+#
+# DAT
+#
+# read_dat() reads every section of a DAT file in one pass. Section headings
+# are found with a single regular expression search over the whole file, and
+# the numbers in each section are split into tokens a chunk of lines at a
+# time, with commas read as spaces and # and // comments removed, so that
+# both the comma-separated files of the older tools and the space-separated
+# files written by Obj2DatTexNorm.py are read. When a chunk holds nothing
+# but triangles, which is most files, its faces and texture coordinates are
+# converted with slices across the whole chunk instead of one face at a time.
+#
+DAT_CHUNK_SIZE = 1 << 18
+
+# Headings start lines. Searching for the line feed before them is several
+# times faster than a multi-line ^, which is tried at every character. Files
+# with old Mac CR-only line breaks are searched for the CR instead; a class
+# matching either is as slow as the multi-line ^, so the first line break
+# decides which is used.
+_DAT_HEADING_NAME = r'[ \t]*(NVERTS|NFACES|VERTEX|FACES|TEXTURES|NAMES|NORMALS|TANGENTS|END)(?=[ \t\r\n,]|$)'
+_DAT_FIRST_HEADING = re.compile(_DAT_HEADING_NAME)
+_DAT_HEADING = re.compile('\n' + _DAT_HEADING_NAME)
+_DAT_CR_HEADING = re.compile('\r' + _DAT_HEADING_NAME)
+_DAT_LINE_BREAK = re.compile('[\r\n]')
+_DAT_COMMENT = re.compile(r'(?:#|//)[^\r\n]*')
+_DAT_NAMES_COUNT = re.compile(r'[ \t,]*(\d+)')
+_DAT_NAME_LINE = re.compile(r'[ \t\r\n,]*([^\r\n]*)')
+
+
+class DATFile(object):
+    
+    """ DATFile
+        The contents of a DAT file as read by read_dat(). Faces are kept as
+        they are in the file rather than split into triangles.
+        
+        vertex_count        the NVERTS value
+        face_count          the NFACES value
+        positions           x, y, z for each vertex
+        face_colors         r, g, b for each face
+        face_normals        x, y, z for each face
+        face_sizes          the number of points of each face
+        face_points         the vertex indices of the points of every face,
+                            one face after another
+        texture_keys        the distinct material keys of the TEXTURES
+                            section, in order of first use
+        materials           the material name for each of texture_keys: the
+                            NAMES entry it indexes if there is a NAMES
+                            section, otherwise the key itself
+        texture_materials   index into texture_keys for each TEXTURES entry
+        texture_scales      s, t scale for each TEXTURES entry
+        texture_points      s, t for every point of every TEXTURES entry, as
+                            written (not divided by the scale); each entry
+                            has as many points as the face it belongs to
+        names               the NAMES entries
+        normals             x, y, z for each vertex, or empty
+        tangents            x, y, z for each vertex, or empty
+        sections            (heading, start, end) for each section in file
+                            order, where start is the offset of the heading
+                            and end the offset just past the section's last
+                            token, before any comment or blank lines
+    """
+    
+    __slots__ = ('vertex_count', 'face_count', 'positions', 'face_colors', 'face_normals', 'face_sizes',
+                 'face_points', 'texture_keys', 'materials', 'texture_materials', 'texture_scales',
+                 'texture_points', 'names', 'normals', 'tangents', 'sections')
+    
+    def __init__(self):
+        self.vertex_count = 0
+        self.face_count = 0
+        self.positions = array.array('d')
+        self.face_colors = array.array('d')
+        self.face_normals = array.array('d')
+        self.face_sizes = array.array('i')
+        self.face_points = array.array('i')
+        self.texture_keys = []
+        self.materials = []
+        self.texture_materials = array.array('i')
+        self.texture_scales = array.array('d')
+        self.texture_points = array.array('d')
+        self.names = []
+        self.normals = array.array('d')
+        self.tangents = array.array('d')
+        self.sections = []
+    
+    def all_triangles(self):
+        """ Tests whether every face is a triangle. """
+        return self.face_sizes.count(3) == len(self.face_sizes)
+
+
+def map_file(input_file):
+    """ map_file
+        Returns the contents of an open file as a read-only mmap, without
+        reading it into memory, or as a string if it can't be mapped (such as
+        an empty file or a pipe).
+    """
+    try:
+        return mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, ValueError, EnvironmentError):
+        return input_file.read()
+
+
+def dat_tokens(data, start, end):
+    """ dat_tokens
+        Generate lists of the tokens between offsets start and end, about
+        DAT_CHUNK_SIZE bytes at a time. Chunks end at line breaks, so tokens
+        and comments are never split between them.
+    """
+    while start < end:
+        stop = end
+        if start + DAT_CHUNK_SIZE < end:
+            match = _DAT_LINE_BREAK.search(data, start + DAT_CHUNK_SIZE, end)
+            if match is not None:
+                stop = match.end()
+        text = data[start:stop]
+        if '#' in text or '//' in text:
+            text = _DAT_COMMENT.sub('', text)
+        yield text.replace(',', ' ').split()
+        start = stop
+
+
+def _dat_content_end(data, start, end):
+    """ _dat_content_end
+        Returns the offset just past the last token between start and end,
+        skipping back over whitespace, comments and blank lines, or start if
+        there is none.
+    """
+    while end > start:
+        line_start = max(data.rfind('\n', start, end) + 1, start)
+        line_start = data.rfind('\r', line_start, end) + 1 or line_start
+        line = data[line_start:end]
+        if '#' in line or '//' in line:
+            line = _DAT_COMMENT.sub('', line)
+        line = line.rstrip()
+        if line:
+            return line_start + len(line)
+        end = line_start - 1
+    return start
+
+
+def _interleave(tokens, stride, first, width):
+    """ _interleave
+        Returns width consecutive tokens starting at first out of every
+        stride tokens, such as the three vertices of each ten-token face.
+    """
+    values = [None] * (len(tokens) // stride * width)
+    for i in xrange(width):
+        values[i::width] = tokens[first + i::stride]
+    return values
+
+
+def _read_dat_faces(dat, data, start, end):
+    colors = dat.face_colors
+    normals = dat.face_normals
+    sizes = dat.face_sizes
+    points = dat.face_points
+    pending = []
+    for tokens in dat_tokens(data, start, end):
+        if pending:
+            tokens = pending + tokens
+        count = len(tokens)
+        if count % 10 == 0 and tokens[6::10].count('3') == count // 10:
+            # Only triangles: colour, normal, 3, then three vertices.
+            colors.fromlist(map(float, _interleave(tokens, 10, 0, 3)))
+            normals.fromlist(map(float, _interleave(tokens, 10, 3, 3)))
+            sizes.fromlist([3] * (count // 10))
+            points.fromlist(map(int, _interleave(tokens, 10, 7, 3)))
+            pending = []
+            continue
+        
+        i = 0
+        while i + 7 <= count:
+            size = int(tokens[i + 6])
+            if i + 7 + size > count:
+                break
+            colors.fromlist(map(float, tokens[i:i + 3]))
+            normals.fromlist(map(float, tokens[i + 3:i + 6]))
+            sizes.append(size)
+            points.fromlist(map(int, tokens[i + 7:i + 7 + size]))
+            i += 7 + size
+        pending = tokens[i:]
+
+
+def _read_dat_textures(dat, data, start, end):
+    key_indices = {}
+    keys = dat.texture_keys
+    materials = dat.texture_materials
+    scales = dat.texture_scales
+    points = dat.texture_points
+    face_sizes = dat.face_sizes
+    
+    def add_keys(new_keys):
+        for key in new_keys:
+            if key not in key_indices:
+                key_indices[key] = len(keys)
+                keys.append(key)
+    
+    pending = []
+    for tokens in dat_tokens(data, start, end):
+        if pending:
+            tokens = pending + tokens
+        count = len(tokens)
+        entry = len(materials)
+        sizes = face_sizes[entry:entry + count // 9]
+        if count % 9 == 0 and sizes.count(3) == len(sizes):
+            # Only triangles (or entries beyond the faces, which are taken to
+            # be triangles): key, scale, then three points.
+            entry_keys = tokens[0::9]
+            if not key_indices.viewkeys() >= set(entry_keys):
+                add_keys(entry_keys)
+            materials.fromlist(map(key_indices.__getitem__, entry_keys))
+            scales.fromlist(map(float, _interleave(tokens, 9, 1, 2)))
+            points.fromlist(map(float, _interleave(tokens, 9, 3, 6)))
+            pending = []
+            continue
+        
+        i = 0
+        while True:
+            size = face_sizes[entry] if entry < len(face_sizes) else 3
+            if i + 3 + 2 * size > count:
+                break
+            add_keys(tokens[i:i + 1])
+            materials.append(key_indices[tokens[i]])
+            scales.fromlist(map(float, tokens[i + 1:i + 3]))
+            points.fromlist(map(float, tokens[i + 3:i + 3 + 2 * size]))
+            i += 3 + 2 * size
+            entry += 1
+        pending = tokens[i:]
+
+
+def _read_dat_names(dat, data, start):
+    """ _read_dat_names
+        Read the NAMES section whose count starts at start, followed by one
+        name to a line. Returns the offset just past the last name, which may
+        be beyond the next heading found, since a name can look like one.
+    """
+    match = _DAT_NAMES_COUNT.match(data, start)
+    if match is None:
+        return start
+    count = int(match.group(1))
+    offset = match.end()
+    while len(dat.names) < count and offset < len(data):
+        match = _DAT_NAME_LINE.match(data, offset)
+        name = match.group(1)
+        if '#' in name or '//' in name:
+            name = _DAT_COMMENT.sub('', name)
+        name = name.rstrip()
+        if name:
+            dat.names.append(name)
+            offset = match.start(1) + len(name)
+        else:
+            offset = match.end()
+    return offset
+
+
+def read_dat(data, only=None):
+    """ read_dat
+        Read a DAT file from data, a string or an mmap of the file, and
+        return its contents as a DATFile. Unknown sections are skipped. If
+        only is a collection of headings, such as ('NVERTS', 'NFACES',
+        'VERTEX'), the other sections are listed in sections but not read.
+    """
+    dat = DATFile()
+    heading_pattern = _DAT_HEADING
+    line_break = _DAT_LINE_BREAK.search(data)
+    if line_break is not None and line_break.group() == '\r' and \
+            data[line_break.end():line_break.end() + 1] != '\n':
+        heading_pattern = _DAT_CR_HEADING
+    matches = heading_pattern.finditer(data)
+    first_match = _DAT_FIRST_HEADING.match(data)
+    if first_match is not None:
+        matches = itertools.chain([first_match], matches)
+    headings = [(match.group(1), match.start(1), match.end(1)) for match in matches]
+    skip_to = 0
+    for i, (heading, start, body_start) in enumerate(headings):
+        if start < skip_to:
+            # Inside the NAMES section.
+            continue
+        body_end = len(data)
+        for next_heading, next_start, next_body_start in headings[i + 1:]:
+            if next_start >= skip_to:
+                body_end = next_start
+                break
+        
+        if only is not None and heading not in only and heading != 'NAMES':
+            # NAMES is read regardless, since that is the only way to find
+            # where it ends.
+            pass
+        elif heading == 'NVERTS' or heading == 'NFACES':
+            for tokens in dat_tokens(data, body_start, body_end):
+                if tokens:
+                    if heading == 'NVERTS':
+                        dat.vertex_count = int(tokens[0])
+                    else:
+                        dat.face_count = int(tokens[0])
+                    break
+        elif heading == 'VERTEX' or heading == 'NORMALS' or heading == 'TANGENTS':
+            values = {'VERTEX': dat.positions, 'NORMALS': dat.normals, 'TANGENTS': dat.tangents}[heading]
+            for tokens in dat_tokens(data, body_start, body_end):
+                values.fromlist(map(float, tokens))
+            del values[len(values) - len(values) % 3:]
+        elif heading == 'FACES':
+            _read_dat_faces(dat, data, body_start, body_end)
+        elif heading == 'TEXTURES':
+            _read_dat_textures(dat, data, body_start, body_end)
+        elif heading == 'NAMES':
+            skip_to = _read_dat_names(dat, data, body_start)
+            dat.sections.append((heading, start, skip_to))
+            continue
+        dat.sections.append((heading, start, _dat_content_end(data, body_start, body_end)))
+    
+    # Numeric keys index NAMES, where there is one.
+    for key in dat.texture_keys:
+        if dat.names and key.isdigit() and int(key) < len(dat.names):
+            dat.materials.append(dat.names[int(key)])
+        else:
+            dat.materials.append(key)
+    return dat
+
+
+def parse_dat(data):
+    """ parse_dat
+        Read a DAT file from data, a string or an mmap of the file, with
+        read_dat() and return it as a Mesh. Positions, face normals, vertex
+        normals and tangents are stored as read.
+        
+        Faces with more than three points are split into a fan of triangles
+        (v0 v1 v2) (v0 v2 v3) ... and their TEXTURES points likewise.
+        Texture coordinates are divided by the scale given for each face, and
+        materials are named by NAMES where the TEXTURES section refers to
+        them by number. If the TEXTURES section is missing or does not cover
+        every face, the mesh has no texture coordinates and no materials.
+    """
+    dat = read_dat(data)
+    mesh = Mesh()
+    mesh.positions = dat.positions
+    mesh.normals = dat.normals
+    mesh.tangents = dat.tangents
+    face_count = len(dat.face_sizes)
+    textured = len(dat.texture_materials) >= face_count
+    
+    # Texture coordinates divided by the scale of their face.
+    uvs = dat.texture_points
+    if textured and dat.texture_scales.count(1.0) != len(dat.texture_scales):
+        point_scales = array.array('d')
+        for face, size in enumerate(dat.face_sizes):
+            point_scales.fromlist(dat.texture_scales[2 * face:2 * face + 2].tolist() * size)
+        uvs = array.array('d', [value / scale for value, scale in itertools.izip(uvs, point_scales)])
+    
+    # Materials are numbered in order of first use, by name.
+    material_for_key = [mesh.material_index(name) for name in dat.materials]
+    texture_materials = array.array('i', [material_for_key[key] for key in dat.texture_materials[:face_count]])
+    
+    if dat.all_triangles():
+        mesh.triangles = dat.face_points
+        mesh.face_normals = dat.face_normals
+        if textured:
+            mesh.uvs = uvs[:6 * face_count]
+            mesh.face_materials = texture_materials
+    else:
+        triangles = mesh.triangles
+        face_normals = mesh.face_normals
+        face_points = dat.face_points
+        first = 0
+        for face, size in enumerate(dat.face_sizes):
+            points = face_points[first:first + size]
+            normal = dat.face_normals[3 * face:3 * face + 3]
+            for i in xrange(1, size - 1):
+                triangles.extend((points[0], points[i], points[i + 1]))
+                face_normals.extend(normal)
+            if textured:
+                points = uvs[2 * first:2 * first + 2 * size]
+                for i in xrange(1, size - 1):
+                    mesh.uvs.extend((points[0], points[1], points[2 * i], points[2 * i + 1], points[2 * i + 2], points[2 * i + 3]))
+                    mesh.face_materials.append(texture_materials[face])
+            first += size
+    
+    if not textured:
+        del mesh.materials[:]
+        mesh.face_materials.extend([-1] * mesh.face_count())
+    
+    return mesh
+
+
+def write_dat(mesh, output_file, texture_scale=1.0, vertex_text=None):
+    """ write_dat
+        Write a mesh as a DAT file with comma-separated entries. Faces are
+        flat grey (127,127,127) with the mesh's face normals. A TEXTURES
+        section is written if the mesh has texture coordinates, scaled by
+        texture_scale, using the material names as texture names.
+        
+        Vertices are written from vertex_text, the x, y and z text of each
+        vertex as collected by parse_meshwork(), if it is given, and
+        otherwise with repr() so that they read back exactly.
+    """
+    output_file.write('NVERTS %d\n' % mesh.vertex_count())
+    output_file.write('NFACES %d\n' % mesh.face_count())
+    output_file.write('\n')
+    output_file.write('VERTEX\n')
+    if vertex_text is not None:
+        for xyz in vertex_text:
+            output_file.write('%s, %s, %s\n' % xyz)
+    else:
+        for i in xrange(mesh.vertex_count()):
+            output_file.write('%r, %r, %r\n' % mesh.position(i))
+    output_file.write('\n')
+    output_file.write('FACES\n')
+    for i in xrange(mesh.face_count()):
+        output_file.write('127,127,127,\t%f,%f,%f,\t3,\t%d,%d,%d\n' % (mesh.face_normal(i) + mesh.triangle(i)))
+    output_file.write('\n')
+    if len(mesh.uvs) != 0:
+        output_file.write('TEXTURES\n')
+        for i in xrange(mesh.face_count()):
+            uv1, uv2, uv3 = mesh.face_uvs(i)
+            output_file.write('%s\t%s %s\t%f %f\t%f %f\t%f %f\n' % (mesh.materials[mesh.face_materials[i]], texture_scale, texture_scale, texture_scale * uv1[0], texture_scale * uv1[1], texture_scale * uv2[0], texture_scale * uv2[1], texture_scale * uv3[0], texture_scale * uv3[1]))
+        output_file.write('\n')
+    output_file.write('END\n')
+
+
+#
+# Meshwork
+#
+MESHWORK_MATERIAL_LINES = [
+    'MATERIAL\t65535\t65535\t65535\t0\t0\t0\r',
+    'MATERIAL\t0\t0\t65535\t0\t0\t0\r',
+    'MATERIAL\t0\t65535\t0\t0\t0\t0\r',
+    'MATERIAL\t0\t65535\t65535\t0\t0\t0\r',
+    'MATERIAL\t65535\t0\t0\t0\t0\t0\r',
+    'MATERIAL\t65535\t0\t65535\t0\t0\t0\r',
+    'MATERIAL\t65535\t65535\t0\t0\t0\t0\r',
+    'MATERIAL\t32768\t32768\t32768\t0\t0\t0\r'
+]
+
+
+def parse_meshwork(lines, vertex_text=None):
+    """ parse_meshwork
+        Read the vertices, triangles and texture coordinates from an iterable
+        of Meshwork .mesh lines and return them as a Mesh. If vertex_text is
+        a list, the x, y and z of each vertex are also appended to it as
+        written in the file, for writers that copy them unchanged.
+        
+        Each textured MATERIAL statement (type 4, with a texture name) adds
+        an entry to materials and material_uvs, even if the same texture was
+        named before; the UVS entries that follow it are stored as read. Faces
+        of untextured materials have material -1. No per-corner texture
+        coordinates are produced, since Meshwork only stores them per vertex.
+    """
+    mesh = Mesh()
+    positions = mesh.positions
+    triangles = mesh.triangles
+    face_materials = mesh.face_materials
+    mode = 'SKIP'
+    material = -1
+    
+    for line in lines:
+        if mode == 'VERTEX':
+            coordinates = line.split('\t')
+            if len(coordinates) == 4:
+                positions.extend((float(coordinates[1]), float(coordinates[2]), float(coordinates[3])))
+                if vertex_text is not None:
+                    vertex_text.append((coordinates[1], coordinates[2], coordinates[3]))
+        
+        elif mode == 'FACES':
+            tokens = line.split('\t')
+            if len(tokens) == 3:
+                triangles.extend((int(tokens[0]), int(tokens[1]), int(tokens[2])))
+                face_materials.append(material)
+        
+        elif mode == 'TEXTURE':
+            tokens = line.split('\t')
+            if len(tokens) == 3:
+                vertices, uvs = mesh.material_uvs[material]
+                vertices.append(int(tokens[0]))
+                uvs.extend((float(tokens[1]), float(tokens[2])))
+        
+        if line[:8] == 'VERTICES':
+            mode = 'VERTEX'
+        if line[:8] == 'MATERIAL':
+            mode = 'FACES'
+            material = -1
+            tokens = line.split('\t')
+            if len(tokens) == 15 and tokens[5] == '4':
+                name_parts = tokens[0].split(' ')
+                name_parts.append('texture0.png')
+                mesh.materials.append(name_parts[1])
+                mesh.material_uvs.append((array.array('i'), array.array('d')))
+                material = len(mesh.materials) - 1
+        if line[:5] == 'EDGES':
+            mode = 'SKIP'
+        if line[:3] == 'UVS':
+            if material != -1:
+                mode = 'TEXTURE'
+            else:
+                mode = 'SKIP'
+    
+    return mesh
+
+
+class VertexIndex(object):
+    
+    """ VertexIndex
+        Finds the entries for given vertices in a list of vertex indices, such
+        as the vertices of one of a Meshwork mesh's material_uvs. Only the
+        vertices that appear in the list are stored, as two sorted arrays, so
+        a material's index takes 8 bytes for each distinct vertex it uses
+        rather than a slot for every vertex in the mesh.
+        
+        index[v] is the position of the last entry for vertex v, matching a
+        table filled in file order; a vertex without an entry raises KeyError.
+    """
+    
+    __slots__ = ('vertices', 'entries')
+    
+    def __init__(self, vertices):
+        # Sort the entries by vertex, with later entries first among equals.
+        order = sorted(range(len(vertices)), key=lambda i: (vertices[i], -i))
+        self.vertices = array.array('i')
+        self.entries = array.array('i')
+        previous = None
+        for i in order:
+            if vertices[i] != previous:
+                previous = vertices[i]
+                self.vertices.append(previous)
+                self.entries.append(i)
+    
+    def __len__(self):
+        return len(self.vertices)
+    
+    def __contains__(self, vertex):
+        i = bisect.bisect_left(self.vertices, vertex)
+        return i < len(self.vertices) and self.vertices[i] == vertex
+    
+    def __getitem__(self, vertex):
+        i = bisect.bisect_left(self.vertices, vertex)
+        if i == len(self.vertices) or self.vertices[i] != vertex:
+            raise KeyError(vertex)
+        return self.entries[i]
+    
+    def items(self):
+        """ Returns (vertex, entry) pairs in vertex order. """
+        return zip(self.vertices, self.entries)
+
+
+def write_meshwork(mesh, output_file, edges):
+    """ write_meshwork
+        Write a mesh as a Meshwork .mesh file, with the given edges (a sorted
+        sequence of vertex index pairs). All triangles use the first, white
+        material; the rest of Meshwork's default palette follows.
+    """
+    output_file.write('Mesh\t1\t1\r')
+    output_file.write('VERTICES\r')
+    for i in xrange(mesh.vertex_count()):
+        output_file.write('%d\t%f\t%f\t%f\r' % ((i,) + mesh.position(i)))
+    output_file.write('EDGES\r')
+    for edge in edges:
+        output_file.write('%d\t%d\r' % edge)
+    output_file.write(MESHWORK_MATERIAL_LINES[0])
+    for i in xrange(mesh.face_count()):
+        output_file.write('%d\t%d\t%d\r' % mesh.triangle(i))
+    output_file.writelines(MESHWORK_MATERIAL_LINES[1:])
+    output_file.write('END\r')
+
+
+#
+# Profiling
+#
+# With --profile FILE, each converter records the wall time, CPU time and
+# peak memory of the phases of each conversion and appends them to FILE as
+# one JSON object per line (per input file). Peak memory is the process's
+# resident set size high-water mark at the end of the phase, so the phase in
+# which it rises is the one that allocated it. --cprofile additionally runs
+# the hot phases under cProfile and saves the statistics next to the input
+# as <input>.prof, for reading with the pstats module.
+#
+def peak_rss():
+    """ peak_rss
+        Returns the peak resident set size of this process in bytes, or None
+        if it can't be determined.
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss is in bytes on OS X and kilobytes elsewhere.
+    if sys.platform == 'darwin':
+        return usage.ru_maxrss
+    return usage.ru_maxrss * 1024
+
+
+def cpu_time():
+    """ cpu_time
+        Returns the user and system CPU time used by this process so far.
+    """
+    times = os.times()
+    return times[0] + times[1]
+
+
+class PhaseProfiler(object):
+    
+    """ PhaseProfiler
+        Times the phases of one conversion. begin(name) ends the current
+        phase, if any, and starts the next; end() ends the current one. phase()
+        is a context manager for a phase that occurs inside another, such as
+        reading a material library while parsing; its time is also counted in
+        the enclosing phase. A phase entered more than once accumulates.
+        
+        A disabled profiler does nothing, so conversions can be written to
+        use one unconditionally.
+    """
+    
+    def __init__(self, converter, input_file_name, enabled=True, cprofile=False):
+        self.enabled = enabled
+        self.converter = converter
+        self.input_file_name = input_file_name
+        self.__phases = []
+        self.__phase_for_name = {}
+        self.__current = None
+        self.__start_wall = time.time()
+        self.__start_cpu = cpu_time()
+        self.__profile = cProfile.Profile() if enabled and cprofile else None
+        self.__hot_depth = 0
+    
+    def __start(self, name, hot):
+        if hot and self.__profile is not None:
+            if self.__hot_depth == 0:
+                self.__profile.enable()
+            self.__hot_depth += 1
+        return name, hot, time.time(), cpu_time()
+    
+    def __stop(self, started):
+        name, hot, wall, cpu = started
+        wall = time.time() - wall
+        cpu = cpu_time() - cpu
+        if hot and self.__profile is not None:
+            self.__hot_depth -= 1
+            if self.__hot_depth == 0:
+                self.__profile.disable()
+        
+        record = self.__phase_for_name.get(name)
+        if record is None:
+            record = {'name': name, 'wall_time': 0.0, 'cpu_time': 0.0, 'count': 0}
+            self.__phase_for_name[name] = record
+            self.__phases.append(record)
+        record['wall_time'] += wall
+        record['cpu_time'] += cpu
+        record['count'] += 1
+        record['peak_rss'] = peak_rss()
+    
+    def begin(self, name, hot=False):
+        """ End the current phase and start the named one. Hot phases are run
+            under cProfile if it is in use.
+        """
+        if not self.enabled:
+            return
+        self.end()
+        self.__current = self.__start(name, hot)
+    
+    def end(self):
+        """ End the current phase. """
+        if self.__current is not None:
+            self.__stop(self.__current)
+            self.__current = None
+    
+    @contextlib.contextmanager
+    def phase(self, name, hot=False):
+        """ Time the body of a with statement as the named phase. """
+        if not self.enabled:
+            yield
+            return
+        started = self.__start(name, hot)
+        try:
+            yield
+        finally:
+            self.__stop(started)
+    
+    def finish(self, profile_file_name=None):
+        """ finish
+            End the current phase and return the record for the conversion
+            (None if disabled), saving the cProfile statistics if in use. If
+            profile_file_name is given, the record is also appended to it.
+        """
+        if not self.enabled:
+            return None
+        self.end()
+        record = {
+            'converter': self.converter,
+            'input': self.input_file_name,
+            'python': platform.python_version(),
+            'wall_time': time.time() - self.__start_wall,
+            'cpu_time': cpu_time() - self.__start_cpu,
+            'peak_rss': peak_rss(),
+            'phases': self.__phases,
+            'cprofile': None
+        }
+        if self.__profile is not None:
+            record['cprofile'] = self.input_file_name + '.prof'
+            self.__profile.dump_stats(record['cprofile'])
+        if profile_file_name is not None:
+            append_profile_record(profile_file_name, record)
+        return record
+
+
+def append_profile_record(profile_file_name, record):
+    """ append_profile_record
+        Append a record from PhaseProfiler.finish() to a profile file as one
+        line of JSON.
+    """
+    with open(profile_file_name, 'a') as profile_file:
+        profile_file.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+def take_profile_options(args):
+    """ take_profile_options
+        For scripts that take a plain list of file names, remove --profile FILE
+        and --cprofile from a list of command line arguments. Returns the
+        profile file name (None if not profiling), whether to use cProfile,
+        and the remaining arguments.
+    """
+    profile_file_name = None
+    cprofile = False
+    remaining = []
+    args = iter(args)
+    for arg in args:
+        if arg == '--profile':
+            profile_file_name = next(args, None)
+            if profile_file_name is None:
+                raise SystemExit('--profile requires a file name')
+        elif arg.startswith('--profile='):
+            profile_file_name = arg[len('--profile='):]
+        elif arg == '--cprofile':
+            cprofile = True
+        else:
+            remaining.append(arg)
+    return profile_file_name, cprofile, remaining
@@ -0,0 +1,118 @@
+"""
+Tests for converting several files in one run of Obj2DatTexNorm.py.
+
+Run with: python -m unittest discover tests
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Obj2DatTexNorm.py')
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# A face using a vertex that doesn't exist makes the conversion fail.
+BROKEN_OBJ = """v 0 0 0
+v 1 0 0
+v 0 1 0
+vn 0 0 1
+f 1//1 2//1 9//1
+"""
+
+
+def without_stack_frames(output):
+    return [line for line in output.splitlines() if not line.startswith('  File "') and not line.startswith('    ')]
+
+
+class BatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(DATA_DIRECTORY, 'box.obj'), 'rb') as box_file:
+            box = box_file.read()
+        shutil.copy(os.path.join(DATA_DIRECTORY, 'box.mtl'), self.directory)
+        for name, text in (('first.obj', box), ('broken.obj', BROKEN_OBJ), ('last.obj', box)):
+            with open(os.path.join(self.directory, name), 'wb') as obj_file:
+                obj_file.write(text)
+        self.file_names = ['first.obj', 'broken.obj', 'last.obj']
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def run_converter(self, *arguments):
+        """ Returns the exit status and console output of a run. Output names
+            are lower-cased, so the files are named relative to the
+            directory.
+        """
+        process = subprocess.Popen([sys.executable, SCRIPT] + list(arguments), cwd=self.directory,
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output = process.communicate()[0]
+        return process.returncode, output
+    
+    def read_output(self, name):
+        with open(os.path.join(self.directory, name), 'rb') as output_file:
+            return output_file.read()
+    
+    def check_failure_reported(self, status, output):
+        self.assertEqual(status, 1)
+        self.assertIn('IndexError', output)
+        self.assertTrue(output.endswith('\nFailed to convert 1 of 3 files:\n  broken.obj\n'))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'broken.dat')))
+        # The files after the broken one are still converted.
+        with open(os.path.join(DATA_DIRECTORY, 'box-expected.dat'), 'rb') as expected_file:
+            expected = expected_file.read().replace('"box.obj"', '"%s"')
+        self.assertEqual(self.read_output('first.dat'), expected % 'first.obj')
+        self.assertEqual(self.read_output('last.dat'), expected % 'last.obj')
+
+
+class JobsTest(BatchTestCase):
+    def test_failure_reported_in_order(self):
+        status, output = self.run_converter('-j', '2', *self.file_names)
+        self.check_failure_reported(status, output)
+        # Each file's messages are printed together, in the order given.
+        positions = [output.index('%s -> ' % name) for name in self.file_names]
+        self.assertEqual(positions, sorted(positions))
+        self.assertLess(output.index('IndexError'), positions[2])
+    
+    def test_same_output_as_serial_run(self):
+        serial_status, serial_output = self.run_converter(*self.file_names)
+        status, output = self.run_converter('--jobs=3', *self.file_names)
+        self.assertEqual(status, serial_status)
+        # Apart from the stack frames in the traceback.
+        self.assertEqual(without_stack_frames(output), without_stack_frames(serial_output))
+
+
+class PipelineTest(BatchTestCase):
+    def test_failure_reported(self):
+        status, output = self.run_converter('--pipeline', *self.file_names)
+        self.check_failure_reported(status, output)
+        serial_status, serial_output = self.run_converter(*self.file_names)
+        self.assertEqual(without_stack_frames(output), without_stack_frames(serial_output))
+    
+    def test_missing_input_reported(self):
+        status, output = self.run_converter('--pipeline', 'first.obj', 'missing.obj')
+        self.assertEqual(status, 1)
+        self.assertIn("IOError: [Errno 2] No such file or directory: 'missing.obj'", output)
+        self.assertTrue(output.endswith('\nFailed to convert 1 of 2 files:\n  missing.obj\n'))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'first.dat')))
+    
+    def test_write_failure_reported_at_end(self):
+        # A directory in the way of an output file can't be written over.
+        os.mkdir(os.path.join(self.directory, 'first.dat'))
+        status, output = self.run_converter('--pipeline', 'first.obj', 'last.obj')
+        self.assertEqual(status, 1)
+        self.assertIn('\nlast.obj -> last.dat\n', output)
+        failure = output.index('\nFailed to write the output of first.obj:\n')
+        self.assertGreater(failure, output.index('last.obj -> last.dat'))
+        self.assertIn('IOError', output[failure:])
+        self.assertTrue(output.endswith('\nFailed to convert 1 of 2 files:\n  first.obj\n'))
+        self.assertTrue(os.path.isdir(os.path.join(self.directory, 'first.dat')))
+        with open(os.path.join(DATA_DIRECTORY, 'box-expected.dat'), 'rb') as expected_file:
+            self.assertEqual(self.read_output('last.dat'), expected_file.read().replace('"box.obj"', '"last.obj"'))
+
+
+if __name__ == '__main__':
+    unittest.main()
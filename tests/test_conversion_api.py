@@ -0,0 +1,113 @@
+"""
+Tests for the conversion API of Obj2DatTexNorm.py: make_options(),
+convert_obj_to_dat() and convert_obj_string_to_dat().
+
+Run with: python -m unittest discover tests
+"""
+
+import os
+import shutil
+import StringIO
+import subprocess
+import sys
+import tempfile
+import unittest
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_DIRECTORY)
+from Obj2DatTexNorm import make_options, convert_obj_to_dat, convert_obj_string_to_dat
+
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+BOX_FILE_NAME = os.path.join(DATA_DIRECTORY, 'box.obj')
+
+
+def read_data_file(name):
+    with open(os.path.join(DATA_DIRECTORY, name), 'rb') as data_file:
+        return data_file.read()
+
+
+class MakeOptionsTest(unittest.TestCase):
+    def test_command_line_defaults(self):
+        saved_argv = sys.argv
+        sys.argv = ['Obj2DatTexNorm.py', '--no-such-option']
+        try:
+            options = make_options()
+        finally:
+            sys.argv = saved_argv
+        self.assertEqual(options.files, [])
+        self.assertEqual(options.winding_mode, 2)
+        self.assertTrue(options.rename_materials)
+        self.assertFalse(options.pretty_output)
+        self.assertEqual(options.lod, [])
+        self.assertEqual(options.jobs, 1)
+    
+    def test_overrides(self):
+        options = make_options(winding_mode=0, pretty_output=True)
+        self.assertEqual((options.winding_mode, options.pretty_output), (0, True))
+        # Each call gets its own options.
+        self.assertEqual(make_options().winding_mode, 2)
+    
+    def test_unknown_option(self):
+        self.assertRaises(TypeError, make_options, no_such_option=True)
+    
+    def test_import_has_no_side_effects(self):
+        # Importing the module must neither parse nor reject the importing
+        # program's arguments.
+        code = 'import sys; sys.argv = ["tool", "--no-such-option"]; import Obj2DatTexNorm'
+        process = subprocess.Popen([sys.executable, '-c', code], cwd=REPOSITORY_DIRECTORY,
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.assertEqual(process.communicate()[0], '')
+        self.assertEqual(process.returncode, 0)
+
+
+class ConvertObjToDatTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def test_file_name_to_string(self):
+        # The name and material directory come from the input file name.
+        self.assertEqual(convert_obj_to_dat(BOX_FILE_NAME), read_data_file('box-expected.dat'))
+    
+    def test_file_objects(self):
+        output = StringIO.StringIO()
+        with open(BOX_FILE_NAME, 'rb') as input_file:
+            self.assertEqual(convert_obj_to_dat(input_file, output, make_options(pretty_output=True)), None)
+        self.assertEqual(output.getvalue(), read_data_file('box-pretty-expected.dat'))
+    
+    def test_output_file_name(self):
+        output_file_name = os.path.join(self.directory, 'converted.dat')
+        convert_obj_to_dat(BOX_FILE_NAME, output_file_name)
+        with open(output_file_name, 'rb') as output_file:
+            self.assertEqual(output_file.read(), read_data_file('box-expected.dat'))
+    
+    def test_string(self):
+        dat = convert_obj_string_to_dat(read_data_file('box.obj'), name='box.obj', material_directory=DATA_DIRECTORY)
+        self.assertEqual(dat, read_data_file('box-expected.dat'))
+    
+    def test_log(self):
+        messages = []
+        saved_stdout = sys.stdout
+        sys.stdout = captured_output = StringIO.StringIO()
+        try:
+            convert_obj_to_dat(BOX_FILE_NAME)
+            convert_obj_to_dat(BOX_FILE_NAME, log=messages.append)
+        finally:
+            sys.stdout = saved_stdout
+        # Nothing is printed; messages only go to the log given.
+        self.assertEqual(captured_output.getvalue(), '')
+        self.assertEqual(messages, ['  Material library file: %s' % os.path.join(DATA_DIRECTORY, 'box.mtl'),
+                                    '  Material side -> box-side.png',
+                                    '  Material top -> box-top.png'])
+    
+    def test_invalid_arguments(self):
+        self.assertRaises(ValueError, convert_obj_to_dat, BOX_FILE_NAME, None, make_options(winding_mode=4))
+        # Levels of detail need somewhere to go.
+        self.assertRaises(ValueError, convert_obj_to_dat, BOX_FILE_NAME, None, make_options(lod=[0.5]))
+
+
+if __name__ == '__main__':
+    unittest.main()
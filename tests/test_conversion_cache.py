@@ -0,0 +1,123 @@
+"""
+Tests for the conversion cache of Obj2DatTexNorm.py (--cache-dir).
+
+Run with: python -m unittest discover tests
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_DIRECTORY)
+from Obj2DatTexNorm import make_options, conversion_cache_key, fetch_cached_conversion, store_cached_conversion
+
+
+SCRIPT = os.path.join(REPOSITORY_DIRECTORY, 'Obj2DatTexNorm.py')
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+class CacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.directory, 'cache')
+        for file_name in ('box.obj', 'box.mtl'):
+            shutil.copy(os.path.join(DATA_DIRECTORY, file_name), self.directory)
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def path(self, name):
+        return os.path.join(self.directory, name)
+    
+    def read_file(self, name):
+        with open(self.path(name), 'rb') as input_file:
+            return input_file.read()
+    
+    def write_file(self, name, text):
+        with open(self.path(name), 'wb') as output_file:
+            output_file.write(text)
+
+
+class CacheKeyTest(CacheTestCase):
+    def test_key_inputs(self):
+        options = make_options()
+        key = conversion_cache_key(self.path('box.obj'), options)
+        self.assertEqual(conversion_cache_key(self.path('box.obj'), make_options()), key)
+        self.assertEqual(conversion_cache_key(self.path('box.obj'), options, self.read_file('box.obj')), key)
+        # Options that don't change the output don't change the key.
+        self.assertEqual(conversion_cache_key(self.path('box.obj'), make_options(jobs=4, pipeline=True)), key)
+        self.assertNotEqual(conversion_cache_key(self.path('box.obj'), make_options(pretty_output=True)), key)
+        
+        self.write_file('box.mtl', self.read_file('box.mtl').replace('box-top.png', 'box-lid.png'))
+        self.assertNotEqual(conversion_cache_key(self.path('box.obj'), options), key)
+        os.remove(self.path('box.mtl'))
+        self.assertNotEqual(conversion_cache_key(self.path('box.obj'), options), key)
+
+
+class CachedConversionTest(CacheTestCase):
+    def run_converter(self):
+        # Output names are lower-cased, so the file is named relative to the
+        # directory.
+        process = subprocess.Popen([sys.executable, SCRIPT, '--cache-dir', self.cache_dir, 'box.obj'],
+                                   cwd=self.directory, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output = process.communicate()[0]
+        self.assertEqual(process.returncode, 0)
+        return output, self.read_file('box.dat')
+    
+    def test_hit_and_miss(self):
+        output, dat = self.run_converter()
+        self.assertNotIn('copied from cache', output)
+        with open(os.path.join(DATA_DIRECTORY, 'box-expected.dat'), 'rb') as expected_file:
+            self.assertEqual(dat, expected_file.read())
+        
+        os.remove(self.path('box.dat'))
+        output, cached_dat = self.run_converter()
+        self.assertIn('Unchanged, copied from cache', output)
+        self.assertEqual(cached_dat, dat)
+        
+        # Changing the material library is a miss, and the new result is used.
+        self.write_file('box.mtl', self.read_file('box.mtl').replace('box-top.png', 'box-lid.png'))
+        output, changed_dat = self.run_converter()
+        self.assertNotIn('copied from cache', output)
+        self.assertEqual(changed_dat, dat.replace('box-top.png', 'box-lid.png'))
+        output, cached_dat = self.run_converter()
+        self.assertIn('Unchanged, copied from cache', output)
+        self.assertEqual(cached_dat, changed_dat)
+
+
+class CacheEvictionTest(CacheTestCase):
+    def store(self, key, size):
+        self.write_file('entry.dat', 'x' * size)
+        store_cached_conversion(self.cache_dir, key, self.path('entry.dat'), 250)
+    
+    def set_age(self, key, age):
+        entry_path = os.path.join(self.cache_dir, key + '.dat')
+        entry_time = os.stat(entry_path).st_mtime - age
+        os.utime(entry_path, (entry_time, entry_time))
+    
+    def cached_keys(self):
+        return sorted(os.path.splitext(name)[0] for name in os.listdir(self.cache_dir))
+    
+    def test_least_recently_used_removed(self):
+        self.store('a', 100)
+        self.set_age('a', 30)
+        self.store('b', 100)
+        self.set_age('b', 20)
+        # Fetching a marks it as the most recently used.
+        self.assertTrue(fetch_cached_conversion(self.cache_dir, 'a', self.path('fetched.dat')))
+        self.assertEqual(self.read_file('fetched.dat'), 'x' * 100)
+        self.store('c', 100)
+        self.assertEqual(self.cached_keys(), ['a', 'c'])
+        self.assertFalse(fetch_cached_conversion(self.cache_dir, 'b', self.path('fetched.dat')))
+        
+        # An entry larger than the whole cache doesn't stay either.
+        self.store('d', 300)
+        self.assertEqual(self.cached_keys(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
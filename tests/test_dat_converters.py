@@ -0,0 +1,93 @@
+"""
+Tests for the DAT converters Dat2Mesh.py, Dat2Obj.py and Dat2ObjTex.py, run
+as scripts the way users run them. The expected files were written by the
+original versions of the scripts.
+
+Run with: python -m unittest discover tests
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+class DatConverterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        shutil.copy(os.path.join(DATA_DIRECTORY, 'ngons.dat'), self.directory)
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def run_script(self, script_name):
+        # Output names are lower-cased, so run in the directory rather than
+        # passing a path with capitals in it.
+        subprocess.check_call([sys.executable, os.path.join(REPOSITORY_DIRECTORY, script_name), 'ngons.dat'],
+                              cwd=self.directory, stdout=open(os.devnull, 'wb'))
+    
+    def read_output(self, name):
+        with open(os.path.join(self.directory, name), 'rb') as output_file:
+            return output_file.read()
+    
+    def assertMatchesExpected(self, output_name, expected_name):
+        with open(os.path.join(DATA_DIRECTORY, expected_name), 'rb') as expected_file:
+            self.assertEqual(self.read_output(output_name), expected_file.read())
+
+
+class Dat2MeshTest(DatConverterTestCase):
+    def test_matches_original_output(self):
+        self.run_script('Dat2Mesh.py')
+        self.assertMatchesExpected('ngons.mesh', 'ngons-expected.mesh')
+    
+    def test_edges_listed_once(self):
+        self.run_script('Dat2Mesh.py')
+        lines = self.read_output('ngons.mesh').split('\r')
+        first_material = lines.index('EDGES') + 1
+        while not lines[first_material].startswith('MATERIAL'):
+            first_material += 1
+        edges = [tuple(map(int, line.split())) for line in lines[lines.index('EDGES') + 1:first_material]]
+        self.assertEqual(edges, sorted(set(edges)))
+        # Every side of every triangle is an edge, in one direction or the
+        # other. The four polygons make ten triangles.
+        triangles = lines[first_material + 1:first_material + 11]
+        self.assertFalse(triangles[-1].startswith('MATERIAL'))
+        self.assertTrue(lines[first_material + 11].startswith('MATERIAL'))
+        undirected_edges = set(frozenset(edge) for edge in edges)
+        for triangle in triangles:
+            v1, v2, v3 = map(int, triangle.split())
+            for side in ((v1, v2), (v2, v3), (v3, v1)):
+                self.assertIn(frozenset(side), undirected_edges)
+
+
+
+class Dat2ObjTexTest(DatConverterTestCase):
+    def test_matches_original_output(self):
+        self.run_script('Dat2ObjTex.py')
+        self.assertMatchesExpected('ngons.obj', 'ngons-tex-expected.obj')
+        self.assertMatchesExpected('ngons.mtl', 'ngons-tex-expected.mtl')
+    
+    def test_texture_coordinates_listed_once(self):
+        self.run_script('Dat2ObjTex.py')
+        lines = self.read_output('ngons.obj').splitlines()
+        coordinates = [line for line in lines if line.startswith('vt ')]
+        self.assertEqual(len(coordinates), len(set(coordinates)))
+        # Each corner refers to the coordinates given for it in the DAT
+        # file, with t flipped.
+        texture_lines = self.read_output('ngons.dat').split('TEXTURES\n', 1)[1].split('\n\n', 1)[0].splitlines()
+        faces = [line.split()[1:] for line in lines if line.startswith('f ')]
+        self.assertEqual(len(faces), len(texture_lines))
+        for face, texture_line in zip(faces, texture_lines):
+            values = [float(value) for value in texture_line.split()[3:]]
+            expected = ['%.6f %.6f' % (values[i], 1.0 - values[i + 1]) for i in range(0, len(values), 2)]
+            self.assertEqual([coordinates[int(corner.split('/')[1]) - 1][3:] for corner in face], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
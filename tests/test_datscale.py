@@ -0,0 +1,117 @@
+"""
+Tests for DatScale.py, run as a script the way users run it.
+
+Run with: python -m unittest discover tests
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'DatScale.py')
+
+MODEL = """// test model
+NVERTS 4
+NFACES 2
+
+VERTEX
+0, 0, 0
+1, 0, 0
+1, 1, 0
+0, 1, 0.5
+
+FACES
+255,0,0,	0,0,1,	3,	0,1,2
+0,255,0,	0,0,1,	3,	0,2,3
+
+TEXTURES
+hull.png	1.0 1.0	0 0	1 0	1 1
+hull.png	1.0 1.0	0 0	1 1	0 1
+
+END
+"""
+
+NORMALS_MODEL = MODEL.replace('\nEND\n', """
+NORMALS
+0, 0, 1
+0, 0, 1
+0, 0, 1
+0, 0, 1
+
+TANGENTS
+1, 0, 0
+1, 0, 0
+1, 0, 0
+1, 0, 0
+// after the tangents
+
+END
+""")
+
+
+class DatScaleTestCase(unittest.TestCase):
+    model = MODEL
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.input_file_name = os.path.join(self.directory, 'model.dat')
+        with open(self.input_file_name, 'wb') as input_file:
+            input_file.write(self.model)
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def run_datscale(self, *arguments):
+        subprocess.check_call([sys.executable, SCRIPT, self.input_file_name] + list(arguments),
+                              stdout=open(os.devnull, 'wb'))
+
+
+class NegativeFactorTest(DatScaleTestCase):
+    def test_negative_factor_only_scales_vertices(self):
+        self.run_datscale('-1')
+        output_file_name = os.path.join(self.directory, 'model x -1.0.dat')
+        self.assertTrue(os.path.exists(output_file_name))
+        with open(output_file_name, 'rb') as output_file:
+            output = output_file.read()
+        
+        self.assertIn('rescaled by a factor of -1.0', output)
+        vertices = output.split('VERTEX\n', 1)[1].split('\n\n', 1)[0].splitlines()
+        self.assertEqual([[float(c) for c in line.split(',')] for line in vertices],
+                         [[-0.0, -0.0, -0.0], [-1.0, -0.0, -0.0], [-1.0, -1.0, -0.0], [-0.0, -1.0, -0.5]])
+        # FACES, TEXTURES and everything after them are copied unchanged.
+        self.assertTrue(output.endswith(MODEL[MODEL.index('\nFACES'):]))
+    
+    def test_negative_scale_option_mirrors_faces(self):
+        self.run_datscale('--scale=-1,1,1')
+        with open(os.path.join(self.directory, 'model transformed.dat'), 'rb') as output_file:
+            output = output_file.read()
+        
+        self.assertIn('\t2,1,0\n', output)
+        self.assertIn('\t3,2,0\n', output)
+
+
+class DirectionSectionsTest(DatScaleTestCase):
+    model = NORMALS_MODEL
+    
+    def test_rotated_sections_keep_separators(self):
+        self.run_datscale('--rotate=0,0,90')
+        with open(os.path.join(self.directory, 'model transformed.dat'), 'rb') as output_file:
+            output = output_file.read()
+        
+        normals = output.split('NORMALS\n', 1)[1].split('\n\nTANGENTS\n', 1)[0].splitlines()
+        self.assertEqual([[float(c) for c in line.split(',')] for line in normals], [[0.0, 0.0, 1.0]] * 4)
+        tangents = output.split('TANGENTS\n', 1)[1].split('\n// after the tangents\n\nEND\n', 1)
+        self.assertEqual([[round(float(c), 5) for c in line.split(',')] for line in tangents[0].splitlines()],
+                         [[0.0, 1.0, 0.0]] * 4)
+        # The comment and blank lines after each rewritten section are
+        # copied as they were, with no extra line break.
+        self.assertEqual(tangents[1], '')
+        self.assertIn(' 1.00000\n\nTANGENTS\n', output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+"""
+Tests for OoliteMesh.decimate_mesh() and Obj2DatTexNorm.py --lod.
+
+Run with: python -m unittest discover tests
+"""
+
+import array
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from OoliteMesh import decimate_mesh
+
+
+TETRAHEDRON_POSITIONS = [0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0]
+TETRAHEDRON_TRIANGLES = [0, 2, 1, 0, 1, 3, 0, 3, 2, 1, 2, 3]
+
+
+def make_sphere(rings, sides):
+    """ make_sphere
+        Returns the positions and triangles of a closed UV sphere with poles.
+    """
+    positions = [0.0, 1.0, 0.0]
+    for ring in xrange(1, rings):
+        theta = math.pi * ring / rings
+        for side in xrange(sides):
+            phi = 2.0 * math.pi * side / sides
+            positions.extend((math.sin(theta) * math.cos(phi), math.cos(theta), math.sin(theta) * math.sin(phi)))
+    positions.extend((0.0, -1.0, 0.0))
+    bottom = len(positions) // 3 - 1
+    
+    def vertex(ring, side):
+        return 1 + (ring - 1) * sides + side % sides
+    
+    triangles = []
+    for side in xrange(sides):
+        triangles.extend((0, vertex(1, side + 1), vertex(1, side)))
+        triangles.extend((bottom, vertex(rings - 1, side), vertex(rings - 1, side + 1)))
+        for ring in xrange(1, rings - 1):
+            a, b = vertex(ring, side), vertex(ring, side + 1)
+            c, d = vertex(ring + 1, side), vertex(ring + 1, side + 1)
+            triangles.extend((a, b, d, a, d, c))
+    return array.array('d', positions), array.array('i', triangles)
+
+
+def triangle_list(triangles):
+    return [tuple(triangles[i:i + 3]) for i in xrange(0, len(triangles), 3)]
+
+
+class DecimateMeshTest(unittest.TestCase):
+    def assertValidResult(self, results, triangles, face_targets):
+        self.assertEqual(len(results), len(face_targets))
+        for faces, remaining in results:
+            self.assertEqual(len(remaining), 3 * len(faces))
+            for corners in triangle_list(remaining):
+                self.assertEqual(len(set(corners)), 3)
+    
+    def test_closed_tetrahedron_is_kept(self):
+        results = decimate_mesh(array.array('d', TETRAHEDRON_POSITIONS), array.array('i', TETRAHEDRON_TRIANGLES),
+                                [0] * 4, [2, 0])
+        for faces, remaining in results:
+            self.assertEqual(list(faces), [0, 1, 2, 3])
+            self.assertEqual(list(remaining), TETRAHEDRON_TRIANGLES)
+    
+    def test_double_sided_triangle_is_kept(self):
+        positions = array.array('d', [0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0, 0.0])
+        triangles = array.array('i', [0, 1, 2, 0, 2, 1])
+        for faces, remaining in decimate_mesh(positions, triangles, [0] * 3, [1, 0]):
+            self.assertEqual(list(remaining), [0, 1, 2, 0, 2, 1])
+    
+    def test_degenerate_faces(self):
+        positions = array.array('d', [0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0, 0.0])
+        triangles = array.array('i', [0, 0, 0, 0, 1, 2, 1, 1, 2])
+        results = decimate_mesh(positions, triangles, [0] * 3, [1])
+        self.assertEqual(list(results[0][0]), [0, 1, 2])
+    
+    def test_closed_parts_collapse_to_tetrahedra(self):
+        # A sphere followed by a separate tetrahedron, decimated as far as
+        # possible: neither part may vanish or fold into two-sided faces.
+        positions, triangles = make_sphere(8, 12)
+        offset = len(positions) // 3
+        positions.extend(TETRAHEDRON_POSITIONS)
+        triangles.extend(v + offset for v in TETRAHEDRON_TRIANGLES)
+        vertex_count = len(positions) // 3
+        
+        results = decimate_mesh(positions, triangles, [0] * vertex_count, [len(triangles) // 6, 0])
+        self.assertValidResult(results, triangles, [0, 0])
+        faces, remaining = results[-1]
+        remaining = triangle_list(remaining)
+        self.assertEqual([t for t in remaining if min(t) >= offset],
+                         [tuple(v + offset for v in TETRAHEDRON_TRIANGLES[i:i + 3]) for i in (0, 3, 6, 9)])
+        sphere = [t for t in remaining if max(t) < offset]
+        self.assertTrue(len(sphere) >= 4)
+        self.assertEqual(len(set(frozenset(t) for t in sphere)), len(sphere))
+    
+    def test_locked_seam_vertices_are_kept(self):
+        positions, triangles = make_sphere(10, 16)
+        vertex_count = len(positions) // 3
+        # Lock one meridian, as a texture seam would be.
+        locked = [0] * vertex_count
+        seam = [1 + ring * 16 for ring in xrange(9)]
+        for v in seam:
+            locked[v] = 1
+        
+        face_targets = [len(triangles) // 6, len(triangles) // 30]
+        results = decimate_mesh(positions, triangles, locked, face_targets)
+        self.assertValidResult(results, triangles, face_targets)
+        self.assertTrue(len(results[0][0]) < len(triangles) // 3)
+        for faces, remaining in results:
+            used = set(remaining)
+            for v in seam:
+                self.assertIn(v, used)
+
+
+class LodOptionTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def test_closed_tetrahedron(self):
+        with open(os.path.join(self.directory, 'tetra.obj'), 'w') as obj_file:
+            obj_file.write('v 0 0 0\nv 1 0 0\nv 0 1 0\nv 0 0 1\n')
+            obj_file.write('f 1 3 2\nf 1 2 4\nf 1 4 3\nf 2 3 4\n')
+        subprocess.check_call([sys.executable, os.path.join(ROOT, 'Obj2DatTexNorm.py'), '--lod', '0.5', 'tetra.obj'],
+                              cwd=self.directory, stdout=open(os.devnull, 'wb'))
+        with open(os.path.join(self.directory, 'tetra-lod0.5.dat')) as dat_file:
+            self.assertIn('NFACES 4', dat_file.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+Tests that Obj2DatTexNorm.format_number() and format_numbers() produce exactly
+the strings of the Decimal-based format_number() they replaced.
+
+Run with: python -m unittest discover tests
+"""
+
+import decimal
+import os
+import random
+import struct
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Obj2DatTexNorm
+
+
+def decimal_format_number(n):
+    """ decimal_format_number
+        The original format_number(), kept as the reference implementation.
+    """
+    try:
+        dec = decimal.Decimal('%.5f' % n)
+    except:
+        return 'bad'
+    tup = dec.as_tuple()
+    delta = len(tup.digits) + tup.exponent
+    digits = ''.join(str(d) for d in tup.digits)
+    if delta <= 0:
+        zeros = abs(tup.exponent) - len(tup.digits)
+        val = '0.' + ('0' * zeros) + digits
+    else:
+        val = digits[:delta] + ('0' * tup.exponent) + '.' + digits[delta:]
+    val = val.rstrip('0')
+    if val[-1] == '.':
+        val = val[:-1]
+    
+    if tup.sign:
+        return '-' + val
+    else:
+        return val
+
+
+EDGE_CASES = [
+    # Signed zeros.
+    0.0, -0.0,
+    # Values that round to zero at five decimal places.
+    0.000001, -0.000001, 0.000004, -0.000004, 0.000005, -0.000005, 0.0000049999, -0.0000049999,
+    5e-324, -5e-324, 1e-300, -1e-300,
+    # Values that round up to the next place or unit.
+    0.000006, -0.000006, 0.999996, -0.999996, 9.999995, -9.999995, 99999.999999, -99999.999999,
+    # Trailing zeros and exact values.
+    1.0, -1.0, 0.5, -0.5, 0.1, -0.1, 10.0, -10.0, 100.0, 1000.00001, -1000.00001, 0.00001, -0.00001,
+    # Large magnitudes.
+    1e15, -1e15, 1e16, 1e22, 1e23, -1e23, 123456789012345678.0, 1e300, -1e300, 1.7976931348623157e308,
+    -1.7976931348623157e308,
+]
+
+
+def random_numbers(count):
+    """ Seeded values of every magnitude, plus arbitrary finite bit patterns. """
+    generator = random.Random(20261017)
+    numbers = []
+    for i in xrange(count):
+        numbers.append(generator.uniform(-1.0, 1.0) * 10.0 ** generator.randint(-8, 12))
+        n = struct.unpack('<d', struct.pack('<Q', generator.getrandbits(64)))[0]
+        if n == n and abs(n) != float('inf'):
+            numbers.append(n)
+    return numbers
+
+
+class FormatNumberTest(unittest.TestCase):
+    def assertMatchesDecimal(self, numbers):
+        for n in numbers:
+            self.assertEqual(Obj2DatTexNorm.format_number(n), decimal_format_number(n), repr(n))
+        self.assertEqual(Obj2DatTexNorm.format_numbers(numbers), [decimal_format_number(n) for n in numbers])
+    
+    def test_edge_cases(self):
+        self.assertMatchesDecimal(EDGE_CASES)
+    
+    def test_random_sweep(self):
+        self.assertMatchesDecimal(random_numbers(20000))
+    
+    def test_negative_zero_is_kept(self):
+        negative_zeros = [n for n in EDGE_CASES + random_numbers(20000) if decimal_format_number(n) == '-0']
+        self.assertTrue(len(negative_zeros) >= 6)
+        for n in negative_zeros:
+            self.assertEqual(Obj2DatTexNorm.format_number(n), '-0', repr(n))
+        # The batch formatter must not reuse a cached '0' for -0.0 or the
+        # other way round.
+        mixed = [0.0, -0.0, 0.000001, -0.000001, 0.0, -0.0] + negative_zeros
+        self.assertEqual(Obj2DatTexNorm.format_numbers(mixed), [decimal_format_number(n) for n in mixed])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+"""
+Tests for OoliteMesh.generate_normals().
+
+Run with: python -m unittest discover tests
+"""
+
+import math
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from OoliteMesh import parse_obj, generate_normals
+
+
+CUBE_POSITIONS = """v -1 -1 -1
+v 1 -1 -1
+v 1 1 -1
+v -1 1 -1
+v -1 -1 1
+v 1 -1 1
+v 1 1 1
+v -1 1 1
+"""
+
+CUBE_SIDES = """f 5 6 7 8
+f 1 4 3 2
+f 2 3 7 6
+f 1 5 8 4
+f 1 2 6 5
+"""
+
+CUBE_TOP = """f 4 8 7 3
+"""
+
+# Two faces meeting at a right angle along the z axis, each with a right
+# angle at the origin, one much larger than the other.
+CORNER = """v 0 0 0
+v 1 0 0
+v 0 0 1
+v 0 3 0
+v 0 0 3
+f 1 3 2
+f 1 4 5
+"""
+
+
+def read_geometry(text):
+    return parse_obj(text.splitlines(), lambda name: None)
+
+
+class GenerateNormalsTest(unittest.TestCase):
+    def corner_normals(self, geometry):
+        """ Returns the normal of each corner as an (x, y, z) tuple. """
+        normals = geometry.normals
+        return [tuple(normals[3 * n - 3:3 * n]) for n in geometry.corner_normals]
+    
+    def corner_positions(self, geometry):
+        positions = geometry.positions
+        return [tuple(positions[3 * v - 3:3 * v]) for v in geometry.corner_positions]
+    
+    def generate(self, text, **options):
+        geometry = read_geometry(text)
+        self.assertEqual(generate_normals(geometry, **options), len(geometry.corner_positions))
+        for normal in self.corner_normals(geometry):
+            self.assertAlmostEqual(sum(x * x for x in normal), 1.0)
+        return geometry
+    
+    def assertVectorsAlmostEqual(self, first, second):
+        for a, b in zip(first, second):
+            self.assertAlmostEqual(a, b)
+    
+    def test_smooth_cube(self):
+        # Every corner at a position shares the normal pointing away from
+        # the centre, with the x axis negated like the positions.
+        geometry = self.generate('s 1\n' + CUBE_POSITIONS + CUBE_SIDES + CUBE_TOP)
+        for normal, position in zip(self.corner_normals(geometry), self.corner_positions(geometry)):
+            self.assertVectorsAlmostEqual(normal, [x / math.sqrt(3.0) for x in position])
+        self.assertEqual(len(set(geometry.corner_normals)), 8)
+        # Polygons before any s statement are smoothed too.
+        unmarked = self.generate(CUBE_POSITIONS + CUBE_SIDES + CUBE_TOP)
+        self.assertEqual(list(unmarked.normals), list(geometry.normals))
+    
+    def test_flat_cube(self):
+        geometry = self.generate(CUBE_POSITIONS + 's off\n' + CUBE_SIDES + CUBE_TOP)
+        normals = self.corner_normals(geometry)
+        positions = self.corner_positions(geometry)
+        for polygon in xrange(6):
+            corners = range(4 * polygon, 4 * polygon + 4)
+            self.assertEqual(len(set(normals[c] for c in corners)), 1)
+            # One axis, pointing outwards.
+            normal = normals[corners[0]]
+            self.assertEqual(sorted(abs(x) for x in normal), [0.0, 0.0, 1.0])
+            self.assertTrue(sum(n * x for n, x in zip(normal, positions[corners[0]])) > 0.0)
+        self.assertEqual(len(set(geometry.corner_normals)), 6)
+    
+    def test_smoothing_groups_kept_apart(self):
+        geometry = self.generate(CUBE_POSITIONS + 's 1\n' + CUBE_SIDES + 's 2\n' + CUBE_TOP)
+        normals = self.corner_normals(geometry)
+        # The top, alone in its group, is flat.
+        for c in xrange(20, 24):
+            self.assertVectorsAlmostEqual(normals[c], (0.0, 1.0, 0.0))
+        # The sides are smoothed without it, so the top corners of the sides
+        # lean outwards but not upwards.
+        for normal, position in zip(normals[:20], self.corner_positions(geometry)[:20]):
+            if position[1] > 0.0:
+                self.assertVectorsAlmostEqual(normal, (position[0] / math.sqrt(2.0), 0.0, position[2] / math.sqrt(2.0)))
+        # Going back to a group continues it.
+        split = self.generate(CUBE_POSITIONS + 's 1\n' + CUBE_SIDES[:30] + 's 2\n' + CUBE_TOP +
+                              's 1\n' + CUBE_SIDES[30:])
+        self.assertEqual(sorted(self.corner_normals(split)), sorted(normals))
+    
+    def test_crease_angle(self):
+        smooth = self.generate(CUBE_POSITIONS + CUBE_SIDES + CUBE_TOP)
+        flat = self.generate(CUBE_POSITIONS + 's off\n' + CUBE_SIDES + CUBE_TOP)
+        # The cube's edges are sharper than 60 degrees but not 100.
+        creased = self.generate(CUBE_POSITIONS + CUBE_SIDES + CUBE_TOP, crease_angle=60.0)
+        self.assertEqual(self.corner_normals(creased), self.corner_normals(flat))
+        within = self.generate(CUBE_POSITIONS + CUBE_SIDES + CUBE_TOP, crease_angle=100.0)
+        self.assertEqual(self.corner_normals(within), self.corner_normals(smooth))
+        # A crease angle doesn't join different groups or flat polygons.
+        grouped = self.generate(CUBE_POSITIONS + 's 1\n' + CUBE_SIDES + 's 2\n' + CUBE_TOP)
+        grouped_within = self.generate(CUBE_POSITIONS + 's 1\n' + CUBE_SIDES + 's 2\n' + CUBE_TOP, crease_angle=100.0)
+        self.assertEqual(self.corner_normals(grouped_within), self.corner_normals(grouped))
+        flat_within = self.generate(CUBE_POSITIONS + 's off\n' + CUBE_SIDES + CUBE_TOP, crease_angle=100.0)
+        self.assertEqual(self.corner_normals(flat_within), self.corner_normals(flat))
+    
+    def test_weighting(self):
+        faces = self.corner_normals(self.generate('s off\n' + CORNER))
+        first, second = faces[0], faces[3]
+        
+        def dot(a, b):
+            return sum(x * y for x, y in zip(a, b))
+        
+        # Both faces have a right angle at the origin, so by angle they count
+        # the same; by area the larger one counts for more.
+        by_angle = self.corner_normals(self.generate(CORNER))[0]
+        self.assertAlmostEqual(dot(by_angle, first), dot(by_angle, second))
+        self.assertAlmostEqual(dot(by_angle, first), math.sqrt(0.5))
+        by_area = self.corner_normals(self.generate(CORNER, weighting='area'))[0]
+        self.assertTrue(dot(by_area, second) > dot(by_area, first) + 0.5)
+    
+    def test_given_normals_kept(self):
+        text = CUBE_POSITIONS + 'vn 0 0 2\n' + CUBE_SIDES.replace('f 5 6 7 8', 'f 5//1 6//1 7//1 8//1') + CUBE_TOP
+        geometry = read_geometry(text)
+        self.assertEqual(generate_normals(geometry), 20)
+        self.assertEqual(list(geometry.corner_normals[:4]), [1, 1, 1, 1])
+        self.assertEqual(list(geometry.normals[:3]), [0.0, 0.0, 2.0])
+        self.assertTrue(min(geometry.corner_normals[4:]) > 1)
+        # Nothing to do once every corner has a normal.
+        self.assertEqual(generate_normals(geometry), 0)
+    
+    def test_negative_indices(self):
+        absolute = self.generate(CUBE_POSITIONS + CUBE_SIDES + CUBE_TOP)
+        relative = self.generate(CUBE_POSITIONS + CUBE_SIDES + 'f -5 -1 -2 -6\n')
+        self.assertEqual(self.corner_normals(relative), self.corner_normals(absolute))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+Tests for OoliteMesh.map_file() and reading DAT files through it.
+
+Run with: python -m unittest discover tests
+"""
+
+import mmap
+import os
+import shutil
+import StringIO
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from OoliteMesh import map_file, read_dat
+
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+class MapFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def test_regular_file_mapped(self):
+        file_name = os.path.join(DATA_DIRECTORY, 'ngons.dat')
+        with open(file_name, 'rb') as input_file:
+            data = map_file(input_file)
+            self.assertTrue(isinstance(data, mmap.mmap))
+            with open(file_name, 'rb') as text_file:
+                text = text_file.read()
+            self.assertEqual(data[:], text)
+            
+            # Reading the mapping gives the same results as the string.
+            mapped_dat = read_dat(data)
+            dat = read_dat(text)
+            self.assertEqual(mapped_dat.sections, dat.sections)
+            self.assertEqual(list(mapped_dat.positions), list(dat.positions))
+            self.assertEqual(list(mapped_dat.face_points), list(dat.face_points))
+            self.assertEqual(list(mapped_dat.texture_points), list(dat.texture_points))
+            self.assertEqual(mapped_dat.materials, dat.materials)
+            data.close()
+    
+    def test_unmappable_files_read(self):
+        empty_file_name = os.path.join(self.directory, 'empty.dat')
+        open(empty_file_name, 'wb').close()
+        with open(empty_file_name, 'rb') as input_file:
+            self.assertEqual(map_file(input_file), '')
+        self.assertEqual(map_file(StringIO.StringIO('NVERTS 0\n')), 'NVERTS 0\n')
+        
+        process = subprocess.Popen([sys.executable, '-c', 'print "NVERTS 3"'], stdout=subprocess.PIPE)
+        self.assertEqual(map_file(process.stdout), 'NVERTS 3\n')
+        process.wait()
+
+
+if __name__ == '__main__':
+    unittest.main()
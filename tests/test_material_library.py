@@ -0,0 +1,69 @@
+"""
+Tests for OoliteMesh.parse_material_library() and its cache.
+
+Run with: python -m unittest discover tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import OoliteMesh
+from OoliteMesh import parse_material_library
+
+
+MTL = """# Materials
+newmtl hull
+Kd 1 1 1
+map_Kd hull.png
+map_Kd ignored.png
+newmtl plain
+Kd 0.5 0.5 0.5
+
+newmtl engine
+map_Kd engine.png
+"""
+
+
+class MaterialLibraryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'ship.mtl')
+        self.write_library(MTL)
+        OoliteMesh.material_library_cache.clear()
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        OoliteMesh.material_library_cache.clear()
+    
+    def write_library(self, text):
+        with open(self.file_name, 'wb') as material_file:
+            material_file.write(text)
+    
+    def test_first_diffuse_map(self):
+        self.assertEqual(parse_material_library(self.file_name),
+                         [('hull', 'hull.png'), ('plain', None), ('engine', 'engine.png')])
+    
+    def test_parsed_once(self):
+        materials = parse_material_library(self.file_name)
+        self.assertIs(parse_material_library(self.file_name), materials)
+        # The same file by another path is the same entry.
+        other_name = os.path.join(self.directory, '.', 'ship.mtl')
+        self.assertIs(parse_material_library(other_name), materials)
+    
+    def test_changed_file_parsed_again(self):
+        materials = parse_material_library(self.file_name)
+        self.write_library(MTL.replace('engine.png', 'thruster.png'))
+        changed_materials = parse_material_library(self.file_name)
+        self.assertIsNot(changed_materials, materials)
+        self.assertEqual(changed_materials[2], ('engine', 'thruster.png'))
+    
+    def test_missing_file(self):
+        self.assertRaises(EnvironmentError, parse_material_library, os.path.join(self.directory, 'missing.mtl'))
+
+
+if __name__ == '__main__':
+    unittest.main()
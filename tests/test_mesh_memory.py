@@ -0,0 +1,74 @@
+"""
+Tests the memory budget documented for OoliteMesh.Mesh: about 100 MB for a
+closed mesh of a million triangles with face normals and texture coordinates,
+plus 12 MB for vertex normals.
+
+Run with: python -m unittest discover tests
+"""
+
+import array
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from OoliteMesh import Mesh
+
+
+# A torus of RINGS x SIDES vertices is closed and has two triangles per vertex.
+RINGS = 1000
+SIDES = 500
+
+# 500,000 x (24 + 24) bytes of positions and normals, plus 1,000,000 x 88
+# bytes of triangles, materials, face normals and texture coordinates.
+EXPECTED_BYTES = 500000 * 48 + 1000000 * 88
+# Arrays grown with extend() over-allocate by up to about 1/16.
+MEMORY_BOUND = 120 * 1000 * 1000
+
+
+def make_torus():
+    """ make_torus
+        Build a one-million-triangle mesh the way the readers do, by extending
+        its arrays a row at a time.
+    """
+    mesh = Mesh()
+    material = mesh.material_index('hull.png')
+    for ring in xrange(RINGS):
+        row_positions = []
+        for side in xrange(SIDES):
+            row_positions.extend((float(ring), float(side), 0.0))
+        mesh.positions.extend(row_positions)
+        mesh.normals.extend(array.array('d', [0.0, 0.0, 1.0]) * SIDES)
+        
+        next_ring = (ring + 1) % RINGS
+        row_triangles = []
+        for side in xrange(SIDES):
+            next_side = (side + 1) % SIDES
+            a = ring * SIDES + side
+            b = next_ring * SIDES + side
+            c = next_ring * SIDES + next_side
+            d = ring * SIDES + next_side
+            row_triangles.extend((a, b, c, a, c, d))
+        mesh.triangles.extend(row_triangles)
+        mesh.face_normals.extend(array.array('d', [0.0, 0.0, 1.0]) * (2 * SIDES))
+        mesh.face_materials.extend(array.array('i', [material]) * (2 * SIDES))
+        mesh.uvs.extend(array.array('d', [0.0, 0.0, 1.0, 0.0, 1.0, 1.0]) * (2 * SIDES))
+    return mesh
+
+
+class MeshMemoryTest(unittest.TestCase):
+    def test_million_triangles(self):
+        mesh = make_torus()
+        self.assertEqual(mesh.vertex_count(), 500000)
+        self.assertEqual(mesh.face_count(), 1000000)
+        self.assertEqual(mesh.memory_usage(), EXPECTED_BYTES)
+        
+        arrays = [mesh.positions, mesh.normals, mesh.tangents, mesh.triangles,
+                  mesh.face_normals, mesh.face_materials, mesh.uvs]
+        allocated = sum(sys.getsizeof(values) for values in arrays)
+        self.assertTrue(allocated <= MEMORY_BOUND,
+                        '%.1f MB per million triangles, expected at most %.1f MB' % (allocated / 1e6, MEMORY_BOUND / 1e6))
+
+
+if __name__ == '__main__':
+    unittest.main()
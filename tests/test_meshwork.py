@@ -0,0 +1,85 @@
+"""
+Tests for reading Meshwork files with per-material texture coordinates:
+OoliteMesh.parse_meshwork(), OoliteMesh.VertexIndex, and Mesh2DatTex.py and
+Mesh2Obj.py run as scripts. The expected files were written by the original
+versions of the scripts.
+
+Run with: python -m unittest discover tests
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_DIRECTORY)
+from OoliteMesh import read_lines, parse_meshwork, VertexIndex
+
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+class VertexIndexTest(unittest.TestCase):
+    def test_last_entry_for_each_vertex(self):
+        index = VertexIndex([7, 2, 9, 2, 7])
+        self.assertEqual(len(index), 3)
+        self.assertEqual((index[2], index[7], index[9]), (3, 4, 2))
+        self.assertEqual(index.items(), [(2, 3), (7, 4), (9, 2)])
+        self.assertTrue(9 in index)
+        self.assertFalse(3 in index)
+        self.assertRaises(KeyError, lambda: index[3])
+        self.assertRaises(KeyError, lambda: index[10])
+
+
+class ParseMeshworkTest(unittest.TestCase):
+    def test_material_uvs_as_listed(self):
+        with open(os.path.join(DATA_DIRECTORY, 'materials.mesh'), 'rb') as mesh_file:
+            mesh = parse_meshwork(read_lines(mesh_file))
+        self.assertEqual(mesh.materials, ['hull.png', 'engine.png'])
+        self.assertEqual(list(mesh.face_materials), [0, 0, 1, 1])
+        # Only the vertices each material lists are stored, in file order.
+        hull_vertices, hull_uvs = mesh.material_uvs[0]
+        self.assertEqual(list(hull_vertices), [0, 1, 2, 3, 2, 5])
+        self.assertEqual(list(hull_uvs), [0.0, 0.0, 0.5, 0.0, 0.5, 0.5, 0.0, 0.5, 0.5, 0.75, 0.25, 0.25])
+        engine_vertices, engine_uvs = mesh.material_uvs[1]
+        self.assertEqual(list(engine_vertices), [1, 4, 5, 2])
+        self.assertEqual(list(engine_uvs), [0.0, 0.0, 1.0, 0.0, 1.5, 1.0, 0.0, 1.0])
+
+
+class MeshConverterTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        shutil.copy(os.path.join(DATA_DIRECTORY, 'materials.mesh'), self.directory)
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def run_script(self, script_name):
+        # Output names are lower-cased, so run in the directory rather than
+        # passing a path with capitals in it.
+        subprocess.check_call([sys.executable, os.path.join(REPOSITORY_DIRECTORY, script_name), 'materials.mesh'],
+                              cwd=self.directory, stdout=open(os.devnull, 'wb'))
+    
+    def assertMatchesExpected(self, output_name, expected_name):
+        with open(os.path.join(self.directory, output_name), 'rb') as output_file:
+            with open(os.path.join(DATA_DIRECTORY, expected_name), 'rb') as expected_file:
+                self.assertEqual(output_file.read(), expected_file.read())
+    
+    def test_mesh2dattex(self):
+        # Vertex 2 has different coordinates in each material, and two
+        # entries in the first; vertex 5's coordinates in the second are out
+        # of range, so they are replaced with 0, 0.
+        self.run_script('Mesh2DatTex.py')
+        self.assertMatchesExpected('materials.dat', 'materials-expected.dat')
+    
+    def test_mesh2obj(self):
+        self.run_script('Mesh2Obj.py')
+        self.assertMatchesExpected('materials.obj', 'materials-expected.obj')
+        self.assertMatchesExpected('materials.mtl', 'materials-expected.mtl')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Tests for OoliteMesh.parse_obj() and the DAT files Obj2DatTexNorm.py writes.
+
+Run with: python -m unittest discover tests
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from OoliteMesh import parse_obj
+
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Obj2DatTexNorm.py')
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+OBJ = """mtllib first.mtl
+v 1 2 3
+v 4 5 6
+vt 0.25 0.75
+vn 1 0 0
+s 1
+usemtl a
+f 1/1/1 2/1/1 -1
+s off
+usemtl b
+f 1//1 2 -2/-1 1
+mtllib second.mtl
+"""
+
+
+class ParseObjTest(unittest.TestCase):
+    def test_single_pass_arrays(self):
+        libraries = []
+        geometry = parse_obj(OBJ.splitlines(), libraries.append)
+        self.assertEqual(libraries, ['first.mtl', 'second.mtl'])
+        # x is negated and t flipped for DAT.
+        self.assertEqual(list(geometry.positions), [-1.0, 2.0, 3.0, -4.0, 5.0, 6.0])
+        self.assertEqual(list(geometry.uvs), [0.25, 0.25])
+        self.assertEqual(list(geometry.normals), [-1.0, 0.0, 0.0])
+        # Relative indices are kept as written; 0 means omitted.
+        self.assertEqual(list(geometry.corner_positions), [1, 2, -1, 1, 2, -2, 1])
+        self.assertEqual(list(geometry.corner_uvs), [1, 1, 0, 0, 0, -1, 0])
+        self.assertEqual(list(geometry.corner_normals), [1, 1, 0, 1, 0, 0, 0])
+        self.assertEqual(list(geometry.polygon_sizes), [3, 4])
+        self.assertEqual(list(geometry.polygon_materials), [0, 1])
+        self.assertEqual(geometry.material_statements, ['a', 'b'])
+        self.assertEqual(list(geometry.polygon_smoothing), [0, 1])
+        self.assertEqual(list(geometry.smoothing_statements), [1, 0])
+        self.assertEqual((geometry.min_v, geometry.max_v), ([-4.0, 0.0, 0.0], [0.0, 5.0, 6.0]))
+
+
+class ConvertedOutputTest(unittest.TestCase):
+    """ The expected files were written by the original, line-by-line
+        version of Obj2DatTexNorm.py.
+    """
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for file_name in ('box.obj', 'box.mtl'):
+            shutil.copy(os.path.join(DATA_DIRECTORY, file_name), self.directory)
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def check_conversion(self, expected_file_name, *arguments):
+        # Output names are lower-cased, so run in the directory rather than
+        # passing a path with capitals in it.
+        subprocess.check_call([sys.executable, SCRIPT] + list(arguments) + ['box.obj'],
+                              cwd=self.directory, stdout=open(os.devnull, 'wb'))
+        with open(os.path.join(self.directory, 'box.dat'), 'rb') as output_file:
+            output = output_file.read()
+        with open(os.path.join(DATA_DIRECTORY, expected_file_name), 'rb') as expected_file:
+            self.assertEqual(output, expected_file.read())
+    
+    def test_matches_original_output(self):
+        self.check_conversion('box-expected.dat')
+    
+    def test_matches_original_pretty_output(self):
+        self.check_conversion('box-pretty-expected.dat', '-p')
+
+
+if __name__ == '__main__':
+    unittest.main()
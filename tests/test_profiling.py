@@ -0,0 +1,110 @@
+"""
+Tests for --profile: OoliteMesh.PhaseProfiler, take_profile_options() and
+the records the converters write.
+
+Run with: python -m unittest discover tests
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_DIRECTORY)
+from OoliteMesh import PhaseProfiler, take_profile_options
+
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+class PhaseProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def test_phases(self):
+        profiler = PhaseProfiler('Test', 'model.obj')
+        profiler.begin('parse')
+        with profiler.phase('read material libraries'):
+            pass
+        with profiler.phase('read material libraries'):
+            pass
+        profiler.begin('write')
+        profile_file_name = os.path.join(self.directory, 'profile.jsonl')
+        record = profiler.finish(profile_file_name)
+        
+        self.assertEqual((record['converter'], record['input'], record['cprofile']), ('Test', 'model.obj', None))
+        # Phases are listed in the order they first start; a nested phase
+        # starts inside parse, and one entered twice accumulates.
+        self.assertEqual([(phase['name'], phase['count']) for phase in record['phases']],
+                         [('read material libraries', 2), ('parse', 1), ('write', 1)])
+        for phase in record['phases']:
+            self.assertTrue(0.0 <= phase['wall_time'] <= record['wall_time'])
+        with open(profile_file_name) as profile_file:
+            self.assertEqual([json.loads(line) for line in profile_file], [json.loads(json.dumps(record))])
+    
+    def test_disabled(self):
+        profiler = PhaseProfiler('Test', 'model.obj', enabled=False)
+        profiler.begin('parse')
+        with profiler.phase('nested'):
+            pass
+        profile_file_name = os.path.join(self.directory, 'profile.jsonl')
+        self.assertEqual(profiler.finish(profile_file_name), None)
+        self.assertFalse(os.path.exists(profile_file_name))
+
+
+class TakeProfileOptionsTest(unittest.TestCase):
+    def test_options_removed(self):
+        self.assertEqual(take_profile_options(['a.dat', '--profile', 'p.jsonl', 'b.dat', '--cprofile']),
+                         ('p.jsonl', True, ['a.dat', 'b.dat']))
+        self.assertEqual(take_profile_options(['--profile=p.jsonl', 'a.dat']), ('p.jsonl', False, ['a.dat']))
+        self.assertEqual(take_profile_options(['a.dat']), (None, False, ['a.dat']))
+        self.assertRaises(SystemExit, take_profile_options, ['a.dat', '--profile'])
+
+
+class ConverterProfileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for file_name in ('box.obj', 'box.mtl', 'ngons.dat'):
+            shutil.copy(os.path.join(DATA_DIRECTORY, file_name), self.directory)
+        self.profile_file_name = os.path.join(self.directory, 'profile.jsonl')
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def run_script(self, script_name, *arguments):
+        # Output names are lower-cased, so run in the directory rather than
+        # passing a path with capitals in it.
+        subprocess.check_call([sys.executable, os.path.join(REPOSITORY_DIRECTORY, script_name)] + list(arguments),
+                              cwd=self.directory, stdout=open(os.devnull, 'wb'))
+    
+    def read_records(self):
+        with open(self.profile_file_name) as profile_file:
+            return [json.loads(line) for line in profile_file]
+    
+    def test_one_record_per_conversion(self):
+        self.run_script('Obj2DatTexNorm.py', '--profile', self.profile_file_name, 'box.obj')
+        self.run_script('Dat2Mesh.py', 'ngons.dat', '--profile=' + self.profile_file_name)
+        records = self.read_records()
+        self.assertEqual([(record['converter'], record['input']) for record in records],
+                         [('Obj2DatTexNorm', 'box.obj'), ('Dat2Mesh', 'ngons.dat')])
+        phase_names = [phase['name'] for phase in records[0]['phases']]
+        for name in ('parse', 'read material libraries', 'build faces', 'resolve vertices', 'write'):
+            self.assertIn(name, phase_names)
+        self.assertEqual([phase['name'] for phase in records[1]['phases']], ['parse', 'build edges', 'write'])
+    
+    def test_output_unchanged(self):
+        self.run_script('Obj2DatTexNorm.py', '--profile', self.profile_file_name, 'box.obj')
+        with open(os.path.join(self.directory, 'box.dat'), 'rb') as output_file:
+            with open(os.path.join(DATA_DIRECTORY, 'box-expected.dat'), 'rb') as expected_file:
+                self.assertEqual(output_file.read(), expected_file.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+"""
+Tests for OoliteMesh.read_dat().
+
+Run with: python -m unittest discover tests
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import OoliteMesh
+from OoliteMesh import read_dat
+
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+# Comments of both kinds, values separated by spaces, tabs and commas, and a
+# NAMES entry that looks like a heading.
+MIXED_DAT = """// A square in two triangles.
+NVERTS 4    # four
+NFACES 2
+
+VERTEX
+0 0 0
+1,0,0
+1\t1\t0    // tabs
+0, 1, 0
+
+FACES
+# colour, normal, point count, points
+255 0 0  0 0 1  3  0 1 2
+0,255,0,\t0,0,1,\t3,\t0,2,3
+
+TEXTURES
+1 1.0 1.0  0 0  1 0  1 1
+0\t2.0 2.0\t0 0\t2 2\t0 2
+
+NAMES 2
+VERTEX plating
+hull.png    # comment
+
+NORMALS
+0 0 1
+0 0 1
+0 0 1
+0 0 1
+
+END
+"""
+
+
+def read_fixture(name):
+    with open(os.path.join(DATA_DIRECTORY, name), 'rb') as input_file:
+        return input_file.read()
+
+
+def section_text(data, dat):
+    return [(heading, data[start:end]) for heading, start, end in dat.sections]
+
+
+class ReadDatLineBreakTest(unittest.TestCase):
+    def check_line_breaks(self, line_break):
+        data = read_fixture('ngons.dat')
+        expected = read_dat(data)
+        converted = data.replace('\n', line_break)
+        dat = read_dat(converted)
+        self.assertEqual(list(dat.face_sizes), [4, 6, 5, 3])
+        self.assertEqual(list(dat.positions), list(expected.positions))
+        self.assertEqual(list(dat.face_points), list(expected.face_points))
+        self.assertEqual(list(dat.texture_points), list(expected.texture_points))
+        self.assertEqual(dat.materials, expected.materials)
+        self.assertEqual([(heading, text.replace(line_break, '\n')) for heading, text in section_text(converted, dat)],
+                         section_text(data, expected))
+    
+    def test_crlf(self):
+        self.check_line_breaks('\r\n')
+    
+    def test_cr_only(self):
+        self.check_line_breaks('\r')
+
+
+
+class ReadDatTest(unittest.TestCase):
+    def test_mixed_separators_and_comments(self):
+        dat = read_dat(MIXED_DAT)
+        self.assertEqual((dat.vertex_count, dat.face_count), (4, 2))
+        self.assertEqual(list(dat.positions), [0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 1.0, 1.0, 0.0, 0.0, 1.0, 0.0])
+        self.assertEqual(list(dat.face_colors), [255.0, 0.0, 0.0, 0.0, 255.0, 0.0])
+        self.assertEqual(list(dat.face_normals), [0.0, 0.0, 1.0] * 2)
+        self.assertEqual(list(dat.face_sizes), [3, 3])
+        self.assertEqual(list(dat.face_points), [0, 1, 2, 0, 2, 3])
+        self.assertEqual(list(dat.texture_scales), [1.0, 1.0, 2.0, 2.0])
+        self.assertEqual(list(dat.texture_points), [0.0, 0.0, 1.0, 0.0, 1.0, 1.0, 0.0, 0.0, 2.0, 2.0, 0.0, 2.0])
+        self.assertEqual(list(dat.normals), [0.0, 0.0, 1.0] * 4)
+        self.assertEqual(list(dat.tangents), [])
+    
+    def test_names(self):
+        # Numeric keys index NAMES, and a name is never taken as a heading.
+        dat = read_dat(MIXED_DAT)
+        self.assertEqual(dat.names, ['VERTEX plating', 'hull.png'])
+        self.assertEqual(dat.texture_keys, ['1', '0'])
+        self.assertEqual(dat.materials, ['hull.png', 'VERTEX plating'])
+        self.assertEqual(list(dat.texture_materials), [0, 1])
+        # Without NAMES the keys are the materials.
+        dat = read_dat(MIXED_DAT.replace('NAMES 2\nVERTEX plating\nhull.png    # comment\n', ''))
+        self.assertEqual(dat.names, [])
+        self.assertEqual(dat.materials, ['1', '0'])
+    
+    def test_sections(self):
+        # Sections end at their last value, before comments and blank lines.
+        self.assertEqual(section_text(MIXED_DAT, read_dat(MIXED_DAT)),
+                         [('NVERTS', 'NVERTS 4'),
+                          ('NFACES', 'NFACES 2'),
+                          ('VERTEX', 'VERTEX\n0 0 0\n1,0,0\n1\t1\t0    // tabs\n0, 1, 0'),
+                          ('FACES', 'FACES\n# colour, normal, point count, points\n255 0 0  0 0 1  3  0 1 2\n'
+                                    '0,255,0,\t0,0,1,\t3,\t0,2,3'),
+                          ('TEXTURES', 'TEXTURES\n1 1.0 1.0  0 0  1 0  1 1\n0\t2.0 2.0\t0 0\t2 2\t0 2'),
+                          ('NAMES', 'NAMES 2\nVERTEX plating\nhull.png'),
+                          ('NORMALS', 'NORMALS\n0 0 1\n0 0 1\n0 0 1\n0 0 1'),
+                          ('END', 'END')])
+    
+    def test_only(self):
+        dat = read_dat(MIXED_DAT, only=('NVERTS', 'VERTEX'))
+        self.assertEqual(dat.vertex_count, 4)
+        self.assertEqual(len(dat.positions), 12)
+        self.assertEqual((dat.face_count, len(dat.face_points), len(dat.texture_points), len(dat.normals)), (0, 0, 0, 0))
+        # Every section is still listed, and NAMES is still read.
+        self.assertEqual(dat.sections, read_dat(MIXED_DAT).sections)
+        self.assertEqual(dat.names, ['VERTEX plating', 'hull.png'])
+    
+    def test_chunk_boundaries(self):
+        # A larger file, mixing triangles with other polygons, read a few
+        # lines at a time gives the same result as in one go.
+        rng = random.Random(7)
+        lines = ['NVERTS 100', 'NFACES 300', 'VERTEX']
+        lines.extend('%f, %f, %f' % (rng.random(), rng.random(), rng.random()) for i in xrange(100))
+        lines.append('FACES')
+        sizes = [rng.choice((3, 3, 3, 4, 5)) for i in xrange(300)]
+        for face, size in enumerate(sizes):
+            points = ','.join(str(rng.randrange(100)) for i in xrange(size))
+            lines.append('127,127,127,\t0,0,1,\t%u,\t%s    # face %u' % (size, points, face))
+        lines.append('TEXTURES')
+        for size in sizes:
+            lines.append('hull.png\t1.0 1.0\t' + '\t'.join('%f %f' % (rng.random(), rng.random()) for i in xrange(size)))
+        lines.append('END')
+        data = '\n'.join(lines) + '\n'
+        
+        expected = read_dat(data)
+        self.assertEqual(list(expected.face_sizes), sizes)
+        self.assertEqual(len(expected.texture_points), 2 * sum(sizes))
+        saved_chunk_size = OoliteMesh.DAT_CHUNK_SIZE
+        try:
+            for chunk_size in (1, 64, 1000):
+                OoliteMesh.DAT_CHUNK_SIZE = chunk_size
+                dat = read_dat(data)
+                for name in ('positions', 'face_colors', 'face_normals', 'face_sizes', 'face_points',
+                             'texture_materials', 'texture_scales', 'texture_points'):
+                    self.assertEqual(list(getattr(dat, name)), list(getattr(expected, name)), name)
+                self.assertEqual(dat.sections, expected.sections)
+        finally:
+            OoliteMesh.DAT_CHUNK_SIZE = saved_chunk_size
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+"""
+Tests for OoliteMesh.read_lines().
+
+Run with: python -m unittest discover tests
+"""
+
+import os
+import StringIO
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from OoliteMesh import read_lines
+
+
+TEXT = 'v 1 2 3\r\nvt 0 1\rvn 0 0 1\n\r\n\nf 1/1/1 2/2/2 3/3/3\r\r\nmtllib a.mtl'
+
+
+class RecordingFile(StringIO.StringIO):
+    """ A file that records how much each read() asks for. """
+    
+    def __init__(self, text):
+        StringIO.StringIO.__init__(self, text)
+        self.read_sizes = []
+    
+    def read(self, size=-1):
+        self.read_sizes.append(size)
+        return StringIO.StringIO.read(self, size)
+
+
+class ReadLinesTest(unittest.TestCase):
+    def test_every_chunk_boundary(self):
+        # Every split point, including between the halves of each CRLF.
+        for chunk_size in range(1, len(TEXT) + 2):
+            self.assertEqual(list(read_lines(StringIO.StringIO(TEXT), chunk_size)), TEXT.splitlines())
+    
+    def test_trailing_line_break(self):
+        for text in ('a\nb\n', 'a\nb\r\n', 'a\rb\r', '\n', ''):
+            for chunk_size in (1, 2, 3, 1 << 20):
+                self.assertEqual(list(read_lines(StringIO.StringIO(text), chunk_size)), text.splitlines())
+    
+    def test_reads_in_chunks(self):
+        input_file = RecordingFile(TEXT * 100)
+        lines = read_lines(input_file, 64)
+        next(lines)
+        # Only the first chunk is read before the first line is produced.
+        self.assertEqual(input_file.read_sizes, [64])
+        list(lines)
+        self.assertEqual(set(input_file.read_sizes), set([64]))
+
+
+if __name__ == '__main__':
+    unittest.main()
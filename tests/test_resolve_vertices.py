@@ -0,0 +1,59 @@
+"""
+Tests for Obj2DatTexNorm.resolve_vertices().
+
+Run with: python -m unittest discover tests
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Obj2DatTexNorm import resolve_vertices
+
+
+def tuple_resolve_vertices(positions, normals, uvs, corner_positions, corner_normals, corner_uvs):
+    """ Resolve each corner through a dictionary of value tuples, one corner
+        at a time, as the converter used to.
+    """
+    index_for_vertex = {}
+    resolved = []
+    first_corners = []
+    for corner, (v, vn, vt) in enumerate(zip(corner_positions, corner_normals, corner_uvs)):
+        key = (positions[v], normals[vn], uvs[vt] if vt != -1 else None)
+        if key not in index_for_vertex:
+            index_for_vertex[key] = len(index_for_vertex)
+            first_corners.append(corner)
+        resolved.append(index_for_vertex[key])
+    return resolved, len(index_for_vertex), first_corners
+
+
+class ResolveVerticesTest(unittest.TestCase):
+    def test_equal_values_share_vertices(self):
+        # Positions 0 and 2 are equal, so corners using either share a
+        # vertex; texture coordinate index -1 is a vertex of its own.
+        positions = [(0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (0.0, 0.0, 0.0)]
+        normals = [(0.0, 0.0, 1.0)]
+        uvs = [(0.5, 0.5), (0.5, 0.5), (1.0, 0.0)]
+        resolved, count, first_corners = resolve_vertices(positions, normals, uvs,
+                                                          [0, 1, 2, 2, 1, 0], [0, 0, 0, 0, 0, 0], [0, 2, 1, -1, 2, -1])
+        self.assertEqual(resolved, [0, 1, 0, 2, 1, 2])
+        self.assertEqual(count, 3)
+        self.assertEqual(first_corners, [0, 1, 3])
+    
+    def test_matches_tuple_dictionary(self):
+        rng = random.Random(2)
+        positions = [(float(rng.randint(0, 5)), float(rng.randint(0, 1)), 0.0) for i in range(40)]
+        normals = [(0.0, 0.0, float(rng.choice((-1, 1)))) for i in range(10)]
+        uvs = [(rng.randint(0, 3) / 4.0, 0.0) for i in range(20)]
+        corner_count = 600
+        corner_positions = [rng.randrange(len(positions)) for i in range(corner_count)]
+        corner_normals = [rng.randrange(len(normals)) for i in range(corner_count)]
+        corner_uvs = [rng.randrange(-1, len(uvs)) for i in range(corner_count)]
+        arguments = (positions, normals, uvs, corner_positions, corner_normals, corner_uvs)
+        self.assertEqual(resolve_vertices(*arguments), tuple_resolve_vertices(*arguments))
+
+
+if __name__ == '__main__':
+    unittest.main()
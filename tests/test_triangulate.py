@@ -0,0 +1,85 @@
+"""
+Tests for OoliteMesh.triangulate_polygon().
+
+Run with: python -m unittest discover tests
+"""
+
+import math
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from OoliteMesh import triangulate_polygon
+
+
+def signed_area(points):
+    """ Twice the signed area of a polygon in the xy plane. """
+    return sum(points[i - 1][0] * points[i][1] - points[i][0] * points[i - 1][1] for i in range(len(points)))
+
+
+class TriangulatePolygonTest(unittest.TestCase):
+    def check_triangulation(self, points):
+        """ Checks that the triangles cover the polygon in the xy plane
+            exactly, each wound the same way as the polygon.
+        """
+        triangles = triangulate_polygon(points)
+        self.assertEqual(len(triangles), len(points) - 2)
+        polygon_area = signed_area(points)
+        total_area = 0.0
+        for triangle in triangles:
+            self.assertEqual(len(set(triangle)), 3)
+            area = signed_area([points[i] for i in triangle])
+            self.assertTrue(area * polygon_area >= 0.0, 'triangle %s is reversed' % (triangle,))
+            total_area += area
+        self.assertAlmostEqual(total_area, polygon_area)
+        return triangles
+    
+    def test_convex_polygons_fanned(self):
+        self.assertEqual(triangulate_polygon([(0, 0, 0), (1, 0, 0), (0, 1, 0)]), [(0, 1, 2)])
+        hexagon = [(math.cos(a * math.pi / 3), math.sin(a * math.pi / 3), 0.0) for a in range(6)]
+        self.assertEqual(triangulate_polygon(hexagon), [(0, 1, 2), (0, 2, 3), (0, 3, 4), (0, 4, 5)])
+    
+    def test_concave(self):
+        # An arrowhead whose fan from corner 0 would go outside it.
+        arrow = [(0.0, 0.0, 0.0), (2.0, 1.0, 0.0), (0.0, 2.0, 0.0), (1.0, 1.0, 0.0)]
+        self.assertNotEqual(self.check_triangulation(arrow), [(0, 1, 2), (0, 2, 3)])
+        self.check_triangulation(list(reversed(arrow)))
+        # An L shape, starting at the reflex corner and away from it.
+        l_shape = [(1, 1, 0), (1, 2, 0), (0, 2, 0), (0, 0, 0), (2, 0, 0), (2, 1, 0)]
+        for start in range(len(l_shape)):
+            self.check_triangulation(l_shape[start:] + l_shape[:start])
+    
+    def test_other_planes(self):
+        # The same arrowhead in the xz plane, both ways round; the
+        # triangles are the ones found in the xy plane.
+        arrow = [(0.0, 0.0, 0.0), (2.0, 1.0, 0.0), (0.0, 2.0, 0.0), (1.0, 1.0, 0.0)]
+        for points in (arrow, list(reversed(arrow))):
+            self.assertEqual(triangulate_polygon([(x, 0.0, y) for x, y, z in points]), triangulate_polygon(points))
+            self.assertEqual(triangulate_polygon([(0.0, x, y) for x, y, z in points]), triangulate_polygon(points))
+    
+    def test_collinear_corners(self):
+        # A square with extra corners along its sides, and an L shape with
+        # a corner in the middle of the side next to its reflex corner.
+        square = [(0, 0, 0), (1, 0, 0), (2, 0, 0), (2, 1, 0), (2, 2, 0), (1, 2, 0), (0, 2, 0), (0, 1, 0)]
+        self.check_triangulation(square)
+        l_shape = [(1, 1, 0), (1, 2, 0), (0, 2, 0), (0, 0, 0), (1, 0, 0), (2, 0, 0), (2, 1, 0), (1.5, 1, 0)]
+        self.check_triangulation(l_shape)
+        # A polygon with no area is fanned.
+        line = [(0, 0, 0), (1, 0, 0), (2, 0, 0), (3, 0, 0)]
+        self.assertEqual(triangulate_polygon(line), [(0, 1, 2), (0, 2, 3)])
+    
+    def test_random_star_polygons(self):
+        rng = random.Random(5)
+        for polygon in range(100):
+            # Corners in order around the origin, less than half a turn
+            # apart, make a polygon that doesn't cross itself.
+            count = rng.randint(4, 20)
+            angles = [(i + rng.uniform(0.0, 0.9)) * 2.0 * math.pi / count for i in range(count)]
+            radii = [rng.uniform(0.2, 1.0) for i in range(count)]
+            self.check_triangulation([(r * math.cos(a), r * math.sin(a), 0.0) for r, a in zip(radii, angles)])
+
+
+if __name__ == '__main__':
+    unittest.main()
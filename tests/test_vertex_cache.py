@@ -0,0 +1,114 @@
+"""
+Tests for OoliteMesh.optimize_vertex_cache(), renumber_vertices() and
+Obj2DatTexNorm.py --optimize-vertex-cache.
+
+Run with: python -m unittest discover tests
+"""
+
+import array
+import itertools
+import os
+import random
+import sys
+import unittest
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_DIRECTORY)
+from OoliteMesh import optimize_vertex_cache, renumber_vertices, vertex_cache_statistics, read_dat
+from Obj2DatTexNorm import make_options, convert_obj_to_dat
+
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def make_grid(size):
+    """ make_grid
+        Returns the triangles of a size by size grid of quads, in row order,
+        and its vertex count.
+    """
+    triangles = []
+    for row in xrange(size):
+        for column in xrange(size):
+            a = row * (size + 1) + column
+            b, c, d = a + 1, a + size + 1, a + size + 2
+            triangles.extend((a, b, d, a, d, c))
+    return array.array('i', triangles), (size + 1) * (size + 1)
+
+
+def triangle_list(triangles):
+    return [tuple(triangles[i:i + 3]) for i in xrange(0, len(triangles), 3)]
+
+
+def reordered(triangles, face_order):
+    return array.array('i', itertools.chain.from_iterable(triangles[3 * f:3 * f + 3] for f in face_order))
+
+
+class OptimizeVertexCacheTest(unittest.TestCase):
+    def check_order(self, triangles, vertex_count):
+        """ Checks that the face order draws every triangle once, and
+            returns the reordered triangles.
+        """
+        face_order = optimize_vertex_cache(triangles, vertex_count)
+        self.assertEqual(sorted(face_order), range(len(triangles) // 3))
+        return reordered(triangles, face_order)
+    
+    def test_grid(self):
+        triangles, vertex_count = make_grid(40)
+        optimized = self.check_order(triangles, vertex_count)
+        acmr_before = vertex_cache_statistics(triangles, vertex_count)[0]
+        acmr_after = vertex_cache_statistics(optimized, vertex_count)[0]
+        self.assertTrue(acmr_after < 0.8 * acmr_before, 'ACMR %.3f -> %.3f' % (acmr_before, acmr_after))
+    
+    def test_shuffled(self):
+        # A random face order is much worse than a good one, and the result
+        # doesn't depend on the order the triangles came in.
+        triangles, vertex_count = make_grid(20)
+        faces = triangle_list(triangles)
+        random.Random(3).shuffle(faces)
+        shuffled = array.array('i', itertools.chain.from_iterable(faces))
+        optimized = self.check_order(shuffled, vertex_count)
+        self.assertTrue(vertex_cache_statistics(optimized, vertex_count)[0] <
+                        0.5 * vertex_cache_statistics(shuffled, vertex_count)[0])
+    
+    def test_small_inputs(self):
+        self.assertEqual(optimize_vertex_cache(array.array('i'), 0), [])
+        self.assertEqual(list(optimize_vertex_cache(array.array('i', [0, 1, 2]), 3)), [0])
+        # Unused vertices and separate pieces are fine.
+        triangles = array.array('i', [0, 1, 2, 4, 5, 6, 2, 1, 3])
+        self.check_order(triangles, 8)
+    
+    def test_renumber_vertices(self):
+        triangles = array.array('i', [4, 2, 0, 0, 2, 5])
+        renumbered, vertex_order = renumber_vertices(triangles, 7)
+        self.assertEqual(list(renumbered), [0, 1, 2, 2, 1, 3])
+        # Unused vertices come last, in their original order.
+        self.assertEqual(vertex_order, [4, 2, 0, 5, 1, 3, 6])
+        self.assertEqual([vertex_order[v] for v in renumbered], list(triangles))
+
+
+class OptimizeVertexCacheOptionTest(unittest.TestCase):
+    def read_faces(self, options):
+        """ Converts box.obj and returns its faces as sorted (material,
+            points) pairs, each point a position and texture coordinate, so
+            that they can be compared whatever order faces and vertices are
+            written in.
+        """
+        dat = read_dat(convert_obj_to_dat(os.path.join(DATA_DIRECTORY, 'box.obj'), options=options))
+        faces = []
+        start = 0
+        for face, size in enumerate(dat.face_sizes):
+            points = tuple((tuple(dat.positions[3 * v:3 * v + 3]),
+                            tuple(dat.texture_points[2 * (start + i):2 * (start + i) + 2]))
+                           for i, v in enumerate(dat.face_points[start:start + size]))
+            faces.append((dat.materials[dat.texture_materials[face]], points))
+            start += size
+        return sorted(faces)
+    
+    def test_same_faces(self):
+        faces = self.read_faces(make_options())
+        self.assertEqual(self.read_faces(make_options(optimize_vertex_cache=True)), faces)
+        self.assertEqual(len(faces), 12)
+
+
+if __name__ == '__main__':
+    unittest.main()
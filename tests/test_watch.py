@@ -0,0 +1,137 @@
+"""
+Tests for Obj2DatTexNorm.py --watch and the helpers it uses to find out of
+date files.
+
+Run with: python -m unittest discover tests
+"""
+
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_DIRECTORY)
+from Obj2DatTexNorm import scan_models, is_obj_file, material_library_paths, is_out_of_date, output_file_name_for
+
+
+SCRIPT = os.path.join(REPOSITORY_DIRECTORY, 'Obj2DatTexNorm.py')
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+class WatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for file_name in ('box.obj', 'box.mtl'):
+            shutil.copy(os.path.join(DATA_DIRECTORY, file_name), self.directory)
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def path(self, *names):
+        return os.path.join(self.directory, *names)
+    
+    def read_file(self, name):
+        with open(self.path(name), 'rb') as input_file:
+            return input_file.read()
+    
+    def write_file(self, name, text):
+        with open(self.path(name), 'wb') as output_file:
+            output_file.write(text)
+    
+    def set_age(self, name, age):
+        file_time = time.time() - age
+        os.utime(self.path(name), (file_time, file_time))
+
+
+class WatchHelpersTest(WatchTestCase):
+    def test_scan_models(self):
+        os.mkdir(self.path('ships'))
+        self.write_file(os.path.join('ships', 'Cobra.OBJ'), 'v 0 0 0\n')
+        self.write_file('notes.txt', '')
+        self.write_file('box.dat', '')
+        models = scan_models(self.directory)
+        self.assertEqual(sorted(models), [self.path('box.mtl'), self.path('box.obj'), self.path('ships', 'Cobra.OBJ')])
+        stat = os.stat(self.path('box.obj'))
+        self.assertEqual(models[self.path('box.obj')], (stat.st_mtime, stat.st_size))
+        self.assertEqual([path for path in sorted(models) if is_obj_file(path)],
+                         [self.path('box.obj'), self.path('ships', 'Cobra.OBJ')])
+    
+    def test_material_library_paths(self):
+        self.assertEqual(material_library_paths(self.path('box.obj')), [self.path('box.mtl')])
+        self.write_file('ship.obj', 'mtllib ../textures/hull.mtl\r\nmtllibx no.mtl\nv 0 0 0\nmtllib engine.mtl\n')
+        self.assertEqual(material_library_paths(self.path('ship.obj')),
+                         [os.path.normpath(self.path('..', 'textures', 'hull.mtl')), self.path('engine.mtl')])
+        self.assertEqual(material_library_paths(self.path('missing.obj')), [])
+    
+    def test_is_out_of_date(self):
+        self.assertEqual(output_file_name_for('ships/box.obj'), 'ships/box.dat')
+        self.assertEqual(output_file_name_for('ships/box.dat'), 'ships/box.dat.1')
+        
+        # Converted names are lower-case, so work relative to the directory.
+        saved_directory = os.getcwd()
+        os.chdir(self.directory)
+        try:
+            self.assertTrue(is_out_of_date('box.obj', ['box.mtl'], scan_models('.')))
+            self.write_file('box.dat', '')
+            self.set_age('box.obj', 20)
+            self.set_age('box.mtl', 20)
+            self.assertFalse(is_out_of_date('box.obj', ['box.mtl'], scan_models('.')))
+            # A newer material library, or OBJ file, makes it out of date.
+            self.set_age('box.mtl', -20)
+            self.assertTrue(is_out_of_date('box.obj', ['box.mtl'], scan_models('.')))
+            self.assertFalse(is_out_of_date('box.obj', [], scan_models('.')))
+            self.set_age('box.obj', -20)
+            self.assertTrue(is_out_of_date('box.obj', [], scan_models('.')))
+        finally:
+            os.chdir(saved_directory)
+
+
+class WatchDirectoryTest(WatchTestCase):
+    def wait_for(self, condition):
+        deadline = time.time() + 20.0
+        while not condition():
+            self.assertTrue(time.time() < deadline, 'timed out')
+            time.sleep(0.05)
+    
+    def test_changes_reconverted(self):
+        # An up to date file is left alone at the start.
+        self.write_file('up-to-date.obj', self.read_file('box.obj'))
+        self.set_age('up-to-date.obj', 20)
+        self.set_age('box.mtl', 20)
+        self.write_file('up-to-date.dat', 'unchanged')
+        
+        process = subprocess.Popen([sys.executable, SCRIPT, '--watch', '.', '--watch-interval', '0.1'],
+                                   cwd=self.directory, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        try:
+            with open(os.path.join(DATA_DIRECTORY, 'box-expected.dat'), 'rb') as expected_file:
+                expected_dat = expected_file.read()
+            self.wait_for(lambda: os.path.exists(self.path('box.dat')) and self.read_file('box.dat') == expected_dat)
+            self.assertEqual(self.read_file('up-to-date.dat'), 'unchanged')
+            
+            # Changing the material library reconverts the files using it.
+            self.write_file('box.mtl', self.read_file('box.mtl').replace('box-top.png', 'box-lid.png'))
+            self.wait_for(lambda: 'box-lid.png' in self.read_file('box.dat'))
+            self.wait_for(lambda: 'box-lid.png' in self.read_file('up-to-date.dat'))
+            
+            # A broken file is reported, and watching goes on.
+            self.write_file('box.obj', 'f 1 2 3\n')
+            time.sleep(0.5)
+            self.write_file('box.mtl', self.read_file('box.mtl').replace('box-lid.png', 'box-hatch.png'))
+            self.wait_for(lambda: 'box-hatch.png' in self.read_file('up-to-date.dat'))
+            self.assertIn('box-lid.png', self.read_file('box.dat'))
+        finally:
+            process.send_signal(signal.SIGINT)
+            output = process.communicate()[0]
+        self.assertIn('Watching . for changes', output)
+        self.assertEqual(output.count('up-to-date.obj -> up-to-date.dat'), 2)
+        self.assertEqual(output.count('Traceback (most recent call last):'), 1)
+        self.assertTrue(output.endswith('\nStopped watching.\n'), output)
+
+
+if __name__ == '__main__':
+    unittest.main()
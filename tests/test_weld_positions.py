@@ -0,0 +1,49 @@
+"""
+Tests for Obj2DatTexNorm.weld_positions().
+
+Run with: python -m unittest discover tests
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Obj2DatTexNorm import weld_positions
+
+
+def brute_force_weld(positions, tolerance):
+    """ Weld by comparing each new position with every earlier cluster. """
+    centres = []
+    welded = []
+    for position in positions:
+        for centre in centres:
+            if sum((a - b) ** 2 for a, b in zip(centre, position)) <= tolerance * tolerance:
+                break
+        else:
+            centre = position
+            centres.append(centre)
+        welded.append(centre)
+    return welded, len(set(positions)), len(centres)
+
+
+class WeldPositionsTest(unittest.TestCase):
+    def test_joins_earliest_cluster(self):
+        # The last position is within tolerance of both clusters. The later
+        # cluster is in its own grid cell, which is searched first.
+        positions = [(-0.9, 0.0, 0.0), (0.95, 0.0, 0.0), (0.05, 0.0, 0.0)]
+        welded, position_count, cluster_count = weld_positions(positions, 1.0)
+        self.assertEqual(welded, [(-0.9, 0.0, 0.0), (0.95, 0.0, 0.0), (-0.9, 0.0, 0.0)])
+        self.assertEqual((position_count, cluster_count), (3, 2))
+    
+    def test_matches_brute_force(self):
+        generator = random.Random(21)
+        positions = [tuple(round(generator.uniform(-2.0, 2.0), 2) for axis in range(3)) for i in xrange(600)]
+        positions += positions[::7]
+        for tolerance in (0.05, 0.1, 0.3):
+            self.assertEqual(weld_positions(positions, tolerance), brute_force_weld(positions, tolerance))
+
+
+if __name__ == '__main__':
+    unittest.main()